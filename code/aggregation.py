@@ -0,0 +1,176 @@
+"""
+Vectorized aggregation of article polarities over time, used to plot summaries of the
+analyzed articles instead of one point per article. Everything is computed with pandas
+group-bys and NumPy array operations, so the cost of building a graph grows with the number of
+time buckets and sources drawn, not with the number of articles.
+
+For each time bucket (day, week or month) the summary holds the mean polarity, the number of
+articles and a 95% confidence band around the mean, along with a rolling mean over the previous
+buckets. Per-source trends are ordinary least squares lines fitted to every source at once from
+grouped sums, replacing plotly's (slow, per point) trendline='ols'.
+
+To keep plotting individual articles when there are too many to draw, lttb_indices picks a
+subset of them with the Largest-Triangle-Three-Buckets algorithm, which keeps the peaks, dips
+and overall shape of the polarity over time.
+
+
+Copyright and Usage Information
+===============================
+Code by Aarya Vatsa and Diva Hidalgo Luna, December 2021
+"""
+import numpy as np
+import pandas as pd
+
+# pandas offset aliases of the supported bucket sizes
+FREQUENCIES = {'daily': 'D', 'weekly': 'W', 'monthly': 'MS'}
+Z_95 = 1.959963984540054  # two-sided 95% quantile of the standard normal distribution
+
+
+def bucket_polarity(df: pd.DataFrame, frequency: str = 'weekly', window: int = 4,
+                    by: str = '') -> pd.DataFrame:
+    """Return the mean polarity of the articles in df for each time bucket (and, if by is a
+    column name, each value of that column), with the columns:
+
+        - date_publish: the start of the bucket
+        - mean, count, std: of the average_sentence_polarity of the articles in the bucket
+        - lower, upper: the 95% confidence band of the mean (equal to mean when count is 1)
+        - rolling_mean: the article weighted mean over this bucket and the window - 1 buckets
+          before it
+
+    Buckets without articles are left out.
+
+    Preconditions:
+        - frequency in FREQUENCIES
+        - window >= 1
+        - by == '' or by in df.columns
+    """
+    keys = [pd.Grouper(key='date_publish', freq=FREQUENCIES[frequency])]
+    if by != '':
+        keys.insert(0, by)
+
+    grouped = df.groupby(keys)['average_sentence_polarity']
+    summary = grouped.agg(['mean', 'count', 'std', 'sum']).reset_index()
+    summary = summary[summary['count'] > 0]
+    summary['std'] = summary['std'].fillna(0.0)
+
+    margin = Z_95 * summary['std'] / np.sqrt(summary['count'])
+    summary['lower'] = summary['mean'] - margin
+    summary['upper'] = summary['mean'] + margin
+
+    # a rolling mean weighted by article counts: rolling sums of polarity over rolling counts
+    rolling = summary.groupby(by) if by != '' else summary
+    sums = rolling['sum'].rolling(window, min_periods=1).sum()
+    counts = rolling['count'].rolling(window, min_periods=1).sum()
+    if by != '':
+        sums = sums.reset_index(level=0, drop=True)
+        counts = counts.reset_index(level=0, drop=True)
+    summary['rolling_mean'] = sums / counts
+
+    return summary.drop(columns='sum').reset_index(drop=True)
+
+
+def source_trends(df: pd.DataFrame, by: str = 'source_domain') -> pd.DataFrame:
+    """Return the least squares line of polarity against publication date for every value of
+    the column by in df, with the columns:
+
+        - by: the source
+        - count: the number of articles from the source
+        - slope: the change in polarity per day
+        - intercept: the fitted polarity at the Unix epoch
+        - start, end: the dates of the source's first and last articles
+        - start_polarity, end_polarity: the fitted polarity at start and end
+
+    All lines are computed together from grouped sums. A source whose articles were all
+    published at the same time gets a flat line at its mean polarity.
+
+    Preconditions:
+        - by in df.columns
+    """
+    days = ((df['date_publish'] - pd.Timestamp(0)) / pd.Timedelta(days=1)).to_numpy()
+    origin = days.mean() if len(days) > 0 else 0.0  # centring x keeps the sums well conditioned
+    frame = pd.DataFrame({
+        by: df[by].to_numpy(),
+        'x': days - origin,
+        'y': df['average_sentence_polarity'].to_numpy(dtype=float),
+        'date_publish': df['date_publish'].to_numpy(),
+    })
+    frame['xx'] = frame['x'] * frame['x']
+    frame['xy'] = frame['x'] * frame['y']
+
+    grouped = frame.groupby(by)
+    sums = grouped[['x', 'y', 'xx', 'xy']].sum()
+    count = grouped.size()
+    variance = sums['xx'] - sums['x'] * sums['x'] / count
+    covariance = sums['xy'] - sums['x'] * sums['y'] / count
+
+    slope = (covariance / variance).where(variance > 1e-12, 0.0)
+    centred_intercept = (sums['y'] - slope * sums['x']) / count
+
+    trends = pd.DataFrame({'count': count, 'slope': slope,
+                           'intercept': centred_intercept - slope * origin})
+    trends['start'] = grouped['date_publish'].min()
+    trends['end'] = grouped['date_publish'].max()
+    trends['start_polarity'] = centred_intercept + slope * grouped['x'].min()
+    trends['end_polarity'] = centred_intercept + slope * grouped['x'].max()
+
+    return trends.reset_index()
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Return the indices of at most threshold of the points (x, y), chosen with the
+    Largest-Triangle-Three-Buckets algorithm, in increasing order. Every index is returned if
+    there are no more than threshold points.
+
+    The first and last points are always kept. The points between them are split into
+    threshold - 2 buckets of consecutive points, and from each bucket the point kept is the
+    one forming the largest triangle with the point kept from the previous bucket and the mean
+    of the next bucket, so isolated extremes survive where a random sample would drop them.
+
+    >>> lttb_indices(np.arange(7.0), np.array([0.0, 0.1, 0.0, 1.0, 0.0, 0.1, 0.0]), 3)
+    array([0, 3, 6])
+
+    Preconditions:
+        - len(x) == len(y)
+        - x is sorted in non-decreasing order
+        - threshold >= 3
+    """
+    n = len(x)
+    if n <= threshold:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # the bounds of the threshold - 2 buckets of the points between the first and last
+    bounds = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    # the mean point of each bucket, followed by the last point
+    counts = np.diff(bounds)
+    mean_x = np.append(np.add.reduceat(x[1:n - 1], bounds[:-1] - 1) / counts, x[-1])
+    mean_y = np.append(np.add.reduceat(y[1:n - 1], bounds[:-1] - 1) / counts, y[-1])
+
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = bounds[bucket], bounds[bucket + 1]
+        # twice the area of each triangle (previous point, candidate, next bucket's mean)
+        areas = np.abs((x[previous] - mean_x[bucket + 1]) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (mean_y[bucket + 1] - y[previous]))
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+
+    return kept
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'allowed-io': [],
+        'extra-imports': ['python_ta.contracts', 'numpy', 'pandas'],
+        'max-line-length': 100,
+        'max-nested-blocks': 4,
+        'disable': ['R1705', 'C0200']
+    })
@@ -3,6 +3,13 @@ Tokenizing a given article and gauging overall sentiment (by averaging the polar
 each sentence in the article). Implementation leverages the NLTK library, and a modified
 version of the VADER analysis tool.
 
+The VADER lexicon is loaded once per process by a shared SentimentEngine, which scores the
+sentences of many articles in a single pass and aggregates the results per article. Sentences
+that repeat across articles are only scored once, thanks to the engine's SentenceCache. Large
+corpora can be split into chunks and scored by a pool of worker processes, each holding its
+own engine. Instead of VADER's own sentence by sentence scoring, an engine can use the
+vectorized NumPy kernel of vader_numpy.py, which gives the same scores several times faster.
+
 
 Copyright and Usage Information
 ===============================
@@ -27,8 +34,198 @@ Hutto, C.J. & Gilbert, E.E. (2014). VADER: A Parsimonious Rule-based Model for
 Sentiment Analysis of Social Media Text. Eighth International Conference on
 Weblogs and Social Media (ICWSM-14). Ann Arbor, MI, June 2014.
 """
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
 from nltk.tokenize import sent_tokenize
 from nltk.sentiment.vader import SentimentIntensityAnalyzer
+from sentence_cache import CacheStats, SentenceCache
+from vader_numpy import VaderKernel
+
+# 'vader' scores each sentence with NLTK's VADER, 'numpy' scores batches with vader_numpy
+KERNELS = ('vader', 'numpy')
+
+
+@dataclass
+class PolarityAggregate:
+    """The sentence polarities of a single article, summarised.
+
+    Instance Attributes:
+       - mean: the mean compound polarity of a sentence in the article
+       - minimum: the compound polarity of the most negative sentence
+       - maximum: the compound polarity of the most positive sentence
+       - sentence_count: the number of sentences that were scored
+
+    Representation Invariants:
+        - -1.0 <= self.minimum <= self.mean <= self.maximum <= 1.0
+        - self.sentence_count >= 0
+    """
+    mean: float
+    minimum: float
+    maximum: float
+    sentence_count: int
+
+
+class SentimentEngine:
+    """Scores sentences with a single VADER analyzer, so the lexicon is only read from disk
+    once no matter how many sentences or articles are scored.
+
+    Instance Attributes:
+       - cache: the scores of the sentences this engine has already scored
+       - kernel: how sentences that are not cached are scored, one of KERNELS
+
+    Private Instance Attributes:
+       - _analyzer: the VADER analyzer shared by every call on this engine
+       - _vectorized: the NumPy kernel, created the first time it is used
+
+    Representation Invariants:
+        - self.kernel in KERNELS
+    """
+    cache: SentenceCache
+    kernel: str
+    _analyzer: SentimentIntensityAnalyzer
+    _vectorized: Optional[VaderKernel]
+
+    def __init__(self, cache: Optional[SentenceCache] = None, kernel: str = 'vader') -> None:
+        """Initialise the engine, loading the VADER lexicon. If cache is not given, the engine
+        uses a new in-memory SentenceCache.
+
+        Preconditions:
+            - kernel in KERNELS
+        """
+        self._analyzer = SentimentIntensityAnalyzer()
+        self._vectorized = None
+        self.cache = cache if cache is not None else SentenceCache()
+        self.kernel = kernel
+
+    def score_sentence(self, sentence: str) -> float:
+        """Return the compound polarity of a single sentence."""
+        return self.score_sentences([sentence])[0]
+
+    def score_sentences(self, sentences: list[str]) -> list[float]:
+        """Return the compound polarity of each sentence in sentences, in order. The sentences
+        that are not cached are scored together, with the engine's kernel."""
+        self.cache.use_kernel(self.kernel)
+        scores = []
+        missing = {}
+        for sentence in sentences:
+            if sentence in missing:
+                # scored with its first occurrence, as if it had been cached by then
+                self.cache.stats.hits += 1
+                scores.append(None)
+            else:
+                scores.append(self.cache.get(sentence))
+                if scores[-1] is None:
+                    missing[sentence] = None
+        if not missing:
+            return scores
+        missing = list(missing)
+
+        if self.kernel == 'numpy':
+            if self._vectorized is None:
+                self._vectorized = VaderKernel(self._analyzer)
+            new_scores = dict(zip(missing, self._vectorized.score(missing)))
+        else:
+            # Compound score represents overall polarity of sentence
+            new_scores = {sentence: self._analyzer.polarity_scores(sentence)['compound']
+                          for sentence in missing}
+
+        for sentence, score in new_scores.items():
+            self.cache.put(sentence, score)
+        return [new_scores[sentence] if score is None else score
+                for sentence, score in zip(sentences, scores)]
+
+    def score_batch(self, texts: dict[str, str]) -> dict[str, PolarityAggregate]:
+        """Tokenize every text in texts into sentences, score all of the sentences as one
+        flat batch and return the aggregated polarity of each text under the same key.
+
+        A text without any sentences is given a polarity of 0.0 and a sentence_count of 0.
+        """
+        sentences = []
+        bounds = {}
+        for key, text in texts.items():
+            start = len(sentences)
+            sentences.extend(sent_tokenize(text))
+            bounds[key] = (start, len(sentences))
+
+        scores = self.score_sentences(sentences)
+        self.cache.flush()
+
+        aggregates = {}
+        for key, (start, end) in bounds.items():
+            aggregates[key] = aggregate_scores(scores[start:end])
+
+        return aggregates
+
+
+def aggregate_scores(scores: list[float]) -> PolarityAggregate:
+    """Return the PolarityAggregate of the sentence scores of a single article."""
+    if not scores:
+        return PolarityAggregate(mean=0.0, minimum=0.0, maximum=0.0, sentence_count=0)
+
+    return PolarityAggregate(
+        mean=sum(scores) / len(scores),
+        minimum=min(scores),
+        maximum=max(scores),
+        sentence_count=len(scores)
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def get_engine() -> SentimentEngine:
+    """Return the SentimentEngine shared by this process, creating it on first use."""
+    return SentimentEngine()
+
+
+def score_in_parallel(texts: dict[str, str], workers: int, chunk_size: int,
+                      store_path: Optional[str] = None, stats: Optional[CacheStats] = None,
+                      kernel: str = 'vader') -> dict[str, PolarityAggregate]:
+    """Score texts like SentimentEngine.score_batch, but split into chunks of chunk_size texts
+    that are scored by a pool of worker processes. The result is identical to the serial
+    path, and its keys are in the same order as the keys of texts.
+
+    Each worker has its own sentence cache, backed by the persistent store at store_path if it
+    is given. If stats is given, the cache lookups of every worker are added to it. Every
+    worker scores sentences with kernel.
+
+    Preconditions:
+        - workers >= 1
+        - chunk_size >= 1
+        - kernel in KERNELS
+    """
+    keys = list(texts)
+    chunks = [{key: texts[key] for key in keys[i:i + chunk_size]}
+              for i in range(0, len(keys), chunk_size)]
+
+    aggregates = {}
+    # Each worker loads its own engine once, when the process starts
+    with ProcessPoolExecutor(max_workers=workers, initializer=_start_worker,
+                             initargs=(store_path, kernel)) as executor:
+        # map preserves chunk order
+        for chunk_aggregates, chunk_stats in executor.map(_score_chunk, chunks):
+            aggregates.update(chunk_aggregates)
+            if stats is not None:
+                stats.merge(chunk_stats)
+
+    return aggregates
+
+
+def _start_worker(store_path: Optional[str], kernel: str) -> None:
+    """Create the engine of a worker process, using kernel and opening the persistent store if
+    there is one."""
+    engine = get_engine()
+    engine.kernel = kernel
+    if store_path is not None:
+        engine.cache.open_store(store_path)
+
+
+def _score_chunk(texts: dict[str, str]) -> tuple[dict[str, PolarityAggregate], CacheStats]:
+    """Score a chunk of texts with the engine of the current worker process, and return the
+    cache lookups made while scoring them."""
+    engine = get_engine()
+    engine.cache.stats = CacheStats()
+    return engine.score_batch(texts), engine.cache.stats
 
 
 def calculate_average_polarity(text: str) -> float:
@@ -40,14 +237,9 @@ def calculate_average_polarity(text: str) -> float:
         - text != ''
     """
     tokens = sent_tokenize(text)
-    sum_so_far = 0
-
-    for token in tokens:
-        analyzer = SentimentIntensityAnalyzer()
-        scores = analyzer.polarity_scores(token)
-        sum_so_far += scores['compound']  # Compound score reprsentes overall polarity of sentence,
+    scores = get_engine().score_sentences(tokens)
 
-    return sum_so_far / len(tokens)  # Return the average polarity of a sentence (thus the article)
+    return sum(scores) / len(tokens)  # Return the average polarity of a sentence (thus the article)
 
 
 if __name__ == '__main__':
@@ -58,7 +250,9 @@ if __name__ == '__main__':
     python_ta.contracts.check_all_contracts()
     python_ta.check_all(config={
         'allowed-io': ['run_example'],
-        'extra-imports': ['python_ta.contracts', 'nltk.tokenize', 'nltk.sentiment.vader'],
+        'extra-imports': ['python_ta.contracts', 'nltk.tokenize', 'nltk.sentiment.vader',
+                          'functools', 'dataclasses', 'concurrent.futures', 'typing',
+                          'sentence_cache', 'vader_numpy'],
         'max-line-length': 100,
         'max-nested-blocks': 4,
         'disable': ['R1705', 'C0200']
@@ -2,18 +2,21 @@
 Dataclass representation of the news articles and opinion pieces
 analyzed in our project.
 
+Article uses __slots__ rather than a per-instance __dict__, which makes each of the (possibly
+millions of) articles noticeably smaller; see benchmark_article_memory in benchmarks.py.
+
 
 Copyright and Usage Information
 ===============================
 Code by Anna Myllyniemi and Raghav Arora, December 2021
 """
 import datetime
+import hashlib
 from dataclasses import dataclass
 from typing import Optional
-from analyze_sentiment import calculate_average_polarity
 
 
-@dataclass
+@dataclass(slots=True)
 class Article:
     """Representation of a news article/column, opinion piece (OPed), blog etc.
 
@@ -27,6 +30,10 @@ class Article:
        - description: brief description of the news article/OPed
        - average_sentence_polarity: the average polarity of the article based on the mean of the
        polarity of each sentence in the article.
+       - text_hash: the hash_text of the main_text and kernel that average_sentence_polarity
+       was computed from, or None if the article has not been analyzed.
+       - themes: the labels of the themes, locations and publication of the article (see
+       themes.py), joined by themes.SEPARATOR, or None if the article has not been tagged.
 
 
     Representation Invariants:
@@ -47,6 +54,19 @@ class Article:
     url: str
     description: str
     average_sentence_polarity: Optional[float] = 0.0
+    text_hash: Optional[str] = None
+    themes: Optional[str] = None
+
+
+def hash_text(text: str, kernel: str) -> str:
+    """Return a hash of text scored with kernel (see analyze_sentiment.KERNELS), used to tell
+    whether an article's text has changed since it was last analyzed, or was analyzed with
+    another kernel. The kernel name prefixes the hash, so it can be read from a dataset.
+
+    >>> hash_text('Text', 'numpy')
+    'numpy:c3328c39b0e29f78e9ff45db674248b1d245887d'
+    """
+    return f'{kernel}:{hashlib.sha1(text.encode("UTF8")).hexdigest()}'
 
 
 class Articles:
@@ -55,20 +75,37 @@ class Articles:
     Private Instance Attributes:
        - _articles: a dictionary containing key-value mappings of title to Article
        objects.
+       - _key: the attribute of the articles they are keyed by, 'title' or (while articles
+       with the same title must be told apart, as when finding duplicates) 'url'
 
 
     Representation Invariants:
         - self._articles != {}
+        - self._key in {'title', 'url'}
     """
     _articles: dict[str, Article]
+    _key: str
 
-    def __init__(self) -> None:
-        """Initialises an empty Articles object."""
+    def __init__(self, key: str = 'title') -> None:
+        """Initialises an empty Articles object, keyed by the given attribute of the articles."""
         self._articles = {}
+        self._key = key
 
     def add_article(self, article: Article) -> None:
         """Add article to _articles dictionary."""
-        self._articles[article.title] = article
+        self._articles[getattr(article, self._key)] = article
+
+    def rekeyed(self, key: str) -> 'Articles':
+        """Return an Articles object with the same articles, keyed by the given attribute. Of
+        articles with the same key, the last one added is kept."""
+        articles = Articles(key)
+        for article in self._articles.values():
+            articles.add_article(article)
+        return articles
+
+    def remove_article(self, key: str) -> None:
+        """Remove the article corresponding to key from _articles."""
+        del self._articles[key]
 
     def get_keys(self) -> set[str]:
         """Return keys of _articles."""
@@ -78,11 +115,58 @@ class Articles:
         """Return the Article instance corresponding to key."""
         return self._articles[key]
 
-    def run_sentiment(self) -> None:
-        """Compute and assign the polarity of the average sentence in each Article."""
-        for key in self._articles:
-            self._articles[key].average_sentence_polarity = \
-                calculate_average_polarity(self._articles[key].main_text)
+    def run_sentiment(self, workers: int = 1, chunk_size: int = 64,
+                      previous: Optional['Articles'] = None,
+                      cache_path: Optional[str] = None,
+                      kernel: str = 'vader') -> tuple[int, int]:
+        """Compute and assign the polarity of the average sentence in each Article, and return
+        the number of articles scored and the number of articles whose score was reused.
+
+        If previous is given, an article that was already analyzed in previous with the same
+        text and kernel reuses its earlier polarity, and only new or changed articles are
+        scored.
+
+        With a single worker, the sentences of every article are scored as one batch by the
+        shared SentimentEngine. With more workers, the articles are scored in chunks of
+        chunk_size by a pool of processes; the resulting polarities are the same.
+
+        Sentences that were already scored are looked up in the engine's sentence cache, whose
+        lookups are counted in get_engine().cache.stats. If cache_path is given, the cache is
+        backed by the persistent store there, so sentences scored in earlier runs are reused.
+        Other sentences are scored with kernel (see analyze_sentiment.KERNELS).
+
+        Preconditions:
+            - workers >= 1
+            - chunk_size >= 1
+            - kernel in {'vader', 'numpy'}
+        """
+        texts = {}
+        reused = 0
+        for key, article in self._articles.items():
+            article.text_hash = hash_text(article.main_text, kernel)
+            earlier = previous._articles.get(key) if previous is not None else None
+            if earlier is not None and earlier.text_hash == article.text_hash:
+                article.average_sentence_polarity = earlier.average_sentence_polarity
+                reused += 1
+            else:
+                texts[key] = article.main_text
+
+        # imported here so that reading and writing articles does not load NLTK
+        from analyze_sentiment import get_engine, score_in_parallel
+
+        engine = get_engine()
+        if workers > 1:
+            aggregates = score_in_parallel(texts, workers, chunk_size, cache_path,
+                                           engine.cache.stats, kernel)
+        else:
+            engine.kernel = kernel
+            if cache_path is not None:
+                engine.cache.open_store(cache_path)
+            aggregates = engine.score_batch(texts)
+        for key in texts:
+            self._articles[key].average_sentence_polarity = aggregates[key].mean
+
+        return len(texts), reused
 
 
 if __name__ == '__main__':
@@ -94,7 +178,8 @@ if __name__ == '__main__':
     python_ta.check_all(config={
         'allowed-io': ['run_example'],
         'extra-imports': [
-            'python_ta.contracts', 'datetime', 'dataclass', 'analyze_sentiment', 'typing'
+            'python_ta.contracts', 'datetime', 'hashlib', 'dataclass', 'analyze_sentiment',
+            'typing'
         ],
         'max-line-length': 100,
         'max-nested-blocks': 4,
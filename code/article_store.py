@@ -0,0 +1,340 @@
+"""
+An SQLite store of articles, as an alternative to rewriting a CSV file after every change.
+Articles are keyed by URL, so two articles with the same title are both kept, and adding an
+article that is already stored updates it in place:
+
+    - articles: one row per article, indexed on date_published and on
+      (source_domain, date_published)
+    - articles_fts: an FTS5 index over the title, description and main_text of every article,
+      kept up to date by triggers
+
+The database is in WAL mode, so a crawler or scorer process can add articles while graphing
+processes keep reading the articles that were committed before. Writes wait for each other
+instead of failing.
+
+The full text index uses the trigram tokenizer, so a keyword filter matches the same articles
+as a case-sensitive substring search of the text (like the keyword filters of graphing.py for
+keywords without regular expression characters), but runs as an indexed query. Keywords of
+fewer than 3 characters cannot use the index, and are found by scanning the text instead.
+
+
+Copyright and Usage Information
+===============================
+Code by Anna Myllyniemi and Raghav Arora, December 2021
+"""
+import contextlib
+import datetime
+import sqlite3
+from typing import Iterable, Iterator, Optional
+
+import pandas as pd
+
+from article_classes import Article, Articles
+from csv_read_write import read_file
+
+STORE_SUFFIX = '.sqlite'
+TEXT_FIELDS = {'title': 'title', 'description': 'description', 'maintext': 'main_text'}
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    url TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    date_published TEXT NOT NULL,
+    authors TEXT NOT NULL,
+    main_text TEXT NOT NULL,
+    source_domain TEXT NOT NULL,
+    description TEXT NOT NULL,
+    average_sentence_polarity REAL,
+    text_hash TEXT,
+    themes TEXT
+);
+CREATE INDEX IF NOT EXISTS articles_date ON articles (date_published);
+CREATE INDEX IF NOT EXISTS articles_domain_date ON articles (source_domain, date_published);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5 (
+    title, description, main_text,
+    content='articles', content_rowid='rowid', tokenize='trigram case_sensitive 1'
+);
+CREATE TRIGGER IF NOT EXISTS articles_insert AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts (rowid, title, description, main_text)
+    VALUES (new.rowid, new.title, new.description, new.main_text);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_delete AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_fts (articles_fts, rowid, title, description, main_text)
+    VALUES ('delete', old.rowid, old.title, old.description, old.main_text);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_update
+AFTER UPDATE OF title, description, main_text ON articles BEGIN
+    INSERT INTO articles_fts (articles_fts, rowid, title, description, main_text)
+    VALUES ('delete', old.rowid, old.title, old.description, old.main_text);
+    INSERT INTO articles_fts (rowid, title, description, main_text)
+    VALUES (new.rowid, new.title, new.description, new.main_text);
+END;
+"""
+
+_UPSERT = """
+INSERT INTO articles (url, title, date_published, authors, main_text, source_domain,
+                      description, average_sentence_polarity, text_hash, themes)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (url) DO UPDATE SET
+    title = excluded.title, date_published = excluded.date_published,
+    authors = excluded.authors, main_text = excluded.main_text,
+    source_domain = excluded.source_domain, description = excluded.description,
+    average_sentence_polarity = excluded.average_sentence_polarity,
+    text_hash = excluded.text_hash, themes = excluded.themes
+"""
+
+_COLUMNS = ('url, title, date_published, authors, main_text, source_domain, description, '
+            'average_sentence_polarity, text_hash, themes')
+
+
+def is_store(path: str) -> bool:
+    """Return whether path names an article store."""
+    return path.endswith(STORE_SUFFIX)
+
+
+class ArticleStore:
+    """A connection to the article store in an SQLite file. Each process (or thread) should
+    open its own ArticleStore.
+
+    Private Instance Attributes:
+       - _connection: the connection to the database
+    """
+    _connection: sqlite3.Connection
+
+    def __init__(self, path: str) -> None:
+        """Open the article store at path, creating it if it does not exist.
+
+        Preconditions:
+            - is_store(path)
+        """
+        # writers wait for each other for up to a minute
+        self._connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(_SCHEMA)
+        # stores created before articles were tagged have no themes column
+        columns = [row[1] for row in self._connection.execute('PRAGMA table_info(articles)')]
+        if 'themes' not in columns:
+            self._connection.execute('ALTER TABLE articles ADD COLUMN themes TEXT')
+
+    def upsert(self, articles: Iterable[Article]) -> int:
+        """Add articles to the store in a single transaction, replacing any stored article
+        with the same URL, and return the number of articles written."""
+        rows = [_article_row(art) for art in articles]
+        with _transaction(self._connection):
+            self._connection.executemany(_UPSERT, rows)
+        return len(rows)
+
+    def set_polarities(self, polarities: dict[str, tuple[float, str]]) -> None:
+        """Record the polarity and text hash of the stored articles whose URLs are the keys of
+        polarities, in a single transaction."""
+        with _transaction(self._connection):
+            self._connection.executemany(
+                'UPDATE articles SET average_sentence_polarity = ?, text_hash = ? '
+                'WHERE url = ?',
+                [(polarity, text_hash, url) for url, (polarity, text_hash) in polarities.items()])
+
+    def delete(self, urls: Iterable[str]) -> None:
+        """Remove the articles with the given URLs, in a single transaction."""
+        with _transaction(self._connection):
+            self._connection.executemany('DELETE FROM articles WHERE url = ?',
+                                         [(url,) for url in urls])
+
+    def get(self, url: str) -> Optional[Article]:
+        """Return the stored article with the given URL, or None if there is none."""
+        row = self._connection.execute(f'SELECT {_COLUMNS} FROM articles WHERE url = ?',
+                                       (url,)).fetchone()
+        return _row_article(row) if row is not None else None
+
+    def __len__(self) -> int:
+        return self._connection.execute('SELECT COUNT(*) FROM articles').fetchone()[0]
+
+    def _where(self, keyword: str, field: str, domains: Optional[list[str]],
+               start: Optional[datetime.datetime],
+               end: Optional[datetime.datetime]) -> tuple[str, list]:
+        """Return the WHERE clause (or '') and its parameters selecting the articles whose
+        field contains keyword, from one of domains and published in [start, end). A filter
+        that is empty or None selects every article."""
+        conditions, parameters = [], []
+        if keyword != '':
+            column = TEXT_FIELDS[field]
+            if len(keyword) >= 3:  # the trigram tokenizer needs 3 characters
+                conditions.append('rowid IN (SELECT rowid FROM articles_fts '
+                                  'WHERE articles_fts MATCH ?)')
+                parameters.append(f'{column} : "{keyword.replace(chr(34), chr(34) * 2)}"')
+            else:
+                conditions.append(f'instr({column}, ?) > 0')
+                parameters.append(keyword)
+        if domains is not None:
+            conditions.append(f'source_domain IN ({", ".join("?" * len(domains))})')
+            parameters.extend(domains)
+        if start is not None:
+            conditions.append('date_published >= ?')
+            parameters.append(start.strftime(DATE_FORMAT))
+        if end is not None:
+            conditions.append('date_published < ?')
+            parameters.append(end.strftime(DATE_FORMAT))
+
+        return (' WHERE ' + ' AND '.join(conditions)) if conditions else '', parameters
+
+    def matching_urls(self, keyword: str, field: str = 'maintext',
+                      domains: Optional[list[str]] = None,
+                      start: Optional[datetime.datetime] = None,
+                      end: Optional[datetime.datetime] = None) -> list[str]:
+        """Return the URLs of the articles whose field contains keyword, from one of domains
+        and published in [start, end), in date order.
+
+        Preconditions:
+            - field in TEXT_FIELDS
+        """
+        where, parameters = self._where(keyword, field, domains, start, end)
+        return [row[0] for row in self._connection.execute(
+            f'SELECT url FROM articles{where} ORDER BY date_published', parameters)]
+
+    def iter_articles(self, keyword: str = '', domains: Optional[list[str]] = None,
+                      start: Optional[datetime.datetime] = None,
+                      end: Optional[datetime.datetime] = None) -> Iterator[Article]:
+        """Yield the articles whose main text contains keyword, from one of domains and
+        published in [start, end), in date order. A filter that is empty or None keeps every
+        article."""
+        where, parameters = self._where(keyword, 'maintext', domains, start, end)
+        for row in self._connection.execute(
+                f'SELECT {_COLUMNS} FROM articles{where} ORDER BY date_published', parameters):
+            yield _row_article(row)
+
+    def load(self, keyword: str = '', domains: Optional[list[str]] = None,
+             start: Optional[datetime.datetime] = None,
+             end: Optional[datetime.datetime] = None) -> Articles:
+        """Return the articles iter_articles would yield as an Articles object, in the same
+        form as read_file reads a CSV file."""
+        articles = Articles()
+        for article in self.iter_articles(keyword, domains, start, end):
+            articles.add_article(article)
+        return articles
+
+    def frame(self, columns: list[str], keyword: str = '', domains: Optional[list[str]] = None,
+              start: Optional[datetime.datetime] = None,
+              end: Optional[datetime.datetime] = None) -> pd.DataFrame:
+        """Return the given columns (named as in the CSV files) of the articles iter_articles
+        would yield, as a DataFrame with a parsed date_publish column.
+
+        Preconditions:
+            - all(column in csv_read_write.HEADER for column in columns)
+        """
+        names = {'date_publish': 'date_published', 'maintext': 'main_text'}
+        selected = ', '.join(f'{names.get(column, column)} AS {column}' for column in columns)
+        where, parameters = self._where(keyword, 'maintext', domains, start, end)
+        df = pd.read_sql_query(f'SELECT {selected} FROM articles{where} ORDER BY date_published',
+                               self._connection, params=parameters)
+        if 'date_publish' in df:
+            df['date_publish'] = pd.to_datetime(df['date_publish'])
+        return df
+
+    def close(self) -> None:
+        """Close the connection to the database."""
+        self._connection.close()
+
+
+@contextlib.contextmanager
+def _transaction(connection: sqlite3.Connection) -> Iterator[None]:
+    """Run the with block in a transaction on connection, committed if the block succeeds and
+    rolled back otherwise."""
+    # take the write lock up front, so concurrent writers wait instead of deadlocking
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+
+
+def _article_row(art: Article) -> tuple:
+    """Return the row of art in the articles table."""
+    return (art.url, art.title, art.date_published.strftime(DATE_FORMAT), art.authors,
+            art.main_text, art.source_domain, art.description, art.average_sentence_polarity,
+            art.text_hash, art.themes)
+
+
+def _row_article(row: tuple) -> Article:
+    """Return the article of a row of the articles table, selected as _COLUMNS."""
+    return Article(
+        url=row[0],
+        title=row[1],
+        date_published=datetime.datetime.strptime(row[2], DATE_FORMAT),
+        authors=row[3],
+        main_text=row[4],
+        source_domain=row[5],
+        description=row[6],
+        average_sentence_polarity=row[7],
+        text_hash=row[8],
+        themes=row[9]
+    )
+
+
+def articles_from_frame(df: pd.DataFrame) -> list[Article]:
+    """Return the articles in df, which has the columns of a CSV file of analyzed articles (see
+    csv_read_write.HEADER) and a parsed date_publish column."""
+    return [Article(
+        title=row.title,
+        date_published=row.date_publish.to_pydatetime(),
+        authors=row.authors,
+        main_text=row.maintext,
+        source_domain=row.source_domain,
+        url=row.url,
+        average_sentence_polarity=row.average_sentence_polarity,
+        description=row.description,
+        text_hash=row.text_hash,
+        themes=getattr(row, 'themes', None)
+    ) for row in df.itertuples()]
+
+
+def write_store(articles: Iterable[Article], path: str, batch_size: int = 64) -> int:
+    """Add articles to the store at path batch_size at a time, each batch in its own
+    transaction so readers see the articles as they are added, and return the number of
+    articles written. articles may be a generator over any number of articles.
+
+    Preconditions:
+        - is_store(path)
+        - batch_size >= 1
+    """
+    store = ArticleStore(path)
+    count = 0
+    batch = []
+    for article in articles:
+        batch.append(article)
+        if len(batch) == batch_size:
+            count += store.upsert(batch)
+            batch = []
+    count += store.upsert(batch)
+    store.close()
+    return count
+
+
+def csv_to_store(csv_path: str, path: str) -> int:
+    """Add the articles of the CSV file at csv_path (as written by write_file) to the store at
+    path, and return the number of articles written.
+
+    Preconditions:
+        - csv_path != ''
+        - is_store(path)
+    """
+    articles = read_file(csv_path)
+    return write_store((articles.get_article(key) for key in articles.get_keys()), path)
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'allowed-io': [],
+        'extra-imports': ['python_ta.contracts', 'contextlib', 'datetime', 'sqlite3', 'typing',
+                          'pandas', 'article_classes', 'csv_read_write'],
+        'max-line-length': 100,
+        'max-nested-blocks': 4,
+        'disable': ['R1705', 'C0200']
+    })
@@ -0,0 +1,173 @@
+"""
+Headless batch rendering of the graphs to files, for machines without a browser. Instead of
+showing each graph with pio.show, every keyword filter is rendered to HTML and/or static images
+(PNG, SVG, PDF) by a pool of worker processes. The analyzed articles are loaded into an
+AnalysisSession once, before the pool starts, so the forked workers share it instead of each
+reading and indexing the articles again, and plotly.js is written once next to the HTML files,
+which all refer to it. A manifest.json written next to the figures records the files written
+and the time each figure took.
+
+Static images are exported with kaleido (pip install kaleido), which needs a Chrome or Chromium
+install. If it is unavailable, the error is recorded in the manifest and HTML files are still
+written.
+
+
+Copyright and Usage Information
+===============================
+Code by Aarya Vatsa and Diva Hidalgo Luna, December 2021
+"""
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from graphing import AnalysisSession, build_figure, build_summary_figure
+
+STATIC_FORMATS = {'png', 'svg', 'pdf'}
+PLOTLY_JS = 'plotly.min.js'
+
+# The session of the current worker process. Workers forked from a process that already loaded
+# the session inherit it instead of loading the articles again.
+_session: Optional[AnalysisSession] = None
+
+
+def render_graphs(filepath: str, keywords: list[str], output_dir: str,
+                  formats: tuple[str, ...] = ('html',), frequency: str = '',
+                  workers: int = 1) -> dict:
+    """Render the graph of the analyzed articles at filepath for each keyword in keywords, as
+    draw_graph (or, with a frequency, AnalysisSession.draw) would show it, into output_dir in
+    each of formats. Return the manifest, which is also saved as output_dir/manifest.json.
+
+    With more than one worker, the figures are rendered by a pool of processes, which are
+    forked after the articles are loaded.
+
+    Preconditions:
+        - filepath != '' and output_dir != ''
+        - all(f == 'html' or f in STATIC_FORMATS for f in formats)
+        - workers >= 1
+    """
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(keyword, frequency, output_dir, formats) for keyword in keywords]
+    if 'html' in formats:
+        _write_plotly_js(output_dir)
+
+    _load_session(filepath)
+    if workers > 1:
+        # where processes are spawned rather than forked, the initializer loads the session
+        with ProcessPoolExecutor(max_workers=workers, initializer=_load_session,
+                                 initargs=(filepath,)) as executor:
+            figures = list(executor.map(_render, jobs))
+    else:
+        figures = [_render(job) for job in jobs]
+
+    manifest = {
+        'source': filepath,
+        'frequency': frequency,
+        'workers': workers,
+        'total_seconds': time.perf_counter() - start,
+        'figures': figures,
+    }
+    with open(os.path.join(output_dir, 'manifest.json'), mode='w', encoding='UTF8') as file:
+        json.dump(manifest, file, indent=2)
+
+    return manifest
+
+
+def _load_session(filepath: str) -> None:
+    """Load the analyzed articles at filepath into this process's session, unless it already
+    holds them."""
+    global _session
+    if _session is None or _session.filepath != filepath:
+        _session = AnalysisSession(filepath)
+
+
+def _write_plotly_js(output_dir: str) -> None:
+    """Write the plotly.js bundle the HTML figures refer to into output_dir, unless it is
+    there already."""
+    import plotly.offline
+
+    path = os.path.join(output_dir, PLOTLY_JS)
+    if not os.path.isfile(path):
+        with open(path, mode='w', encoding='UTF8') as file:
+            file.write(plotly.offline.get_plotlyjs())
+
+
+def _render(job: tuple[str, str, str, tuple[str, ...]]) -> dict:
+    """Render a single figure, given as (keyword, frequency, output directory, formats), with
+    this process's session and return its manifest entry."""
+    keyword, frequency, output_dir, formats = job
+    timings = {}
+
+    start = time.perf_counter()
+    df = _session.filter(keyword)
+    timings['filter'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if frequency == '':
+        figure = build_figure(df, keyword)
+    else:
+        figure = build_summary_figure(df, keyword, frequency)
+    timings['build'] = time.perf_counter() - start
+
+    name = figure_name(keyword)
+    files = {}
+    errors = {}
+    for file_format in formats:
+        path = os.path.join(output_dir, f'{name}.{file_format}')
+        start = time.perf_counter()
+        try:
+            if file_format == 'html':
+                # refers to the plotly.js written by render_graphs, instead of embedding it
+                figure.write_html(path, include_plotlyjs=PLOTLY_JS)
+            else:
+                figure.write_image(path, format=file_format)
+        except Exception as error:  # e.g. kaleido or Chrome missing; keep rendering the rest
+            errors[file_format] = f'{type(error).__name__}: {error}'
+        else:
+            files[file_format] = os.path.basename(path)
+        timings[file_format] = time.perf_counter() - start
+
+    return {
+        'keyword': keyword,
+        'articles': len(df),
+        'files': files,
+        'errors': errors,
+        'seconds': timings,
+        'pid': os.getpid(),
+    }
+
+
+def figure_name(keyword: str) -> str:
+    """Return the file name (without extension) of the figure filtered with keyword.
+
+    >>> figure_name('National Post')
+    'national-post'
+    >>> figure_name('')
+    'all'
+    """
+    slug = re.sub(r'[^a-z0-9]+', '-', keyword.lower()).strip('-')
+    return slug if slug != '' else 'all'
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'allowed-io': ['render_graphs', '_write_plotly_js'],
+        'extra-imports': [
+            'python_ta.contracts', 'json', 'os', 're', 'time', 'concurrent.futures', 'typing',
+            'graphing', 'doctest', 'plotly.offline'
+        ],
+        'max-line-length': 100,
+        'max-nested-blocks': 4,
+        'disable': ['R1705', 'C0200', 'E9998', 'W0603', 'W0703']
+    })
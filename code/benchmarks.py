@@ -0,0 +1,543 @@
+"""
+Benchmarks for the slower stages of the project.
+
+The comparison benchmarks time the current implementation of a stage against the approach it
+replaced, using the articles in data/ as the corpus, and print the timings:
+
+    python benchmarks.py
+
+Among them, the figure benchmark compares the size of the scatterplot of synthetic articles and
+the time taken to build it and write it to HTML, as drawn with SVG from every article and as
+drawn with WebGL from a downsampled subset (see graphing.build_large_figure). The time the
+browser then takes to draw the figure cannot be measured without a browser, but grows with
+the payload and the number of SVG points.
+
+The benchmark suite times cleaning, CSV writing and reading, sentiment scoring and graph
+filtering on synthetic corpora (see synthetic.py) of 1k, 100k and 1M articles, without any
+network access. The timings are compared against the baselines stored in
+data/benchmark_baselines.json, and any stage that got more than 25% slower is reported as a
+regression (with exit status 1). Only the stages given with --stages are timed, and the
+small corpora are timed several times, keeping the fastest. Baselines are only comparable on
+the machine that recorded them; --update-baselines records new ones.
+
+    python benchmarks.py suite [--sizes 1000 100000] [--stages clean sentiment]
+                               [--update-baselines]
+
+Run from the code folder.
+
+
+Copyright and Usage Information
+===============================
+Code by Anna Myllyniemi, Raghav Arora, Aarya Vatsa and Diva Hidalgo Luna, December 2021
+"""
+import argparse
+import copy
+import csv
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+from nltk.tokenize import sent_tokenize
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
+from analyze_sentiment import SentimentEngine, aggregate_scores, get_engine
+from article_classes import Article, Articles
+from csv_read_write import read_file, write_file
+from create_dataset import clean_dataset, clean_maintext, fix_unicode
+from graphing import AnalysisSession, build_figure
+from synthetic import DOMAINS, generate_corpus
+from text_cleaner import CHAINED_MAX_STRINGS, DEFAULT_BOILERPLATE, TextCleaner
+from vader_numpy import VaderKernel, check_agreement
+
+SUITE_SIZES = (1_000, 100_000, 1_000_000)
+SUITE_STAGES = ('clean', 'csv_write', 'csv_read', 'sentiment', 'filter')
+BASELINES_PATH = './data/benchmark_baselines.json'
+REGRESSION_TOLERANCE = 0.25
+SUITE_REPEATS = 5
+SUITE_REPEAT_MAX_SIZE = 10_000
+# the keyword filters drawn by main.py
+FILTER_KEYWORDS = ['', 'vaccine', 'lockdown', 'Toronto', 'National Post', 'border']
+FIGURE_SIZES = (10_000, 100_000)
+
+
+def load_texts(file_path: str, limit: int = 0) -> dict[str, str]:
+    """Return a mapping of title to maintext for the articles in the csv file at file_path.
+    If limit is positive, only the first limit articles are returned.
+
+    Preconditions:
+        - file_path != ''
+        - limit >= 0
+    """
+    texts = {}
+    with open(file_path, mode='r', encoding='UTF8') as file:
+        for row in csv.DictReader(file):
+            if row['maintext'] != '':
+                texts[row['title']] = row['maintext']
+            if 0 < limit <= len(texts):
+                break
+
+    return texts
+
+
+def time_call(function: Callable, *args: object) -> float:
+    """Return the wall time in seconds taken by calling function with args."""
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def _per_sentence_polarities(texts: dict[str, str]) -> dict[str, float]:
+    """Score texts the way analyze_sentiment originally did, creating a new VADER analyzer
+    (and so reloading the lexicon) for every sentence."""
+    polarities = {}
+    for key, text in texts.items():
+        tokens = sent_tokenize(text)
+        sum_so_far = 0
+        for token in tokens:
+            analyzer = SentimentIntensityAnalyzer()
+            sum_so_far += analyzer.polarity_scores(token)['compound']
+        polarities[key] = sum_so_far / len(tokens)
+
+    return polarities
+
+
+def benchmark_sentiment(texts: dict[str, str]) -> dict[str, float]:
+    """Time the per-sentence analyzer path against a single SentimentEngine batch over texts,
+    check that both produce the same polarities and return the timings in seconds."""
+    start = time.perf_counter()
+    expected = _per_sentence_polarities(texts)
+    per_sentence = time.perf_counter() - start
+
+    start = time.perf_counter()
+    aggregates = SentimentEngine().score_batch(texts)
+    engine = time.perf_counter() - start
+
+    assert all(aggregates[key].mean == expected[key] for key in texts)
+
+    return {'per_sentence': per_sentence, 'engine': engine}
+
+
+def benchmark_sentence_cache(texts: dict[str, str]) -> dict[str, float]:
+    """Time scoring every sentence of texts with a shared analyzer (so nothing repeated across
+    articles is reused) against an engine with the default cache, check that both produce the
+    same polarities, print the hit rate and return the timings."""
+    analyzer = SentimentIntensityAnalyzer()
+    start = time.perf_counter()
+    expected = {key: aggregate_scores([analyzer.polarity_scores(sentence)['compound']
+                                       for sentence in sent_tokenize(text)])
+                for key, text in texts.items()}
+    uncached = time.perf_counter() - start
+
+    engine = SentimentEngine()
+    start = time.perf_counter()
+    aggregates = engine.score_batch(texts)
+    cached = time.perf_counter() - start
+
+    assert aggregates == expected
+    print(f'sentence cache: {engine.cache.stats}')
+
+    return {'uncached': uncached, 'cached': cached}
+
+
+def benchmark_vader_kernel(sentences: list[str]) -> dict[str, float]:
+    """Time scoring sentences with NLTK's VADER against the vectorized kernel of vader_numpy
+    (both without a sentence cache), check that they agree within vader_numpy.TOLERANCE and
+    return their throughputs in sentences per second."""
+    analyzer = SentimentIntensityAnalyzer()
+    start = time.perf_counter()
+    for sentence in sentences:
+        analyzer.polarity_scores(sentence)
+    vader = time.perf_counter() - start
+
+    kernel = VaderKernel(analyzer)
+    start = time.perf_counter()
+    kernel.score(sentences)
+    numpy_kernel = time.perf_counter() - start
+
+    print(f'vader kernel: largest difference {check_agreement(kernel, analyzer, sentences)}')
+    return {'vader': len(sentences) / vader, 'numpy': len(sentences) / numpy_kernel}
+
+
+def print_throughputs(name: str, throughputs: dict[str, float]) -> None:
+    """Print the throughputs in sentences per second of the benchmark called name, relative to
+    the first."""
+    baseline = next(iter(throughputs.values()))
+    print(f'{name}:')
+    for label, rate in throughputs.items():
+        print(f'    {label:<24} {rate:10.0f} sentences/s  ({rate / baseline:.1f}x)')
+
+
+def _chained_fix_unicode(text: str) -> str:
+    """fix_unicode as it was originally written, with one str.replace per character."""
+    clean = text.replace('’', '\'')
+    clean = clean.replace('\n\n', '\n')
+    clean = clean.replace('“', '\"')
+    clean = clean.replace('”', '\"')
+    clean = clean.replace('—', '-')
+    clean = clean.replace('–', '-')
+    clean = clean.replace('é', 'e')
+    clean = clean.replace('‘', '\'')
+    return clean
+
+
+def _chained_clean_maintext(article: Article, boilerplate: list[str]) -> str:
+    """clean_maintext as it was originally written, with one str.replace per boilerplate
+    string followed by _chained_fix_unicode."""
+    if 'Article content' in article.main_text:
+        split_text = article.main_text.split('Article content')
+        if 'Photo by' in split_text[0] or 'Postmedia' in split_text[0]:
+            split_text.pop(0)
+        if 'Share this article in your social network' in split_text[-1]:
+            split_text[-1] = split_text[-1][0: split_text[-1].find
+                                            ('Share this article in your social network')]
+        clean = ''.join(split_text)
+    else:
+        clean = article.main_text
+
+    clean = clean.replace(article.title, '')
+    if article.description is not None:
+        clean = clean.replace(article.description, '')
+    for r in boilerplate:
+        clean = clean.replace(r, '')
+
+    clean = _chained_fix_unicode(clean)
+    return ' '.join(clean.split())
+
+
+def with_boilerplate(article: Article, seed: int) -> Article:
+    """Return a copy of a cleaned article made to look freshly scraped again: curly quotes
+    and dashes, its title and description, and boilerplate strings between its sentences."""
+    raw = copy.copy(article)
+    sentences = article.main_text.replace('\'', '’').replace(' - ', ' — ').split('. ')
+    for i in range(seed % 3, len(sentences), 4):
+        sentences[i] += ' ' + DEFAULT_BOILERPLATE[(seed + i) % len(DEFAULT_BOILERPLATE)]
+    raw.main_text = ('Photo by Postmedia Article content' + article.title + '\n\n'
+                     + article.description + '\n\n' + '. '.join(sentences))
+    return raw
+
+
+def benchmark_cleaning(articles: list[Article], boilerplate: list[str]) -> dict[str, float]:
+    """Time the chained str.replace cleaning against a TextCleaner (including the time to
+    compile it) over articles, removing the strings in boilerplate. Check that both produce the
+    same text and return the timings in seconds. With at most CHAINED_MAX_STRINGS strings, the
+    TextCleaner removes them with chained str.replace calls too."""
+    start = time.perf_counter()
+    expected = [(_chained_clean_maintext(a, boilerplate), _chained_fix_unicode(a.title),
+                 _chained_fix_unicode(a.description)) for a in articles]
+    chained = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cleaner = TextCleaner(boilerplate)
+    actual = [(clean_maintext(a, cleaner), fix_unicode(a.title), fix_unicode(a.description))
+              for a in articles]
+    text_cleaner = time.perf_counter() - start
+
+    assert actual == expected
+
+    return {'chained_replace': chained, 'text_cleaner': text_cleaner}
+
+
+def check_cleaning_adversarial(boilerplate: list[str], n: int, seed: int = 0) -> int:
+    """Check that TextCleaner removes the strings in boilerplate exactly as the chained
+    str.replace calls do, on n random texts made of boilerplate strings, their prefixes and
+    suffixes and a few other words, where removing one string often joins the text around it
+    into another. Return the number of texts checked."""
+    rng = random.Random(seed)
+    cleaner = TextCleaner(boilerplate)
+    for _ in range(n):
+        parts = []
+        for _ in range(rng.randint(1, 8)):
+            string = rng.choice(boilerplate)
+            cut = rng.randint(0, len(string))
+            parts.append(rng.choice([string, string, string[:cut], string[cut:],
+                                     rng.choice(['your browser', 'Try ', ' ', '.', 'x'])]))
+        text = ''.join(parts)
+        expected = text
+        for string in boilerplate:
+            expected = expected.replace(string, '')
+        assert cleaner.remove_boilerplate(text) == expected, f'Cleaned {text!r} differently'
+    return n
+
+
+@dataclass
+class _DictArticle:
+    """Article as it was before it used __slots__, with a per-instance __dict__."""
+    title: str
+    date_published: datetime.datetime
+    authors: list[str]
+    main_text: str
+    source_domain: str
+    url: str
+    description: str
+    average_sentence_polarity: Optional[float] = 0.0
+    text_hash: Optional[str] = None
+
+
+def _synthetic_articles(article_class: type, n: int, intern: bool) -> Articles:
+    """Return an Articles holding n synthetic articles of article_class. All articles share
+    one body, so that the sizes measured are those of the article records themselves."""
+    domains = ['nationalpost.com', 'torontosun.com', 'www.theglobeandmail.com', 'leaderpost.com']
+    start = datetime.datetime(2020, 1, 1)
+    body = 'The province announced new measures today. ' * 20
+
+    articles = Articles()
+    for i in range(n):
+        domain = domains[i % len(domains)]
+        authors = f"['Columnist {i % 500}']"
+        articles.add_article(article_class(
+            title=f'Synthetic article {i}',
+            date_published=start + datetime.timedelta(minutes=i),
+            authors=sys.intern(authors) if intern else authors,
+            main_text=body,
+            source_domain=sys.intern(domain) if intern else ''.join(domain),  # a fresh copy
+            url=f'https://{domain}/news/synthetic-article-{i}',
+            description=f'Description of synthetic article {i}',
+            average_sentence_polarity=(i % 200) / 100 - 1
+        ))
+
+    return articles
+
+
+def benchmark_article_memory(n: int) -> dict[str, float]:
+    """Return the memory in MiB taken by n synthetic articles, stored as dict based articles
+    with repeated strings, and as slotted articles with interned domains and authors."""
+    sizes = {}
+    for name, article_class, intern in (('dict_articles', _DictArticle, False),
+                                        ('slotted_interned', Article, True)):
+        tracemalloc.start()
+        articles = _synthetic_articles(article_class, n, intern)
+        sizes[name] = tracemalloc.get_traced_memory()[0] / 1024 ** 2
+        tracemalloc.stop()
+        del articles
+
+    return sizes
+
+
+def print_sizes(name: str, sizes: dict[str, float]) -> None:
+    """Print the memory sizes in MiB of the benchmark called name, relative to the first."""
+    baseline_name = next(iter(sizes))
+    print(f'{name}:')
+    for label, mib in sizes.items():
+        print(f'    {label:<24} {mib:10.1f}MiB  ({mib / sizes[baseline_name]:.0%})')
+
+
+def _synthetic_frame(n: int, seed: int = 0) -> pd.DataFrame:
+    """Return the graph columns of n synthetic analyzed articles, spread over the date range of
+    the graphs, as graphing.load_frame would load them."""
+    rng = np.random.default_rng(seed)
+    seconds = np.sort(rng.integers(0, 729 * 24 * 60 * 60, n))
+    domains = np.array(DOMAINS)[rng.integers(0, len(DOMAINS), n)]
+    return pd.DataFrame({
+        'title': [f'Synthetic article {i} about the latest public health measures'
+                  for i in range(n)],
+        'url': [f'https://{domain}/news/synthetic-article-{i}' for i, domain in enumerate(domains)],
+        'source_domain': domains,
+        'authors': [f"['Columnist {i % 500}']" for i in range(n)],
+        'date_publish': pd.Timestamp('2020-01-01') + pd.to_timedelta(seconds, unit='s'),
+        'average_sentence_polarity': np.clip(rng.normal(0.08, 0.08, n), -1.0, 1.0)
+    })
+
+
+def benchmark_figures(sizes: tuple[int, ...] = FIGURE_SIZES) -> dict[str, tuple[float, float]]:
+    """Build the scatterplot of synthetic articles of each of sizes with SVG from every article
+    and with WebGL from a downsampled subset, and return the size of each figure's JSON in MiB
+    and the seconds taken to build it and write it to HTML, keyed by '<mode>@<size>'."""
+    results = {}
+    for size in sizes:
+        df = _synthetic_frame(size)
+        for mode, large in (('svg', False), ('webgl', True)):
+            start = time.perf_counter()
+            figure = build_figure(df, '', large)
+            pio.to_html(figure, include_plotlyjs='cdn')
+            seconds = time.perf_counter() - start
+            results[f'{mode}@{size}'] = (len(figure.to_json().encode('UTF8')) / 1024 ** 2,
+                                         seconds)
+
+    return results
+
+
+def print_figure_sizes(name: str, results: dict[str, tuple[float, float]]) -> None:
+    """Print the figure sizes and times of the benchmark called name, with the size of each
+    WebGL figure relative to the SVG figure of the same number of articles."""
+    print(f'{name}:')
+    for label, (mib, seconds) in results.items():
+        svg_mib = results['svg@' + label.split('@')[1]][0]
+        print(f'    {label:<24} {mib:10.2f}MiB ({mib / svg_mib:6.1%})  {seconds:8.3f}s')
+
+
+def run_suite(sizes: tuple[int, ...] = SUITE_SIZES, stages: tuple[str, ...] = SUITE_STAGES,
+              seed: int = 0) -> dict[str, float]:
+    """Time each of stages on a synthetic corpus of each of sizes, and return the seconds each
+    took, keyed by '<stage>@<size>'. Only the stages asked for are timed.
+
+    Corpora of at most SUITE_REPEAT_MAX_SIZE articles are timed SUITE_REPEATS times, keeping
+    the fastest time of each stage, as a single run of so few articles is short enough for
+    noise to exceed REGRESSION_TOLERANCE.
+
+    Preconditions:
+        - all(size >= 1 for size in sizes)
+        - all(stage in SUITE_STAGES for stage in stages)
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, 'articles.csv')
+        for size in sizes:
+            repeats = SUITE_REPEATS if size <= SUITE_REPEAT_MAX_SIZE else 1
+            runs = [_time_stages(size, stages, seed, csv_path) for _ in range(repeats)]
+            for stage in runs[0]:
+                results[f'{stage}@{size}'] = min(run[stage] for run in runs)
+            print(f'{size} articles: ' + ', '.join(
+                f'{stage} {results[f"{stage}@{size}"]:.3f}s' for stage in runs[0]))
+
+    return results
+
+
+def _time_stages(size: int, stages: tuple[str, ...], seed: int,
+                 csv_path: str) -> dict[str, float]:
+    """Time each of stages on a new synthetic corpus of size articles, and return the seconds
+    each took, keyed by stage.
+
+    The stages that are not timed still run where a timed one needs their result: every
+    stage works on cleaned articles, and csv_read and filter read the CSV file csv_write
+    writes to csv_path.
+    """
+    articles = generate_corpus(size, seed)
+    timings = {}
+    if 'clean' in stages:
+        timings['clean'] = time_call(clean_dataset, articles)
+    else:
+        clean_dataset(articles)
+    if 'csv_write' in stages:
+        timings['csv_write'] = time_call(write_file, articles, csv_path)
+    elif 'csv_read' in stages or 'filter' in stages:
+        write_file(articles, csv_path)
+    if 'csv_read' in stages:
+        timings['csv_read'] = time_call(read_file, csv_path)
+    if 'sentiment' in stages:
+        get_engine().cache.clear()  # so each run starts from a cold sentence cache
+        timings['sentiment'] = time_call(articles.run_sentiment)
+    if 'filter' in stages:
+        timings['filter'] = time_call(_filter_all, csv_path)
+    return timings
+
+
+def _filter_all(csv_path: str) -> None:
+    """Load the analyzed articles at csv_path once and filter them by every keyword main.py
+    draws a graph of."""
+    session = AnalysisSession(csv_path)
+    for keyword in FILTER_KEYWORDS:
+        session.filter(keyword)
+
+
+def load_baselines(file_path: str) -> dict:
+    """Return the baselines stored at file_path, or empty baselines if there are none."""
+    if not os.path.exists(file_path):
+        return {'machine': {}, 'results': {}}
+    with open(file_path, mode='r', encoding='UTF8') as file:
+        return json.load(file)
+
+
+def save_baselines(results: dict[str, float], file_path: str) -> None:
+    """Record results as the baselines at file_path, keeping any baselines of other stages and
+    sizes, along with a description of this machine."""
+    baselines = load_baselines(file_path)
+    baselines['machine'] = {'platform': platform.platform(), 'processor': platform.machine(),
+                            'cpus': os.cpu_count(), 'python': platform.python_version()}
+    baselines['results'].update(results)
+    with open(file_path, mode='w', encoding='UTF8') as file:
+        json.dump(baselines, file, indent=2, sort_keys=True)
+
+
+def find_regressions(results: dict[str, float], baselines: dict,
+                     tolerance: float = REGRESSION_TOLERANCE) -> list[str]:
+    """Return a description of each result more than tolerance slower than its baseline."""
+    regressions = []
+    for key, seconds in sorted(results.items()):
+        baseline = baselines['results'].get(key)
+        if baseline is not None and seconds > baseline * (1 + tolerance):
+            regressions.append(f'{key}: {seconds:.3f}s, baseline {baseline:.3f}s '
+                               f'({seconds / baseline - 1:+.0%})')
+
+    return regressions
+
+
+def print_timings(name: str, timings: dict[str, float]) -> None:
+    """Print the timings of the benchmark called name, relative to the first timing."""
+    baseline_name = next(iter(timings))
+    print(f'{name}:')
+    for label, seconds in timings.items():
+        speedup = timings[baseline_name] / seconds if seconds > 0 else float('inf')
+        print(f'    {label:<24} {seconds:10.4f}s  ({speedup:.1f}x)')
+
+
+def run_comparisons() -> None:
+    """Run the comparison benchmarks over the articles in data/ and print their results."""
+    corpus = load_texts('./data/dataset.csv', limit=25)
+    print_timings(f'sentiment ({len(corpus)} articles)', benchmark_sentiment(corpus))
+    texts = load_texts('./data/dataset.csv')
+    print_timings(f'sentence cache ({len(texts)} articles)', benchmark_sentence_cache(texts))
+    sentences = [sentence for text in texts.values() for sentence in sent_tokenize(text)]
+    print_throughputs(f'vader kernel ({len(sentences)} sentences)',
+                      benchmark_vader_kernel(sentences))
+
+    dataset = read_file('./data/dataset.csv')
+    raw_articles = [with_boilerplate(dataset.get_article(key), seed)
+                    for seed, key in enumerate(sorted(dataset.get_keys()))] * 20
+    print_timings(f'cleaning ({len(raw_articles)} articles, {len(DEFAULT_BOILERPLATE)} strings)',
+                  benchmark_cleaning(raw_articles, DEFAULT_BOILERPLATE))
+
+    # Publication specific lists add to the common strings; past CHAINED_MAX_STRINGS strings, the
+    # cleaner makes a single scan, where the chained replaces make one scan per string.
+    publication_boilerplate = DEFAULT_BOILERPLATE + [
+        f'Subscribe to the {name} newsletter for section {section}'
+        for name in ('Leader-Post', 'StarPhoenix', 'Calgary Herald', 'Ottawa Citizen')
+        for section in range(50)
+    ]
+    print_timings(f'cleaning ({len(raw_articles)} articles, '
+                  f'{len(publication_boilerplate)} strings)',
+                  benchmark_cleaning(raw_articles, publication_boilerplate))
+    # strings that overlap or are joined into one another by a removal, in cleaners long enough
+    # to scan with their compiled pattern
+    fillers = [f'filler {i}' for i in range(CHAINED_MAX_STRINGS)]
+    for boilerplate in (publication_boilerplate, ['XA', 'AB', 'A', 'XAB', 'B', 'BA'] + fillers):
+        print(f'cleaning: {check_cleaning_adversarial(boilerplate, 20_000)} adversarial '
+              f'texts cleaned as the chained replaces do')
+
+    print_sizes('article memory (1,000,000 articles)', benchmark_article_memory(1_000_000))
+    print_figure_sizes('figures (payload, build and HTML time)', benchmark_figures())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the stages of the project.')
+    subparsers = parser.add_subparsers(dest='command')
+    suite_parser = subparsers.add_parser('suite', help='run the synthetic benchmark suite')
+    suite_parser.add_argument('--sizes', type=int, nargs='+', default=list(SUITE_SIZES))
+    suite_parser.add_argument('--stages', nargs='+', choices=SUITE_STAGES,
+                              default=list(SUITE_STAGES))
+    suite_parser.add_argument('--seed', type=int, default=0)
+    suite_parser.add_argument('--update-baselines', action='store_true')
+    arguments = parser.parse_args()
+
+    if arguments.command != 'suite':
+        run_comparisons()
+    else:
+        suite_results = run_suite(tuple(arguments.sizes), tuple(arguments.stages),
+                                  arguments.seed)
+        if arguments.update_baselines:
+            save_baselines(suite_results, BASELINES_PATH)
+            print(f'Saved {len(suite_results)} baselines to {BASELINES_PATH}')
+        else:
+            found = find_regressions(suite_results, load_baselines(BASELINES_PATH))
+            for regression in found:
+                print(f'REGRESSION {regression}')
+            sys.exit(1 if found else 0)
@@ -0,0 +1,231 @@
+"""
+A columnar binary storage format for Articles, as an alternative to the CSV files of
+csv_read_write. A dataset is a folder holding one file per column:
+
+    - date_publish.npy: datetime64[s] NumPy array
+    - average_sentence_polarity.npy: float64 NumPy array
+    - <column>.offsets.npy and <column>.data for each text column: the UTF-8 encoded values
+      one after another, and the int64 offset of each value in the data file (plus the end)
+    - columns.json: the number of rows and the format version
+
+Every column is memory-mapped when read, so a reader only pays for the columns it uses. In
+particular the article bodies (maintext) are only read by readers that ask for them; the
+graphing step can load the metadata and scores of every article without them.
+
+
+Copyright and Usage Information
+===============================
+Code by Anna Myllyniemi and Raghav Arora, December 2021
+"""
+import datetime
+import json
+import os
+from typing import Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from article_classes import Article, Articles
+from csv_read_write import read_file, write_file
+
+FORMAT_VERSION = 1
+TEXT_COLUMNS = ['title', 'url', 'source_domain', 'description', 'authors', 'text_hash',
+                'themes', 'maintext']
+NUMERIC_COLUMNS = ['date_publish', 'average_sentence_polarity']
+ALL_COLUMNS = TEXT_COLUMNS[:-1] + NUMERIC_COLUMNS + ['maintext']
+# columns that datasets written before they were added do not have
+OPTIONAL_COLUMNS = ['themes']
+
+
+class TextColumn:
+    """A memory-mapped column of strings. Values are decoded when they are accessed.
+
+    Private Instance Attributes:
+       - _offsets: the offset of each value in _data, followed by the end of the last value
+       - _data: the UTF-8 encoded values
+    """
+    _offsets: np.ndarray
+    _data: Union[np.ndarray, bytes]
+
+    def __init__(self, directory: str, name: str) -> None:
+        """Map the text column called name of the dataset in directory."""
+        self._offsets = np.load(os.path.join(directory, f'{name}.offsets.npy'), mmap_mode='r')
+        data_path = os.path.join(directory, f'{name}.data')
+        if os.path.getsize(data_path) == 0:
+            self._data = b''  # empty files cannot be memory-mapped
+        else:
+            self._data = np.memmap(data_path, dtype=np.uint8, mode='r')
+
+    def __len__(self) -> int:
+        """Return the number of values in the column."""
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        """Return the value in row i."""
+        return bytes(self._data[self._offsets[i]:self._offsets[i + 1]]).decode('UTF8')
+
+    def to_list(self) -> list[str]:
+        """Return every value in the column."""
+        data = bytes(self._data)
+        offsets = self._offsets.tolist()
+        return [data[offsets[i]:offsets[i + 1]].decode('UTF8') for i in range(len(self))]
+
+
+def write_columnar(a: Articles, directory: str) -> None:
+    """Save the articles in a as a columnar dataset in directory, creating the folder if needed.
+
+    Text is written as write_file would write it to a CSV file, so that converting between the
+    two formats gives back the same data.
+
+    Preconditions:
+        - directory != ''
+    """
+    os.makedirs(directory, exist_ok=True)
+    arts = [a.get_article(key) for key in a.get_keys()]
+
+    dates = np.array([art.date_published for art in arts], dtype='datetime64[s]')
+    np.save(os.path.join(directory, 'date_publish.npy'), dates)
+    polarities = np.array([art.average_sentence_polarity for art in arts], dtype=np.float64)
+    np.save(os.path.join(directory, 'average_sentence_polarity.npy'), polarities)
+
+    columns = {
+        'title': (art.title for art in arts),
+        'url': (art.url for art in arts),
+        'source_domain': (art.source_domain for art in arts),
+        'description': (art.description for art in arts),
+        'authors': (art.authors for art in arts),
+        'text_hash': (art.text_hash for art in arts),
+        'themes': (art.themes for art in arts),
+        'maintext': (art.main_text for art in arts),
+    }
+    for name, values in columns.items():
+        _write_text_column(directory, name, values)
+
+    with open(os.path.join(directory, 'columns.json'), mode='w', encoding='UTF8') as file:
+        json.dump({'version': FORMAT_VERSION, 'rows': len(arts)}, file)
+
+
+def _write_text_column(directory: str, name: str, values: Iterable[object]) -> None:
+    """Write the text column called name, one value at a time. None is written as an empty
+    string and anything else as its str, like csv.writer does."""
+    offsets = [0]
+    with open(os.path.join(directory, f'{name}.data'), mode='wb') as file:
+        for value in values:
+            encoded = ('' if value is None else str(value)).encode('UTF8')
+            file.write(encoded)
+            offsets.append(offsets[-1] + len(encoded))
+
+    np.save(os.path.join(directory, f'{name}.offsets.npy'), np.array(offsets, dtype=np.int64))
+
+
+def load_columns(directory: str,
+                 columns: Optional[list[str]] = None) -> dict[str, Union[np.ndarray, TextColumn]]:
+    """Return the columns of the dataset in directory, memory-mapped. If columns is None,
+    every column is returned. OPTIONAL_COLUMNS the dataset does not have are left out.
+
+    Preconditions:
+        - columns is None or all(column in ALL_COLUMNS for column in columns)
+    """
+    with open(os.path.join(directory, 'columns.json'), mode='r', encoding='UTF8') as file:
+        version = json.load(file)['version']
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported columnar dataset version {version} in {directory}')
+
+    loaded = {}
+    for name in (ALL_COLUMNS if columns is None else columns):
+        if name in OPTIONAL_COLUMNS and not os.path.exists(os.path.join(directory, f'{name}.data')):
+            continue
+        if name in NUMERIC_COLUMNS:
+            loaded[name] = np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+        else:
+            loaded[name] = TextColumn(directory, name)
+
+    return loaded
+
+
+def read_frame(directory: str, columns: Optional[list[str]] = None) -> pd.DataFrame:
+    """Return the given columns of the dataset in directory as a DataFrame, with the same
+    columns as reading the equivalent CSV file with pandas and parsing its date_publish column.
+    Only the requested columns are read from disk.
+
+    Preconditions:
+        - columns is None or all(column in ALL_COLUMNS for column in columns)
+    """
+    loaded = load_columns(directory, columns)
+    data = {}
+    for name, column in loaded.items():
+        if isinstance(column, TextColumn):
+            data[name] = column.to_list()
+        else:
+            data[name] = np.asarray(column)
+
+    frame = pd.DataFrame(data)
+    if 'date_publish' in frame:
+        frame['date_publish'] = frame['date_publish'].astype('datetime64[ns]')
+    return frame
+
+
+def read_columnar(directory: str) -> Articles:
+    """Read the columnar dataset in directory into an Articles object, in the same form as
+    read_file reads a CSV file.
+
+    Preconditions:
+        - directory != ''
+    """
+    loaded = load_columns(directory)
+    text = {name: loaded[name].to_list() for name in TEXT_COLUMNS if name in loaded}
+    dates = loaded['date_publish'].astype(datetime.datetime)
+    polarities = loaded['average_sentence_polarity'].tolist()
+
+    articles = Articles()
+    for i in range(len(polarities)):
+        articles.add_article(Article(
+            title=text['title'][i],
+            date_published=dates[i],
+            authors=text['authors'][i],
+            main_text=text['maintext'][i],
+            source_domain=text['source_domain'][i],
+            url=text['url'][i],
+            average_sentence_polarity=polarities[i],
+            description=text['description'][i],
+            text_hash=text['text_hash'][i] or None,
+            themes=text['themes'][i] if 'themes' in text else None
+        ))
+
+    return articles
+
+
+def csv_to_columnar(csv_path: str, directory: str) -> None:
+    """Convert the CSV file at csv_path (as written by write_file) to a columnar dataset.
+
+    Preconditions:
+        - csv_path != '' and directory != ''
+    """
+    write_columnar(read_file(csv_path), directory)
+
+
+def columnar_to_csv(directory: str, csv_path: str) -> None:
+    """Convert the columnar dataset in directory to a CSV file, as written by write_file.
+
+    Preconditions:
+        - csv_path != '' and directory != ''
+    """
+    write_file(read_columnar(directory), csv_path)
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'allowed-io': ['write_columnar', '_write_text_column', 'load_columns'],
+        'extra-imports': [
+            'python_ta.contracts', 'datetime', 'json', 'os', 'typing', 'numpy', 'pandas',
+            'article_classes', 'csv_read_write'
+        ],
+        'max-line-length': 100,
+        'max-nested-blocks': 4,
+        'disable': ['R1705', 'C0200', 'E9998']
+    })
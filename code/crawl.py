@@ -0,0 +1,351 @@
+"""
+Concurrent, resumable crawling of the news articles listed in data/links.txt. Pages are fetched
+by a bounded pool of threads, with a minimum interval between requests to the same host and a
+timeout on every request. Each extracted article is checkpointed to disk as soon as it has been
+fetched, so a crawl that is interrupted can be rerun and will skip every URL already done.
+
+Pages can also be kept in a PageCache between crawls. A cached page is reused without a
+request while it is fresh, and is otherwise revalidated with its ETag/Last-Modified validators,
+so pages that have not changed upstream are neither downloaded nor parsed again.
+
+The fetch layer is a plain function (see Fetcher), so a crawl can be pointed at a local HTTP
+server or any other stand-in.
+
+
+Copyright and Usage Information
+===============================
+Code by Anna Myllyniemi, December 2021
+"""
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from typing import Callable, Iterable, Iterator, Optional
+from urllib.parse import urlparse
+
+from page_cache import PageCache
+
+USER_AGENT = 'Mozilla/5.0 (compatible; csc110-project-crawler)'
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FetchResult:
+    """The response to fetching a single URL.
+
+    Instance Attributes:
+       - url: the URL that was fetched
+       - status: the HTTP status code of the response
+       - body: the decoded body of the response
+       - headers: the response headers, with lower case names
+    """
+    url: str
+    status: int
+    body: str
+    headers: dict[str, str]
+
+
+# A fetcher takes a URL, a timeout in seconds and extra request headers and returns the
+# response, raising OSError (which includes urllib's URLError and socket timeouts) if the page
+# could not be fetched. A 304 Not Modified answer to a conditional request is returned rather
+# than raised.
+Fetcher = Callable[[str, float, dict[str, str]], FetchResult]
+
+
+@dataclass
+class ScrapedArticle:
+    """The fields extracted from a crawled page that setup_articles needs. This has the same
+    attribute names as the NewsArticle objects returned by NewsPlease, but can be saved to and
+    loaded from JSON.
+
+    Instance Attributes:
+       - title: the title of the article
+       - date_publish: the date the article was published, if it could be found
+       - authors: the name of the author(s)
+       - maintext: the body of the article
+       - source_domain: the domain the article was published on
+       - url: the URL of the article
+       - description: brief description of the article
+    """
+    title: Optional[str]
+    date_publish: Optional[datetime.datetime]
+    authors: list[str]
+    maintext: Optional[str]
+    source_domain: Optional[str]
+    url: str
+    description: Optional[str]
+
+    def to_json(self) -> dict:
+        """Return a JSON serializable dictionary of this article."""
+        fields = asdict(self)
+        if self.date_publish is not None:
+            fields['date_publish'] = self.date_publish.isoformat()
+        return fields
+
+    @staticmethod
+    def from_json(fields: dict) -> 'ScrapedArticle':
+        """Return the article saved in fields by to_json."""
+        fields = dict(fields)
+        if fields['date_publish'] is not None:
+            fields['date_publish'] = datetime.datetime.fromisoformat(fields['date_publish'])
+        return ScrapedArticle(**fields)
+
+
+class HostRateLimiter:
+    """Spaces out requests so that the same host is sent at most one request every
+    min_interval seconds, no matter how many threads are crawling.
+
+    Private Instance Attributes:
+       - _min_interval: the minimum number of seconds between two requests to a host
+       - _next_slot: the earliest time (by time.monotonic) the next request to each host may
+       be sent
+       - _lock: guards _next_slot
+    """
+    _min_interval: float
+    _next_slot: dict[str, float]
+    _lock: threading.Lock
+
+    def __init__(self, min_interval: float) -> None:
+        """Initialise a rate limiter with no requests made yet."""
+        self._min_interval = min_interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str) -> None:
+        """Block until a request to the host of url may be sent, and reserve that slot."""
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self._min_interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class CrawlCheckpoint:
+    """A folder holding one JSON file per article crawled so far.
+
+    Private Instance Attributes:
+       - _directory: the path of the folder
+    """
+    _directory: str
+
+    def __init__(self, directory: str) -> None:
+        """Initialise a checkpoint in directory, creating the folder if needed."""
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url: str) -> str:
+        """Return the path of the file the article at url is saved in."""
+        name = hashlib.sha1(url.encode('UTF8')).hexdigest()
+        return os.path.join(self._directory, f'{name}.json')
+
+    def contains(self, url: str) -> bool:
+        """Return whether the article at url has already been crawled."""
+        return os.path.exists(self._path(url))
+
+    def load(self, url: str) -> ScrapedArticle:
+        """Return the saved article that was crawled from url."""
+        with open(self._path(url), mode='r', encoding='UTF8') as file:
+            return ScrapedArticle.from_json(json.load(file))
+
+    def save(self, url: str, article: ScrapedArticle) -> None:
+        """Save the article crawled from url. The file is written under a temporary name and
+        renamed, so a crash never leaves a partially written checkpoint behind."""
+        path = self._path(url)
+        with open(path + '.tmp', mode='w', encoding='UTF8') as file:
+            json.dump(article.to_json(), file)
+        os.replace(path + '.tmp', path)
+
+    def discard(self, url: str) -> None:
+        """Forget the article crawled from url, if there is one, so it is crawled again."""
+        if self.contains(url):
+            os.remove(self._path(url))
+
+
+def urllib_fetch(url: str, timeout: float, headers: dict[str, str]) -> FetchResult:
+    """Fetch url with urllib. This is the default Fetcher."""
+    request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT, **headers})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            charset = response.headers.get_content_charset() or 'utf-8'
+            body = response.read().decode(charset, errors='replace')
+            response_headers = {name.lower(): value for name, value in response.headers.items()}
+            return FetchResult(url=url, status=response.status, body=body,
+                               headers=response_headers)
+    except urllib.error.HTTPError as error:
+        if error.code != 304:
+            raise
+        response_headers = {name.lower(): value for name, value in error.headers.items()}
+        return FetchResult(url=url, status=304, body='', headers=response_headers)
+
+
+def extract_article(html: str, url: str) -> ScrapedArticle:
+    """Extract the article in the page html that was fetched from url."""
+    # imported here, as NewsPlease and its dependencies take a while to load
+    from newsplease import NewsPlease
+
+    news_article = NewsPlease.from_html(html, url=url, fetch_images=False)
+    return ScrapedArticle(
+        title=news_article.title,
+        date_publish=news_article.date_publish,
+        authors=list(news_article.authors or []),
+        maintext=news_article.maintext,
+        source_domain=news_article.source_domain,
+        url=url,
+        description=news_article.description
+    )
+
+
+def read_links(links_path: str) -> list[str]:
+    """Return the URLs in the file at links_path, one per non-empty line.
+
+    Preconditions:
+        - links_path != ''
+    """
+    return list(iter_links(links_path))
+
+
+def iter_links(links_path: str) -> Iterator[str]:
+    """Yield the URLs in the file at links_path, one per non-empty line, reading the file one
+    line at a time.
+
+    Preconditions:
+        - links_path != ''
+    """
+    with open(links_path, mode='r', encoding='UTF8') as file:
+        for line in file:
+            if line.strip() != '':
+                yield line.strip()
+
+
+def fetch_article(url: str, fetcher: Fetcher, timeout: float,
+                  cache: Optional[PageCache] = None) -> ScrapedArticle:
+    """Return the article at url, fetching and extracting it unless cache can answer instead.
+
+    A fresh cache entry is returned without a request. A stale one is revalidated with a
+    conditional request, and a page downloaded again with an unchanged body is not parsed
+    again. Anything newly downloaded is added to cache.
+    """
+    cached = cache.get(url) if cache is not None else None
+    if cached is not None and cache.is_fresh(cached):
+        return _cached_article(cached.fields, url)
+
+    result = fetcher(url, timeout, cached.validators() if cached is not None else {})
+    if result.status == 304 and cached is not None:
+        cache.revalidated(cached)
+        return _cached_article(cached.fields, url)
+
+    same_body = cache.find_body(result.body) if cache is not None else None
+    if same_body is not None:
+        article = _cached_article(same_body.fields, url)
+    else:
+        article = extract_article(result.body, url)
+
+    if cache is not None:
+        cache.put(url, result.body, result.headers, article.to_json())
+    return article
+
+
+def _cached_article(fields: dict, url: str) -> ScrapedArticle:
+    """Return the article saved in a cache entry, as crawled from url."""
+    article = ScrapedArticle.from_json(fields)
+    article.url = url
+    return article
+
+
+def iter_crawl(urls: Iterable[str], checkpoint: Optional[CrawlCheckpoint] = None,
+               fetcher: Fetcher = urllib_fetch, max_workers: int = 8,
+               min_host_interval: float = 1.0, timeout: float = 30.0,
+               cache: Optional[PageCache] = None) -> Iterator[ScrapedArticle]:
+    """Crawl urls and yield each article as soon as it has been fetched and extracted.
+
+    At most max_workers pages are fetched at once, and at most two pages per worker are held
+    in memory waiting to be yielded. Articles already in checkpoint are loaded instead of
+    fetched, and newly crawled articles are added to it. Pages are fetched through cache, if
+    one is given (see fetch_article). URLs that fail to fetch or extract are logged and
+    skipped, so a rerun will try them again.
+
+    Preconditions:
+        - max_workers >= 1
+        - min_host_interval >= 0
+        - timeout > 0
+    """
+    limiter = HostRateLimiter(min_host_interval)
+
+    def crawl_one(url: str) -> Optional[ScrapedArticle]:
+        cached = cache.get(url) if cache is not None else None
+        if cached is None or not cache.is_fresh(cached):
+            limiter.wait(url)  # only pages that need a request count against the host's rate
+        try:
+            article = fetch_article(url, fetcher, timeout, cache)
+        except Exception as error:  # a single bad page must not stop the crawl
+            logger.warning('Could not crawl %s: %s', url, error)
+            return None
+
+        if checkpoint is not None:
+            checkpoint.save(url, article)
+        return article
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending: set[Future] = set()
+        for url in urls:
+            if checkpoint is not None and checkpoint.contains(url):
+                yield checkpoint.load(url)
+                continue
+
+            pending.add(executor.submit(crawl_one, url))
+            if len(pending) >= 2 * max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from _completed_articles(done)
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            yield from _completed_articles(done)
+
+
+def _completed_articles(done: set[Future]) -> Iterator[ScrapedArticle]:
+    """Yield the article of each future in done that crawled successfully."""
+    for future in done:
+        article = future.result()
+        if article is not None:
+            yield article
+
+
+def crawl(urls: Iterable[str], checkpoint: Optional[CrawlCheckpoint] = None,
+          fetcher: Fetcher = urllib_fetch, max_workers: int = 8,
+          min_host_interval: float = 1.0, timeout: float = 30.0,
+          cache: Optional[PageCache] = None) -> dict[str, ScrapedArticle]:
+    """Crawl urls with iter_crawl and return a mapping of URL to the article crawled from it,
+    in the same form as NewsPlease.from_file."""
+    articles = iter_crawl(urls, checkpoint, fetcher, max_workers, min_host_interval, timeout,
+                          cache)
+    return {article.url: article for article in articles}
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'allowed-io': ['CrawlCheckpoint.load', 'CrawlCheckpoint.save', 'iter_links'],
+        'extra-imports': [
+            'python_ta.contracts', 'datetime', 'hashlib', 'json', 'logging', 'os', 'threading',
+            'time', 'urllib.error', 'urllib.request', 'urllib.parse', 'concurrent.futures',
+            'dataclasses', 'typing', 'newsplease', 'page_cache'
+        ],
+        'max-line-length': 100,
+        'max-nested-blocks': 4,
+        'disable': ['R1705', 'C0200', 'E9998', 'W0703']
+    })
@@ -1,6 +1,8 @@
 """
-Creates a CSV file containing data scraped from news articles. Scrapes websites using NewsPlease,
-cleans the maintext, and creates the csv file.
+Creates a CSV file containing data scraped from news articles. Crawls websites concurrently
+(see crawl.py), extracts the articles using NewsPlease, cleans the maintext, tags each article
+with its themes, locations and publication (see themes.py), drops syndicated copies of the same
+story (see dedup.py), and creates the csv file.
 
 
 Copyright and Usage Information
@@ -8,109 +10,149 @@ Copyright and Usage Information
 Code by Anna Myllyniemi, December 2021
 """
 import datetime
-from newsplease import NewsPlease
+import sys
+from typing import Optional
+from crawl import CrawlCheckpoint, crawl, read_links
+from page_cache import PageCache
+from text_cleaner import DEFAULT_CLEANER, TextCleaner, cleaner_for, fix_unicode, \
+    load_publication_cleaners
 from csv_read_write import write_file
+from dedup import find_duplicates, remove_duplicates, write_syndication
+from profiling import NULL_PROFILER, Profiler
+from themes import tag_dataset
 from article_classes import Article, Articles
 
 
-def create_dataset(links_path: str, dataset_save_path: str) -> None:
+def create_dataset(links_path: str, dataset_save_path: str,
+                   checkpoint_dir: Optional[str] = None, max_workers: int = 8,
+                   cache_dir: Optional[str] = None, boilerplate_dir: Optional[str] = None,
+                   syndication_save_path: Optional[str] = None,
+                   profiler: Profiler = NULL_PROFILER) -> None:
     """Calling this function from main.py calls all the necessary functions to scrape the news
     articles, clean the data, and save it into a csv file.
 
+    If checkpoint_dir is given, every crawled article is saved there as soon as it is fetched,
+    and articles already saved there are not crawled again. If cache_dir is given, pages are
+    kept in a PageCache there between runs, so pages that have not changed upstream are not
+    downloaded or parsed again. If boilerplate_dir is given, the publication specific
+    boilerplate files in it are removed from articles of those publications when cleaning.
+
+    If syndication_save_path is given, duplicate and near-duplicate articles are removed after
+    cleaning, so each story is only scored and graphed once, and the links between each kept
+    article and its removed copies are saved there.
+
+    The fetch, setup_articles, clean_dataset, tag_dataset, dedup and write_file stages are
+    measured by profiler.
+
     Preconditions:
         - links_path != '' and dataset_save_path != ''
+        - max_workers >= 1
     """
-    scraped_arts = NewsPlease.from_file(links_path)
-    articles = setup_articles(scraped_arts)
-    clean_dataset(articles)
-    write_file(articles, dataset_save_path)
-
-
-def setup_articles(scraped_articles: dict) -> Articles:
+    checkpoint = CrawlCheckpoint(checkpoint_dir) if checkpoint_dir is not None else None
+    cache = PageCache(cache_dir) if cache_dir is not None else None
+    with profiler.stage('fetch') as stage:
+        scraped_arts = crawl(read_links(links_path), checkpoint, max_workers=max_workers,
+                             cache=cache)
+        stage.items = len(scraped_arts)
+    if cache is not None:
+        cache.close()
+
+    # keyed by URL until duplicates are removed, so syndicated copies with the same title are
+    # all compared and recorded
+    with profiler.stage('setup_articles', items=len(scraped_arts)):
+        articles = setup_articles(scraped_arts, key='url')
+
+    cleaners = load_publication_cleaners(boilerplate_dir) if boilerplate_dir is not None else None
+    with profiler.stage('clean_dataset', items=len(articles.get_keys())):
+        clean_dataset(articles, cleaners)
+
+    with profiler.stage('tag_dataset', items=len(articles.get_keys())):
+        tag_dataset(articles)
+
+    if syndication_save_path is not None:
+        with profiler.stage('dedup', items=len(articles.get_keys())):
+            clusters = find_duplicates(articles)
+            write_syndication(articles, clusters, syndication_save_path)
+            remove_duplicates(articles, clusters)
+    articles = articles.rekeyed('title')
+
+    with profiler.stage('write_file', items=len(articles.get_keys())):
+        write_file(articles, dataset_save_path)
+
+
+def setup_articles(scraped_articles: dict, key: str = 'title') -> Articles:
     """Takes the dictionary from the scraper and creates a populated articles object that will be
-    later cleaned.
+    later cleaned. The articles are keyed by their key attribute (see Articles).
 
 
     Preconditions:
         - scraped_articles != {}
     """
-    a = Articles()
-    for key in scraped_articles.keys():
-        scr_art = scraped_articles[key]
-        art = Article(
-            title=scr_art.title,
-            date_published=scr_art.date_publish,
-            authors=scr_art.authors,
-            main_text=scr_art.maintext,
-            source_domain=scr_art.source_domain,
-            url=scr_art.url,
-            description=scr_art.description
-        )
-        a.add_article(art)
+    a = Articles(key)
+    for url in scraped_articles.keys():
+        a.add_article(build_article(scraped_articles[url]))
 
     return a
 
 
-def clean_dataset(arts: Articles) -> None:
-    """ Mutates and cleans data in articles.
+def build_article(scr_art: object) -> Article:
+    """Create the (not yet cleaned) Article for a single article from the scraper, which has
+    the attributes of a NewsPlease NewsArticle."""
+    return Article(
+        title=scr_art.title,
+        date_published=scr_art.date_publish,
+        authors=scr_art.authors,
+        main_text=scr_art.maintext,
+        source_domain=None if scr_art.source_domain is None else sys.intern(scr_art.source_domain),
+        url=scr_art.url,
+        description=scr_art.description
+    )
+
+
+def clean_dataset(arts: Articles, cleaners: Optional[dict[str, TextCleaner]] = None) -> None:
+    """ Mutates and cleans data in articles. cleaners maps source domains to the TextCleaner
+    used for articles from that publication; other articles use DEFAULT_CLEANER.
 
 
     Preconditions:
         - arts._articles != {}
     """
     for key in arts.get_keys():
-        article = arts.get_article(key)
+        clean_article(arts.get_article(key), cleaners)
+
 
-        if article.main_text is not None:
-            article.main_text = clean_maintext(article)
-        else:
-            article.main_text = ''
+def clean_article(article: Article, cleaners: Optional[dict[str, TextCleaner]] = None) -> None:
+    """ Mutates and cleans a single article, as clean_dataset does for each article."""
+    if article.main_text is not None:
+        article.main_text = clean_maintext(article, cleaner_for(article.source_domain, cleaners))
+    else:
+        article.main_text = ''
 
-        if article.title is not None:
-            article.title = fix_unicode(article.title)
-        else:
-            article.title = ''
+    if article.title is not None:
+        article.title = fix_unicode(article.title)
+    else:
+        article.title = ''
 
-        if article.description is not None:
-            article.description = fix_unicode(article.description)
-        else:
-            article.description = ''
+    if article.description is not None:
+        article.description = fix_unicode(article.description)
+    else:
+        article.description = ''
 
-        if article.date_published is None:
-            article.date_published = datetime.datetime(2000, 1, 1)
+    if article.date_published is None:
+        article.date_published = datetime.datetime(2000, 1, 1)
 
 
-def clean_maintext(article: Article) -> str:
+def clean_maintext(article: Article, cleaner: TextCleaner = DEFAULT_CLEANER) -> str:
     """ Clean maintext of article by removing content unrelated to the body of the article and
     reformating. Returns the cleaned maintext.
 
+    The boilerplate strings removed, and the characters fixed, are those of cleaner.
+
 
     Preconditions:
         - article is not None
         - article.main_text != ''
     """
-
-    # list of common strings to remove from maintext that are not part of the article body.
-    remove = ['This advertisement has not loaded yet, but your article continues below.',
-              'Share this Story:',
-              'Advertisement Story continues below',
-              'This advertisement has not loaded yet, '
-              'but your article continues below.',
-              'We apologize, but this video has failed to load.',
-              'Try refreshing your browser.',
-              'Share this article in your social network',
-              'Latest National Stories',
-              'News Near Portage',
-              'The news seems to be flying at us faster all the time. From COVID-19 updates to '
-              'politics and crime and everything in between, it can be hard to keep up. With that '
-              'in mind, the Regina Leader-Post has created an Afternoon Headlines newsletter that '
-              'can be delivered daily to your inbox to help make sure you are up to date with the '
-              'most vital news of the day. Click here to subscribe.',
-              'tap here to see other videos from our team.',
-              'Back to video',
-              'Try refreshing your browser, or',
-              ]
-
     # split text by 'Article content' and remove first index of the list if it contains
     # content irrelevant to the body of the article, and also remove subscription related text
     # at the end
@@ -136,33 +178,8 @@ def clean_maintext(article: Article) -> str:
     if description is not None:
         clean = clean.replace(description, '')  # remove description from maintext
 
-    # loop through the list of strings to remove
-    for r in remove:
-        clean = clean.replace(r, '')
-
-    clean = fix_unicode(clean)
-    clean = ' '.join(clean.split())  # replace multiple whitespaces with a single whitespace
-
-    return clean
-
-
-def fix_unicode(text: str) -> str:
-    """ Clean characters.
-
-
-    Preconditions:
-        - text != ''
-    """
-    clean = text.replace('’', '\'')  # replace apostrophes with single quotation
-    clean = clean.replace('\n\n', '\n')  # replace two newlines with one newline
-    clean = clean.replace('“', '\"')  # replace double quotes with escaped double quotes
-    clean = clean.replace('”', '\"')  # replace double quotes with escaped double quotes
-    clean = clean.replace('—', '-')
-    clean = clean.replace('–', '-')
-    clean = clean.replace('é', 'e')
-    clean = clean.replace('‘', '\'')
-
-    return clean
+    # remove boilerplate, fix unicode and collapse whitespace in a single pass
+    return cleaner.clean(clean)
 
 
 if __name__ == '__main__':
@@ -174,7 +191,9 @@ if __name__ == '__main__':
     python_ta.check_all(config={
         'allowed-io': ['run_example'],
         'extra-imports': [
-            'python_ta.contracts', 'datetime', 'newsplease', 'csv_read_write', 'article_classes'
+            'python_ta.contracts', 'datetime', 'sys', 'typing', 'crawl', 'page_cache',
+            'text_cleaner', 'csv_read_write', 'dedup', 'profiling', 'themes',
+            'article_classes'
         ],
         'max-line-length': 100,
         'max-nested-blocks': 4,
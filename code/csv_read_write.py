@@ -1,5 +1,8 @@
 """Read and write CSV files.
 
+The source domain and authors of the articles read are interned, so the many articles from
+the same publication or author share a single copy of those strings.
+
 
 Copyright and Usage Information
 ===============================
@@ -7,8 +10,13 @@ Code by Anna Myllyniemi and Raghav Arora, December 2021
 """
 import csv
 import datetime
+import sys
+from typing import Iterable
 from article_classes import Article, Articles
 
+HEADER = ['title', 'url', 'source_domain', 'description', 'authors', 'date_publish',
+          'average_sentence_polarity', 'text_hash', 'themes', 'maintext']
+
 
 def read_file(file_path: str) -> Articles:
     """Read csv file and populate Articles object where each row in the csv is an item in
@@ -27,12 +35,14 @@ def read_file(file_path: str) -> Articles:
                 date_published=datetime.datetime.strptime(
                     row['date_publish'], "%Y-%m-%d %H:%M:%S"
                 ),
-                authors=row['authors'],
+                authors=sys.intern(row['authors']),
                 main_text=row['maintext'],
-                source_domain=row['source_domain'],
+                source_domain=sys.intern(row['source_domain']),
                 url=row['url'],
-                average_sentence_polarity=row['average_sentence_polarity'],
-                description=row['description']
+                average_sentence_polarity=float(row['average_sentence_polarity']),
+                description=row['description'],
+                text_hash=row.get('text_hash') or None,  # older files have no text_hash column
+                themes=row.get('themes') or None  # nor themes
             )
             articles.add_article(article)
 
@@ -47,22 +57,39 @@ def write_file(a: Articles, file_path: str) -> None:
         - file_path != ''
         - a._articles != {}
     """
+    write_articles((a.get_article(key) for key in a.get_keys()), file_path)
+
+
+def write_articles(articles: Iterable[Article], file_path: str) -> int:
+    """Create a csv file containing articles, writing each row as soon as its article is
+    produced, and return the number of articles written. Only one article is held in memory
+    at a time, so articles may be a generator over any number of articles.
+
+    Preconditions:
+        - file_path != ''
+    """
+    count = 0
     # open the file in the write mode
     with open(file_path, 'w', encoding='UTF8', newline='') as f:
         # create the csv writer
         writer = csv.writer(f)
 
         # create header
-        header = ['title', 'url', 'source_domain', 'description', 'authors', 'date_publish',
-                  'average_sentence_polarity', 'maintext']
-        writer.writerow(header)
+        writer.writerow(HEADER)
 
         # create each row
-        for key in a.get_keys():
-            art = a.get_article(key)
-            row = [art.title, art.url, art.source_domain, art.description, art.authors,
-                   art.date_published, art.average_sentence_polarity, art.main_text]
-            writer.writerow(row)
+        for art in articles:
+            writer.writerow(article_to_row(art))
+            count += 1
+
+    return count
+
+
+def article_to_row(art: Article) -> list:
+    """Return the csv row of art, in the order of HEADER."""
+    return [art.title, art.url, art.source_domain, art.description, art.authors,
+            art.date_published, art.average_sentence_polarity, art.text_hash, art.themes,
+            art.main_text]
 
 
 if __name__ == '__main__':
@@ -74,7 +101,7 @@ if __name__ == '__main__':
     python_ta.check_all(config={
         'allowed-io': [],
         'extra-imports': [
-            'python_ta.contracts', 'datetime', 'csv', 'article_classes'
+            'python_ta.contracts', 'datetime', 'csv', 'sys', 'typing', 'article_classes'
         ],
         'max-line-length': 100,
         'max-nested-blocks': 4,
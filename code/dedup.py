@@ -0,0 +1,216 @@
+"""
+Detection of duplicate and near-duplicate articles, such as the same Postmedia story syndicated
+to nationalpost.com, the Leader-Post and the other chain papers with small edits.
+
+Exact duplicates are found by hashing the cleaned main text. Near duplicates are found with
+MinHash signatures of the word 5-shingles of each text and locality sensitive hashing (LSH):
+signatures are cut into bands, and only articles that agree on a whole band are compared. Those
+whose estimated Jaccard similarity reaches the threshold are put in the same cluster, so the
+work grows with the number of articles rather than the number of pairs.
+
+Each cluster keeps one canonical article (the first one published), and the others are
+recorded as syndicated copies of it.
+
+
+Copyright and Usage Information
+===============================
+Code by Anna Myllyniemi, December 2021
+"""
+import csv
+import hashlib
+import zlib
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from article_classes import Articles
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 128
+BANDS = 16  # 16 bands of 8 rows: pairs at about 0.7 Jaccard similarity or more are compared
+SIMILARITY_THRESHOLD = 0.8
+_PRIME = 4294967311  # the smallest prime above 2 ** 32
+
+
+@dataclass
+class DuplicateCluster:
+    """A group of articles that are copies of each other.
+
+    Instance Attributes:
+       - canonical: the key of the article kept
+       - duplicates: maps the key of every other article in the cluster to its estimated
+       similarity with the canonical article (1.0 for exact copies)
+    """
+    canonical: str
+    duplicates: dict[str, float] = field(default_factory=dict)
+
+
+class MinHasher:
+    """Computes MinHash signatures of sets of 32-bit shingle hashes, using NUM_PERMUTATIONS
+    random hash functions of the form (a * x + b) mod _PRIME.
+
+    Private Instance Attributes:
+       - _a, _b: the coefficients of the hash functions
+    """
+    _a: np.ndarray
+    _b: np.ndarray
+
+    def __init__(self, num_permutations: int = NUM_PERMUTATIONS, seed: int = 1) -> None:
+        """Initialise the hash functions; the same seed always gives the same functions."""
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2 ** 32, size=num_permutations, dtype=np.uint64)
+        self._b = rng.integers(0, 2 ** 32, size=num_permutations, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """Return the MinHash signature of the word shingles of text."""
+        hashes = np.fromiter(shingle_hashes(text), dtype=np.uint64)
+        if len(hashes) == 0:
+            return np.full(len(self._a), _PRIME, dtype=np.uint64)
+
+        # a, b and every hash are below 2 ** 32, so a * x + b cannot overflow 64 bits
+        values = (np.outer(self._a, hashes) + self._b[:, None]) % np.uint64(_PRIME)
+        return values.min(axis=1)
+
+
+def shingle_hashes(text: str, k: int = SHINGLE_SIZE) -> set[int]:
+    """Return the 32-bit hashes of the runs of k consecutive words in text (or of the whole
+    text, if it has fewer than k words)."""
+    words = text.lower().split()
+    if len(words) < k:
+        return {zlib.crc32(' '.join(words).encode('UTF8'))} if words else set()
+    return {zlib.crc32(' '.join(words[i:i + k]).encode('UTF8'))
+            for i in range(len(words) - k + 1)}
+
+
+def find_duplicates(arts: Articles, threshold: float = SIMILARITY_THRESHOLD) -> \
+        list[DuplicateCluster]:
+    """Return the clusters of duplicate articles in arts, judged on their cleaned main text.
+    Articles without any duplicate are not in any cluster. Syndicated copies often keep their
+    title, so arts should be keyed by URL (see Articles) for them to be found.
+
+    Preconditions:
+        - 0.0 < threshold <= 1.0
+    """
+    keys = sorted(arts.get_keys())
+    parent = {key: key for key in keys}
+    similarity = {}
+
+    # exact duplicates
+    by_hash = {}
+    for key in keys:
+        text = arts.get_article(key).main_text
+        if text:
+            digest = hashlib.sha1(text.encode('UTF8')).digest()
+            if digest in by_hash:
+                _union(parent, by_hash[digest], key)
+                similarity[(by_hash[digest], key)] = 1.0
+            else:
+                by_hash[digest] = key
+
+    # near duplicates, among one representative of each group of exact duplicates
+    hasher = MinHasher()
+    signatures = {key: hasher.signature(arts.get_article(key).main_text)
+                  for key in by_hash.values()}
+    rows = NUM_PERMUTATIONS // BANDS
+    for band in range(BANDS):
+        buckets = {}
+        for key, signature in signatures.items():
+            buckets.setdefault(signature[band * rows:(band + 1) * rows].tobytes(), []).append(key)
+        for bucket in buckets.values():
+            for other in bucket[1:]:
+                pair = (bucket[0], other)
+                if pair not in similarity:
+                    similarity[pair] = float(np.mean(signatures[bucket[0]] == signatures[other]))
+                if similarity[pair] >= threshold:
+                    _union(parent, bucket[0], other)
+
+    return _clusters(arts, keys, parent, similarity, threshold)
+
+
+def _find(parent: dict[str, str], key: str) -> str:
+    """Return the root of key in the union-find forest parent."""
+    while parent[key] != key:
+        parent[key] = parent[parent[key]]
+        key = parent[key]
+    return key
+
+
+def _union(parent: dict[str, str], key1: str, key2: str) -> None:
+    """Merge the groups of key1 and key2 in the union-find forest parent."""
+    parent[_find(parent, key2)] = _find(parent, key1)
+
+
+def _clusters(arts: Articles, keys: list[str], parent: dict[str, str],
+              similarity: dict[tuple[str, str], float],
+              threshold: float) -> list[DuplicateCluster]:
+    """Return the DuplicateCluster of every group of more than one article in parent, found
+    with threshold."""
+    groups = {}
+    for key in keys:
+        groups.setdefault(_find(parent, key), []).append(key)
+
+    clusters = []
+    for members in groups.values():
+        if len(members) > 1:
+            members.sort(key=lambda k: (arts.get_article(k).date_published, k))
+            cluster = DuplicateCluster(canonical=members[0])
+            for member in members[1:]:
+                cluster.duplicates[member] = _pair_similarity(similarity, members[0], member,
+                                                              threshold)
+            clusters.append(cluster)
+
+    return clusters
+
+
+def _pair_similarity(similarity: dict[tuple[str, str], float], key1: str, key2: str,
+                     threshold: float) -> float:
+    """Return the recorded similarity of key1 and key2. Members of a cluster that were only
+    linked through other members have no recorded similarity, and get threshold."""
+    return similarity.get((key1, key2), similarity.get((key2, key1), threshold))
+
+
+def remove_duplicates(arts: Articles, clusters: list[DuplicateCluster]) -> int:
+    """Remove every article but the canonical one of each cluster from arts, and return the
+    number of articles removed."""
+    removed = 0
+    for cluster in clusters:
+        for key in cluster.duplicates:
+            arts.remove_article(key)
+            removed += 1
+
+    return removed
+
+
+def write_syndication(arts: Articles, clusters: list[DuplicateCluster], file_path: str) -> None:
+    """Save the syndication links of clusters to a csv file: for each copy, the URL of the
+    canonical article, the URL of the copy and their similarity. Must be called before the
+    copies are removed from arts.
+
+    Preconditions:
+        - file_path != ''
+    """
+    with open(file_path, 'w', encoding='UTF8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['canonical_url', 'duplicate_url', 'similarity'])
+        for cluster in clusters:
+            canonical_url = arts.get_article(cluster.canonical).url
+            for key, similarity in cluster.duplicates.items():
+                writer.writerow([canonical_url, arts.get_article(key).url, similarity])
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'allowed-io': ['write_syndication'],
+        'extra-imports': [
+            'python_ta.contracts', 'csv', 'hashlib', 'zlib', 'dataclasses', 'numpy',
+            'article_classes'
+        ],
+        'max-line-length': 100,
+        'max-nested-blocks': 4,
+        'disable': ['R1705', 'C0200', 'E9998']
+    })
@@ -0,0 +1,467 @@
+"""
+A persistent crawl frontier: the set of article URLs known so far, kept in an SQLite file
+between crawls, and the publisher feeds new URLs are discovered from.
+
+    - urls: one row per article, keyed by url_key, so a URL that differs from a known one only
+      by its scheme, case of the host, default port, fragment, order of its query parameters or
+      tracking parameters (utm_source, fbclid, ...) is not added again
+    - feeds: the sitemaps, RSS/Atom feeds and robots.txt files to discover URLs from, with the
+      validators of their last response
+
+Each URL is pending until it has been fetched. Pending URLs are handed out highest priority
+first and, within a priority, most recently published (or discovered) first. A fetched URL
+is only due again if a feed later lists it with a newer last modification date, and a URL
+that fails to fetch is retried later with an exponential backoff, up to MAX_ATTEMPTS times.
+Feeds are checked at most once per interval, with conditional requests, so running discover
+and crawl_frontier repeatedly (e.g. from cron) only downloads what is new.
+
+Like crawl.py, feeds are fetched through a Fetcher, so the frontier can be tested against
+sitemaps and feeds served by a local HTTP server.
+
+
+Copyright and Usage Information
+===============================
+Code by Anna Myllyniemi, December 2021
+"""
+import datetime
+import email.utils
+import logging
+import sqlite3
+import time
+import xml.etree.ElementTree as ElementTree
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+from crawl import CrawlCheckpoint, Fetcher, ScrapedArticle, iter_crawl, urllib_fetch
+from page_cache import PageCache, normalize_url
+
+# Query parameters that only track where a reader came from; they are dropped from URLs.
+TRACKING_PARAMETERS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid',
+                       'mc_eid', '_ga', 'cmp', 'cmpid', 'ncid', 'ocid', 'ref', 'ref_src',
+                       'taid', 'share', 'sh', 'smid', 'sr_share'}
+TRACKING_PREFIXES = ('utm_',)
+
+MAX_ATTEMPTS = 4
+RETRY_DELAY = 15 * 60
+FEED_INTERVAL = 60 * 60
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    source TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    freshness REAL NOT NULL,
+    lastmod REAL,
+    discovered_at REAL NOT NULL,
+    due_at REAL NOT NULL,
+    fetched_at REAL,
+    attempts INTEGER NOT NULL,
+    status TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS urls_schedule ON urls (status, priority DESC, freshness DESC);
+CREATE TABLE IF NOT EXISTS feeds (
+    url TEXT PRIMARY KEY,
+    pattern TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    interval REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    checked_at REAL
+) WITHOUT ROWID;
+"""
+
+# A URL that is already known keeps its https spelling and highest priority. If it is listed
+# with a newer modification date than when it was last fetched, it is due again.
+_ADD = """
+INSERT INTO urls (key, url, source, priority, freshness, lastmod, discovered_at, due_at,
+                  fetched_at, attempts, status)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL, 0, 'pending')
+ON CONFLICT (key) DO UPDATE SET
+    url = CASE WHEN excluded.url LIKE 'https:%' THEN excluded.url ELSE urls.url END,
+    priority = MAX(urls.priority, excluded.priority),
+    lastmod = COALESCE(MAX(urls.lastmod, excluded.lastmod), urls.lastmod, excluded.lastmod),
+    freshness = COALESCE(MAX(urls.lastmod, excluded.lastmod), urls.lastmod, excluded.lastmod,
+                         urls.freshness),
+    status = CASE WHEN urls.status = 'fetched' AND excluded.lastmod > urls.fetched_at
+                  THEN 'pending' ELSE urls.status END,
+    due_at = CASE WHEN urls.status = 'fetched' AND excluded.lastmod > urls.fetched_at
+                  THEN excluded.due_at ELSE urls.due_at END
+"""
+
+
+@dataclass
+class DueUrl:
+    """A URL of the frontier that is due to be fetched.
+
+    Instance Attributes:
+       - url: the canonical URL to fetch
+       - refetch: whether the URL was fetched before, and has changed since
+    """
+    url: str
+    refetch: bool
+
+
+@dataclass
+class FeedEntries:
+    """The links found in a sitemap, RSS/Atom feed or robots.txt file.
+
+    Instance Attributes:
+       - articles: the URL of each article listed, and its last modification date (in seconds
+         since the epoch) if the feed gives one
+       - feeds: the URLs of other sitemaps listed (by a sitemap index or robots.txt)
+    """
+    articles: list[tuple[str, Optional[float]]] = field(default_factory=list)
+    feeds: list[str] = field(default_factory=list)
+
+
+def canonical_url(url: str) -> str:
+    """Return url normalized like page_cache.normalize_url, without its tracking parameters and
+    with its other query parameters sorted.
+
+    >>> canonical_url('HTTPS://www.CBC.ca/news/a-story?utm_source=twitter&b=2&a=1#top')
+    'https://www.cbc.ca/news/a-story?a=1&b=2'
+    """
+    parts = urlsplit(normalize_url(url))
+    query = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+             if name.lower() not in TRACKING_PARAMETERS
+             and not name.lower().startswith(TRACKING_PREFIXES)]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(sorted(query)), ''))
+
+
+def url_key(url: str) -> str:
+    """Return the key url is deduplicated by: its canonical_url without the scheme, so the
+    http and https addresses of a page are the same URL.
+
+    >>> url_key('http://nationalpost.com/news?utm_medium=email') == url_key(
+    ...     'https://nationalpost.com/news')
+    True
+    """
+    return canonical_url(url).split(':', 1)[1]
+
+
+class Frontier:
+    """The article URLs and feeds known so far, saved in an SQLite file.
+
+    Instance Attributes:
+       - max_attempts: the number of times a URL is tried before it is given up on
+       - retry_delay: the seconds until a URL that failed is tried again; doubled after each
+         further failure
+
+    Private Instance Attributes:
+       - _connection: the connection to the SQLite file
+
+    Representation Invariants:
+        - self.max_attempts >= 1
+        - self.retry_delay >= 0
+    """
+    max_attempts: int
+    retry_delay: float
+    _connection: sqlite3.Connection
+
+    def __init__(self, path: str, max_attempts: int = MAX_ATTEMPTS,
+                 retry_delay: float = RETRY_DELAY) -> None:
+        """Open the frontier saved at path, creating it if it does not exist yet."""
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._connection = sqlite3.connect(path, timeout=60)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """Close the SQLite file."""
+        self._connection.close()
+
+    def __len__(self) -> int:
+        return self._connection.execute('SELECT COUNT(*) FROM urls').fetchone()[0]
+
+    def add(self, urls: Iterable[str], priority: int = 0, source: str = 'links',
+            lastmod: Optional[float] = None, now: Optional[float] = None) -> int:
+        """Add urls to the frontier, with the given priority and last modification date, and
+        return how many of them were not known yet. source records where the URLs came from.
+
+        A URL that is already known is not added again, but keeps the higher of the two
+        priorities, and is due again if it was fetched before lastmod.
+        """
+        return self.add_entries(((url, lastmod) for url in urls), priority, source, now)
+
+    def add_entries(self, entries: Iterable[tuple[str, Optional[float]]], priority: int = 0,
+                    source: str = 'links', now: Optional[float] = None) -> int:
+        """Add each URL of entries with its own last modification date, like add, and return
+        how many of them were not known yet."""
+        now = time.time() if now is None else now
+        rows = [(url_key(url), canonical_url(url), source, priority,
+                 lastmod if lastmod is not None else now, lastmod, now, now)
+                for url, lastmod in entries]
+        with self._connection:
+            before = len(self)
+            self._connection.executemany(_ADD, rows)
+            return len(self) - before
+
+    def due(self, limit: Optional[int] = None, now: Optional[float] = None) -> list[DueUrl]:
+        """Return up to limit URLs that are due to be fetched (all of them, if limit is None),
+        highest priority first and then most recently published or discovered first."""
+        now = time.time() if now is None else now
+        rows = self._connection.execute(
+            "SELECT url, fetched_at FROM urls WHERE status = 'pending' AND due_at <= ? "
+            'ORDER BY priority DESC, freshness DESC LIMIT ?',
+            (now, -1 if limit is None else limit))
+        return [DueUrl(url, fetched_at is not None) for url, fetched_at in rows]
+
+    def mark_fetched(self, urls: Iterable[str], now: Optional[float] = None) -> None:
+        """Record that urls were fetched successfully."""
+        now = time.time() if now is None else now
+        with self._connection:
+            self._connection.executemany(
+                "UPDATE urls SET status = 'fetched', fetched_at = ?, attempts = 0 WHERE key = ?",
+                [(now, url_key(url)) for url in urls])
+
+    def mark_failed(self, urls: Iterable[str], now: Optional[float] = None) -> None:
+        """Record that urls could not be fetched. Each is tried again after a backoff, unless it
+        has now failed max_attempts times in a row."""
+        now = time.time() if now is None else now
+        with self._connection:
+            self._connection.executemany(
+                'UPDATE urls SET attempts = attempts + 1, '
+                "status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE status END, "
+                'due_at = ? + ? * (1 << attempts) WHERE key = ?',
+                [(self.max_attempts, now, self.retry_delay, url_key(url)) for url in urls])
+
+    def counts(self) -> dict[str, int]:
+        """Return the number of URLs with each status ('pending', 'fetched' or 'failed')."""
+        rows = self._connection.execute('SELECT status, COUNT(*) FROM urls GROUP BY status')
+        return dict(rows.fetchall())
+
+    def fetched_urls(self) -> list[str]:
+        """Return every URL that has been fetched, in the order they were discovered."""
+        rows = self._connection.execute(
+            "SELECT url FROM urls WHERE status = 'fetched' ORDER BY discovered_at, url")
+        return [url for (url,) in rows]
+
+    def write_links(self, links_path: str) -> int:
+        """Write every fetched URL to links_path, one per line like data/links.txt, and return
+        how many were written."""
+        urls = self.fetched_urls()
+        with open(links_path, mode='w', encoding='UTF8') as file:
+            file.writelines(url + '\n' for url in urls)
+        return len(urls)
+
+    def add_feed(self, url: str, pattern: str = '', priority: int = 1,
+                 interval: float = FEED_INTERVAL) -> None:
+        """Add the sitemap, RSS/Atom feed or robots.txt file at url, to be checked for new
+        articles every interval seconds. Only the articles whose URLs contain pattern are
+        added, with the given priority. Adding a known feed updates these settings."""
+        with self._connection:
+            self._connection.execute(
+                'INSERT INTO feeds (url, pattern, priority, interval) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (url) DO UPDATE SET pattern = excluded.pattern, '
+                'priority = excluded.priority, interval = excluded.interval',
+                (normalize_url(url), pattern, priority, interval))
+
+    def discover(self, fetcher: Fetcher = urllib_fetch, timeout: float = 30.0,
+                 now: Optional[float] = None) -> int:
+        """Check every feed that is due, add the articles they list and return how many of
+        those were new. Sitemaps listed by a sitemap index or robots.txt are added as feeds
+        (with the settings of the feed listing them) and checked in the same call.
+
+        Feeds are fetched with conditional requests, so a feed that has not changed is not
+        downloaded again. A feed that cannot be fetched or parsed is logged and skipped until
+        its next check.
+        """
+        now = time.time() if now is None else now
+        added = 0
+        checked = set()
+        while True:
+            due = [row for row in self._connection.execute(
+                'SELECT url, pattern, priority, interval, etag, last_modified FROM feeds '
+                'WHERE checked_at IS NULL OR checked_at + interval <= ?', (now,))
+                   if row[0] not in checked]
+            if not due:
+                return added
+
+            for url, pattern, priority, interval, etag, last_modified in due:
+                checked.add(url)
+                entries, headers = self._check_feed(url, etag, last_modified, fetcher, timeout)
+                with self._connection:
+                    self._connection.execute(
+                        'UPDATE feeds SET checked_at = ?, etag = ?, last_modified = ? '
+                        'WHERE url = ?',
+                        (now, headers.get('etag', etag),
+                         headers.get('last-modified', last_modified), url))
+                for feed in entries.feeds:
+                    if normalize_url(feed) not in checked:
+                        self.add_feed(feed, pattern, priority, interval)
+                added += self.add_entries(((article, lastmod)
+                                           for article, lastmod in entries.articles
+                                           if pattern in article), priority, url, now)
+
+    def _check_feed(self, url: str, etag: Optional[str], last_modified: Optional[str],
+                    fetcher: Fetcher, timeout: float) -> tuple[FeedEntries, dict[str, str]]:
+        """Fetch the feed at url, unless it has not changed since it was served with etag and
+        last_modified, and return its entries and the response headers."""
+        validators = {}
+        if etag is not None:
+            validators['If-None-Match'] = etag
+        if last_modified is not None:
+            validators['If-Modified-Since'] = last_modified
+
+        try:
+            result = fetcher(url, timeout, validators)
+            if result.status == 304:
+                return FeedEntries(), result.headers
+            return parse_feed(result.body, url), result.headers
+        except (OSError, ValueError) as error:
+            logger.warning('Could not check feed %s: %s', url, error)
+            return FeedEntries(), {}
+
+
+def parse_feed(text: str, base_url: str = '') -> FeedEntries:
+    """Return the links in text, which is a sitemap (or sitemap index), an RSS or Atom feed, or
+    a robots.txt file. Relative links are resolved against base_url.
+
+    Raises ValueError if text is not well-formed XML and does not look like robots.txt.
+    """
+    entries = FeedEntries()
+    text = text.lstrip('\ufeff \t\r\n')
+    if not text.startswith('<'):
+        for line in text.splitlines():
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'sitemap' and value.strip() != '':
+                entries.feeds.append(urljoin(base_url, value.strip()))
+        return entries
+
+    try:
+        root = ElementTree.fromstring(text)
+    except ElementTree.ParseError as error:
+        raise ValueError(f'{base_url} is not a feed: {error}') from error
+
+    kind = _local_name(root.tag)
+    for element in root.iter():
+        name = _local_name(element.tag)
+        if kind == 'sitemapindex' and name == 'sitemap':
+            location = _child_text(element, 'loc')
+            if location is not None:
+                entries.feeds.append(urljoin(base_url, location))
+        elif kind == 'urlset' and name == 'url':
+            location = _child_text(element, 'loc')
+            # news sitemaps give the publication date instead of lastmod
+            date = _child_text(element, 'lastmod') or _child_text(element, 'publication_date')
+            if location is not None:
+                entries.articles.append((urljoin(base_url, location), parse_date(date)))
+        elif name in ('item', 'entry'):
+            link = _item_link(element)
+            date = (_child_text(element, 'updated') or _child_text(element, 'pubDate')
+                    or _child_text(element, 'published') or _child_text(element, 'date'))
+            if link is not None:
+                entries.articles.append((urljoin(base_url, link), parse_date(date)))
+
+    return entries
+
+
+def _local_name(tag: str) -> str:
+    """Return tag without its XML namespace."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _child_text(element: ElementTree.Element, name: str) -> Optional[str]:
+    """Return the stripped text of the first child or grandchild of element called name
+    (ignoring namespaces), or None if there is none or it is empty."""
+    for child in element.iter():
+        if child is not element and _local_name(child.tag) == name and child.text:
+            return child.text.strip() or None
+    return None
+
+
+def _item_link(element: ElementTree.Element) -> Optional[str]:
+    """Return the link of an RSS item or Atom entry: the text of an RSS link, or the href of
+    an Atom link that is the alternate (default) link of the entry."""
+    for child in element:
+        if _local_name(child.tag) != 'link':
+            continue
+        if child.get('href') is not None:
+            if child.get('rel', 'alternate') == 'alternate':
+                return child.get('href').strip()
+        elif child.text and child.text.strip() != '':
+            return child.text.strip()
+    return None
+
+
+def parse_date(text: Optional[str]) -> Optional[float]:
+    """Return the date in text, in W3C (sitemaps and Atom) or RFC 822 (RSS) format, as
+    seconds since the epoch, or None if there is no date or it cannot be parsed. Dates
+    without a time zone are taken to be in UTC.
+
+    >>> parse_date('2021-12-01')
+    1638316800.0
+    >>> parse_date('Wed, 01 Dec 2021 05:00:00 -0500')
+    1638352800.0
+    """
+    if text is None:
+        return None
+    try:
+        date = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        try:
+            date = email.utils.parsedate_to_datetime(text)
+        except (TypeError, ValueError):
+            return None
+
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return date.timestamp()
+
+
+def crawl_frontier(frontier: Frontier, limit: Optional[int] = None,
+                   checkpoint: Optional[CrawlCheckpoint] = None,
+                   cache: Optional[PageCache] = None, fetcher: Fetcher = urllib_fetch,
+                   max_workers: int = 8, min_host_interval: float = 1.0,
+                   timeout: float = 30.0) -> dict[str, ScrapedArticle]:
+    """Crawl up to limit of the URLs that are due in frontier (see Frontier.due) with
+    iter_crawl, record which were fetched and which failed, and return a mapping of URL to the
+    article crawled from it.
+
+    A URL that is due again because it has changed is neither loaded from checkpoint nor
+    from cache, but fetched again, and replaces its earlier checkpoint.
+
+    Preconditions:
+        - limit is None or limit >= 0
+        - max_workers >= 1
+    """
+    due = frontier.due(limit)
+    new = [entry.url for entry in due if not entry.refetch]
+    changed = [entry.url for entry in due if entry.refetch]
+    if checkpoint is not None:
+        for url in changed:
+            checkpoint.discard(url)
+
+    articles = {}
+    for urls, page_cache in ((new, cache), (changed, None)):
+        for article in iter_crawl(urls, checkpoint, fetcher, max_workers, min_host_interval,
+                                  timeout, page_cache):
+            articles[article.url] = article
+
+    frontier.mark_fetched(articles)
+    frontier.mark_failed(entry.url for entry in due if entry.url not in articles)
+    return articles
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'allowed-io': ['Frontier.write_links'],
+        'extra-imports': [
+            'python_ta.contracts', 'datetime', 'email.utils', 'logging', 'sqlite3', 'time',
+            'xml.etree.ElementTree', 'dataclasses', 'typing', 'urllib.parse', 'crawl',
+            'page_cache'
+        ],
+        'max-line-length': 100,
+        'max-nested-blocks': 4,
+        'disable': ['R1705', 'C0200']
+    })
@@ -6,6 +6,21 @@ for creating and displaying the graph, respectively.
 Optional: statsmodel.api for showing regression lines on the graph. You can uncomment the trendline
 in the scatterplot = px.scatter{} block to see.
 
+The analyzed articles can be read from a CSV file, a columnar dataset folder (see columnar.py)
+a partitioned dataset folder (see partitioned.py) or an SQLite article store (see
+article_store.py). From a columnar dataset, the article bodies are only read when filtering by
+keyword, and from an article store they are never loaded: keyword filters are full text
+queries. Graphs can be restricted to some source domains and a date range; from a
+partitioned dataset, only the partitions of those domains and dates are read. To draw
+several graphs of the same file, an AnalysisSession loads it once and answers keyword filters
+from an inverted index (see keyword_index.py). For large numbers of articles, graphs can be
+drawn from per day, week or month summaries instead of individual articles (see
+aggregation.py). Graphs of more than WEBGL_THRESHOLD articles are drawn with WebGL instead of
+SVG, from at most MAX_POINTS articles picked to keep the shape of the polarity over time, with
+shorter hover labels, so the browser does not freeze on them. Graphs of an AnalysisSession can
+also be restricted to articles with all or any of some themes, locations and publications (see
+themes.py), which are found from a bitmask of each article's labels, without reading its text.
+
 Copyright and Usage Information
 --------------
 Code by Aarya Vatsa and Diva Hidalgo Luna, December 2021
@@ -28,33 +43,106 @@ Publisher: Plotly Technologies Inc.
 URL: <https://plot.ly>
 
 """
+import datetime
+import os
+from typing import Iterable, Optional
+
+import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 import plotly.io as pio
 
+from aggregation import bucket_polarity, lttb_indices, source_trends
+from article_store import ArticleStore, articles_from_frame, is_store
+from columnar import read_frame
+from keyword_index import KeywordIndex
+from partitioned import is_partitioned, read_partitioned_frame
+from themes import match_masks, theme_masks
+
+# the columns drawn on the graph, and the article bodies needed to filter by keyword
+GRAPH_COLUMNS = ['title', 'url', 'source_domain', 'authors', 'date_publish',
+                 'average_sentence_polarity', 'themes']
+TEXT_COLUMN = 'maintext'
+# graphs of more articles than this are drawn by build_large_figure
+WEBGL_THRESHOLD = 20_000
+MAX_POINTS = 5_000
+HOVER_TITLE_LENGTH = 80
 
-def draw_graph(filepath: str, keyword: str) -> None:
-    """Draw graph from a csv with the given filepath, and filtered with keyword. The keyword
-    might be an empty string, in which case the graph shows all articles found in the csv.
 
+def load_frame(filepath: str, with_text: bool = True, domains: Optional[list[str]] = None,
+               start: Optional[datetime.datetime] = None,
+               end: Optional[datetime.datetime] = None) -> pd.DataFrame:
+    """Load the analyzed articles at filepath, which is a CSV file, a columnar or partitioned
+    dataset folder or an article store, into a DataFrame with a parsed date_publish column. The
+    maintext column of a columnar or partitioned dataset or of an article store is only loaded
+    if with_text is True. Datasets written before articles were tagged have no themes column.
+
+    Only the articles from one of domains published in [start, end) are kept; a filter that is
+    None keeps every article. From a partitioned dataset, only the partitions that may hold
+    such articles are read.
 
     Preconditions:
         - filepath != ''
     """
+    columns = GRAPH_COLUMNS + ([TEXT_COLUMN] if with_text else [])
+    if is_store(filepath):
+        store = ArticleStore(filepath)
+        df = store.frame(columns, '', domains, start, end)
+        store.close()
+        return df
+
+    if is_partitioned(filepath):
+        return read_partitioned_frame(filepath, columns, domains, start, end)
+
+    if os.path.isdir(filepath):
+        df = read_frame(filepath, columns)
+    else:
+        df = pd.read_csv(filepath)
+        df['date_publish'] = pd.to_datetime(df['date_publish'])  # to sort x-axis by date
+
+    return restrict_frame(df, domains, start, end)
+
+
+def restrict_frame(df: pd.DataFrame, domains: Optional[list[str]] = None,
+                   start: Optional[datetime.datetime] = None,
+                   end: Optional[datetime.datetime] = None) -> pd.DataFrame:
+    """Return the articles in df from one of domains published in [start, end). A filter that
+    is None keeps every article."""
+    if domains is not None:
+        df = df[df['source_domain'].isin(domains)]
+    if start is not None:
+        df = df[df['date_publish'] >= start]
+    if end is not None:
+        df = df[df['date_publish'] < end]
+    return df
 
-    df = pd.read_csv(filepath)
-    df['date_publish'] = pd.to_datetime(df['date_publish'])  # to sort x-axis by date
-    title = 'Article Polarity over Time'
 
+def filter_frame(df: pd.DataFrame, keyword: str) -> pd.DataFrame:
+    """Return the articles in df whose maintext contains keyword.
+
+    Preconditions:
+        - keyword != ''
+    """
+    df = df[df['maintext'].str.contains(keyword)]  # filtered df
+    url_key = keyword.lower()
+    pub_df = df[df['url'].str.contains(url_key.replace(' ', ''))]  # for checking publications
+    combined = pd.concat([df, pub_df])  # DataFrame.append was removed in pandas 2
+    return combined[~combined.index.duplicated()]
+
+
+def build_figure(df: pd.DataFrame, keyword: str, large: Optional[bool] = None) -> go.Figure:
+    """Return the scatterplot of the article polarities in df, titled for keyword. If large is
+    True, or if it is None and df has more than WEBGL_THRESHOLD articles, this is the
+    downsampled WebGL scatterplot of build_large_figure."""
+    if large or (large is None and len(df) > WEBGL_THRESHOLD):
+        return build_large_figure(df, keyword)
+
+    title = 'Article Polarity over Time'
     if keyword != '':
         title = f'{title}: Filtered for \'{keyword}\''
 
-        df = df[df['maintext'].str.contains(keyword)]  # filtered df
-        url_key = keyword.lower()
-        pub_df = df[df['url'].str.contains(url_key.replace(' ', ''))]  # for checking publications
-        df.append(pub_df)
-
-    scatterplot = px.scatter(
+    return px.scatter(
         data_frame=df,
         x='date_publish',
         range_x=['2020-1-1', '2021-12-30'],
@@ -74,7 +162,261 @@ def draw_graph(filepath: str, keyword: str) -> None:
         color='average_sentence_polarity',
         color_continuous_scale=px.colors.diverging.Temps
     )
-    pio.show(scatterplot)
+
+
+def build_large_figure(df: pd.DataFrame, keyword: str,
+                       max_points: int = MAX_POINTS) -> go.Figure:
+    """Return the scatterplot of build_figure for a large number of articles: drawn with WebGL,
+    from at most max_points of the articles in df chosen by lttb_indices over the polarity in
+    order of publication, and with only the (shortened) title, source domain, date and polarity
+    of each article in its hover label.
+
+    Preconditions:
+        - max_points >= 3
+    """
+    title = 'Article Polarity over Time'
+    if keyword != '':
+        title = f'{title}: Filtered for \'{keyword}\''
+
+    ordered = df.sort_values('date_publish', kind='stable')
+    polarity = ordered['average_sentence_polarity'].to_numpy(dtype=np.float64)
+    dates = ordered['date_publish'].to_numpy(dtype='datetime64[ns]')
+    sample = ordered.iloc[lttb_indices(dates.astype(np.int64), polarity, max_points)]
+    if len(sample) < len(df):
+        title = f'{title} ({len(sample):,} of {len(df):,} articles shown)'
+
+    figure = go.Figure(go.Scattergl(
+        x=sample['date_publish'], y=sample['average_sentence_polarity'], mode='markers',
+        marker={'color': sample['average_sentence_polarity'],
+                'colorscale': px.colors.diverging.Temps,
+                'colorbar': {'title': {'text': 'Average Sentence Polarity'}}},
+        text=sample['title'].str.slice(0, HOVER_TITLE_LENGTH), customdata=sample['source_domain'],
+        hovertemplate='<b>%{text}</b><br>%{customdata}<br>%{x|%Y-%m-%d}<br>'
+                      'Average Sentence Polarity: %{y:.3f}<extra></extra>'
+    ))
+    figure.update_layout(
+        title=title,
+        template='ggplot2',
+        xaxis={'title': 'Date Published', 'range': ['2020-1-1', '2021-12-30']},
+        yaxis={'title': 'Average Sentence Polarity', 'range': [-0.2, 0.4]}
+    )
+    return figure
+
+
+def build_summary_figure(df: pd.DataFrame, keyword: str,
+                         frequency: str = 'weekly') -> go.Figure:
+    """Return a graph of the article polarities in df summarised per time bucket of the given
+    frequency (see aggregation.py): the mean polarity of each bucket with its 95% confidence
+    band, the rolling mean, and a least squares trend line for each source domain. The figure
+    holds a few points per bucket and source, however many articles df has.
+
+    Preconditions:
+        - frequency in aggregation.FREQUENCIES
+    """
+    title = f'Article Polarity over Time ({frequency} mean)'
+    if keyword != '':
+        title = f'{title}: Filtered for \'{keyword}\''
+
+    buckets = bucket_polarity(df, frequency)
+    trends = source_trends(df)
+
+    figure = go.Figure()
+    figure.add_trace(go.Scatter(
+        x=pd.concat([buckets['date_publish'], buckets['date_publish'][::-1]]),
+        y=pd.concat([buckets['upper'], buckets['lower'][::-1]]),
+        fill='toself', line={'width': 0}, opacity=0.3, hoverinfo='skip',
+        name='95% confidence band'
+    ))
+    figure.add_trace(go.Scatter(
+        x=buckets['date_publish'], y=buckets['mean'], mode='markers', name='Mean polarity',
+        customdata=buckets['count'],
+        hovertemplate='%{x}<br>Mean polarity: %{y:.3f}<br>Articles: %{customdata}'
+    ))
+    figure.add_trace(go.Scatter(
+        x=buckets['date_publish'], y=buckets['rolling_mean'], mode='lines', name='Rolling mean'
+    ))
+    for trend in trends.itertuples():
+        figure.add_trace(go.Scatter(
+            x=[trend.start, trend.end], y=[trend.start_polarity, trend.end_polarity],
+            mode='lines', line={'dash': 'dot', 'width': 1}, name=trend.source_domain,
+            visible='legendonly'
+        ))
+
+    figure.update_layout(
+        title=title,
+        template='ggplot2',
+        xaxis={'title': 'Date Published', 'range': ['2020-1-1', '2021-12-30']},
+        yaxis={'title': 'Average Sentence Polarity', 'range': [-0.2, 0.4]}
+    )
+    return figure
+
+
+def draw_graph(filepath: str, keyword: str, domains: Optional[list[str]] = None,
+               start: Optional[datetime.datetime] = None,
+               end: Optional[datetime.datetime] = None) -> None:
+    """Draw graph from a csv (or columnar or partitioned dataset) with the given filepath, and
+    filtered with keyword. The keyword might be an empty string, in which case the graph shows
+    all articles found in the csv. If domains, start or end are given, only the articles from
+    one of domains published in [start, end) are shown (see load_frame).
+
+    To draw several graphs of the same file, use an AnalysisSession, which only loads the file
+    once.
+
+
+    Preconditions:
+        - filepath != ''
+    """
+
+    df = load_frame(filepath, keyword != '', domains, start, end)
+
+    if keyword != '':
+        df = filter_frame(df, keyword)
+
+    pio.show(build_figure(df, keyword))
+
+
+class AnalysisSession:
+    """The analyzed articles of a file, loaded and parsed once to draw any number of graphs.
+
+    Keyword filters are answered from inverted indexes over the maintext, title and url of the
+    articles instead of scanning every maintext, with the same results as draw_graph. For an
+    article store, the maintext is not loaded, and is filtered with full text queries to the
+    store instead.
+
+    Theme filters are answered from a bitmask of the labels of each article (see themes.py).
+    Articles are tagged when the dataset is built; those of a file written before articles
+    were tagged have no labels until the file is built again.
+
+    Instance Attributes:
+       - filepath: the file the analyzed articles were loaded from
+       - df: the analyzed articles, restricted to the domains and dates given when loading
+       - labels: the theme, location and publication labels of the articles; bit i of a mask
+       in _masks stands for labels[i]
+
+    Private Instance Attributes:
+       - _indexes: a KeywordIndex of each of the maintext (unless _store is set), title and url
+       columns
+       - _masks: the bitmask of the labels of each article in df
+       - _store: the article store the articles were loaded from, if any
+    """
+    filepath: str
+    df: pd.DataFrame
+    labels: list[str]
+    _indexes: dict[str, KeywordIndex]
+    _masks: np.ndarray
+    _store: Optional[ArticleStore]
+
+    def __init__(self, filepath: str, domains: Optional[list[str]] = None,
+                 start: Optional[datetime.datetime] = None,
+                 end: Optional[datetime.datetime] = None) -> None:
+        """Load the analyzed articles at filepath (a csv file, a columnar or partitioned dataset
+        or an article store) and index them. If domains, start or end are given, only the
+        articles from one of domains published in [start, end) are loaded (see load_frame).
+
+        Preconditions:
+            - filepath != ''
+        """
+        self.filepath = filepath
+        self._store = ArticleStore(filepath) if is_store(filepath) else None
+        self.df = load_frame(filepath, self._store is None, domains, start,
+                             end).reset_index(drop=True)
+        self._build_indexes()
+
+    def _build_indexes(self) -> None:
+        """Index the maintext (unless it is in the store), title and url of every article in
+        df, and compute the label mask of every article. Articles without a themes column
+        were not tagged, and have no labels."""
+        columns = ('title', 'url') if self._store is not None else (TEXT_COLUMN, 'title', 'url')
+        self._indexes = {column: KeywordIndex(self.df[column]) for column in columns}
+        if 'themes' not in self.df:
+            self.df['themes'] = None
+        self._masks, self.labels = theme_masks(self.df['themes'])
+
+    def add_articles(self, df: pd.DataFrame) -> None:
+        """Add the articles in df, which has the columns of a CSV file of analyzed articles,
+        replacing any article with the same url, and index them. Only the added articles are
+        indexed; those without themes have no labels. For an article store, the articles are
+        also added to the store.
+        """
+        if self._store is not None:
+            self._store.upsert(articles_from_frame(df))
+        replaced = self.df['url'].isin(df['url']).to_numpy()
+        if replaced.any():
+            self.df = self.df[~replaced].reset_index(drop=True)
+            self._masks = self._masks[~replaced]
+            for index in self._indexes.values():
+                index.keep(~replaced)
+
+        added = df.reindex(columns=self.df.columns).reset_index(drop=True)
+        masks, self.labels = theme_masks(added['themes'], self.labels)
+        self._masks = np.concatenate([self._masks, masks])
+        for column, index in self._indexes.items():
+            index.extend(added[column])
+        self.df = pd.concat([self.df, added], ignore_index=True)
+
+    def matches(self, column: str, keyword: str) -> np.ndarray:
+        """Return a boolean array with, for each article, whether its column contains keyword.
+
+        Preconditions:
+            - column in {'maintext', 'title', 'url'}
+            - keyword != ''
+        """
+        if column == TEXT_COLUMN and self._store is not None:
+            return self.df['url'].isin(self._store.matching_urls(keyword)).to_numpy()
+        return self._indexes[column].contains(keyword)
+
+    def has_themes(self, all_of: Iterable[str] = (), any_of: Iterable[str] = ()) -> np.ndarray:
+        """Return a boolean array with, for each article, whether it has every label in all_of
+        and, unless any_of is empty, at least one label in any_of."""
+        return match_masks(self._masks, self.labels, all_of, any_of)
+
+    def filter(self, keyword: str, all_of: Iterable[str] = (),
+               any_of: Iterable[str] = ()) -> pd.DataFrame:
+        """Return the articles draw_graph would show for keyword, keeping only those with
+        every label in all_of and, unless any_of is empty, one of the labels in any_of."""
+        all_of, any_of = list(all_of), list(any_of)
+        selected = self.has_themes(all_of, any_of) if all_of or any_of else None
+        if keyword == '':
+            return self.df if selected is None else self.df[selected]
+
+        in_text = self.matches(TEXT_COLUMN, keyword)
+        # as in filter_frame, the publication matches are among the articles already matched
+        in_url = in_text & self.matches('url', keyword.lower().replace(' ', ''))
+        matched = in_text | in_url
+        return self.df[matched if selected is None else matched & selected]
+
+    def draw(self, keyword: str, frequency: str = '', all_of: Iterable[str] = (),
+             any_of: Iterable[str] = ()) -> None:
+        """Draw the graph of the articles, filtered with keyword as in draw_graph and with
+        all_of and any_of as in filter. If frequency is given, the graph shows the polarities
+        summarised per time bucket of that frequency (see build_summary_figure) instead of one
+        point per article.
+
+        Preconditions:
+            - frequency == '' or frequency in aggregation.FREQUENCIES
+        """
+        all_of, any_of = list(all_of), list(any_of)
+        df = self.filter(keyword, all_of, any_of)
+        title = facet_title(keyword, all_of, any_of)
+        if frequency == '':
+            pio.show(build_figure(df, title))
+        else:
+            pio.show(build_summary_figure(df, title, frequency))
+
+
+def facet_title(keyword: str, all_of: Iterable[str] = (), any_of: Iterable[str] = ()) -> str:
+    """Return the description of a filter by keyword and by the labels in all_of and any_of
+    (see AnalysisSession.filter), as shown in the title of its graph.
+
+    >>> facet_title('vaccine', ['Toronto'], ['lockdowns', 'masks'])
+    'vaccine, Toronto AND (lockdowns OR masks)'
+    """
+    parts = list(all_of)
+    any_of = list(any_of)
+    if any_of:
+        parts.append(f'({" OR ".join(any_of)})' if len(any_of) > 1 else any_of[0])
+    themes = ' AND '.join(parts)
+    return ', '.join(part for part in (keyword, themes) if part != '')
 
 
 if __name__ == '__main__':
@@ -86,7 +428,9 @@ if __name__ == '__main__':
     python_ta.check_all(config={
         'allowed-io': ['run_example'],
         'extra-imports': [
-            'python_ta.contracts', 'plotly.io', 'plotly.express', 'pandas'
+            'python_ta.contracts', 'datetime', 'os', 'typing', 'numpy', 'plotly.io',
+            'plotly.express', 'plotly.graph_objects', 'pandas', 'aggregation', 'article_store',
+            'columnar', 'keyword_index', 'partitioned', 'themes'
         ],
         'max-line-length': 100,
         'max-nested-blocks': 4,
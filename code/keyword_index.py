@@ -0,0 +1,134 @@
+"""
+An inverted index over the text columns of the analyzed articles, used to answer the keyword
+filters of the graphs without scanning the full text of every article.
+
+A keyword filter keeps the articles whose text contains the keyword, anywhere and case
+sensitively, exactly like pandas' str.contains. The index maps every word of a column to the
+rows it appears in. Every word of the keyword must lie inside some word of a matching text, so
+the rows holding such words are the only candidates; only those candidates are then checked
+with a plain substring test.
+
+
+Copyright and Usage Information
+===============================
+Code by Aarya Vatsa and Diva Hidalgo Luna, December 2021
+"""
+import re
+from typing import Iterable
+
+import numpy as np
+
+WORD = re.compile(r'\w+')
+REGEX_SPECIAL_CHARACTERS = set('.^$*+?{}[]\\|()')
+
+
+class KeywordIndex:
+    """An inverted index of the words in a sequence of texts.
+
+    Private Instance Attributes:
+       - _texts: the indexed texts, by row
+       - _postings: maps each word to the sorted rows whose text contains it
+       - _term_rows: remembers the candidate rows of each keyword word already looked up
+    """
+    _texts: list[str]
+    _postings: dict[str, np.ndarray]
+    _term_rows: dict[str, np.ndarray]
+
+    def __init__(self, texts: Iterable[object]) -> None:
+        """Index texts. Values that are not strings (such as NaN) are indexed as ''."""
+        self._texts = [text if isinstance(text, str) else '' for text in texts]
+        postings = {}
+        for row, text in enumerate(self._texts):
+            for word in set(WORD.findall(text)):
+                postings.setdefault(word, []).append(row)
+
+        self._postings = {word: np.array(rows, dtype=np.int64) for word, rows in postings.items()}
+        self._term_rows = {}
+
+    def extend(self, texts: Iterable[object]) -> None:
+        """Index texts as the rows after the ones already indexed, without indexing those
+        again. Values that are not strings are indexed as ''."""
+        start = len(self._texts)
+        self._texts.extend(text if isinstance(text, str) else '' for text in texts)
+        postings = {}
+        for row in range(start, len(self._texts)):
+            for word in set(WORD.findall(self._texts[row])):
+                postings.setdefault(word, []).append(row)
+
+        for word, rows in postings.items():
+            rows = np.array(rows, dtype=np.int64)
+            self._postings[word] = np.concatenate([self._postings[word], rows]) \
+                if word in self._postings else rows
+        self._term_rows = {}
+
+    def keep(self, kept: np.ndarray) -> None:
+        """Drop the rows for which the boolean array kept is False, renumbering the others in
+        order, without indexing any text again.
+
+        Preconditions:
+            - len(kept) == len(self)
+        """
+        renumbered = np.cumsum(kept) - 1
+        renumbered[~kept] = -1
+        self._texts = [text for text, keep in zip(self._texts, kept) if keep]
+        for word, rows in list(self._postings.items()):
+            rows = renumbered[rows]
+            rows = rows[rows >= 0]
+            if len(rows) > 0:
+                self._postings[word] = rows
+            else:
+                del self._postings[word]
+        self._term_rows = {}
+
+    def __len__(self) -> int:
+        """Return the number of indexed texts."""
+        return len(self._texts)
+
+    def _rows_with_term(self, term: str) -> np.ndarray:
+        """Return the rows containing a word that has term as a substring."""
+        if term not in self._term_rows:
+            matching = [rows for word, rows in self._postings.items() if term in word]
+            self._term_rows[term] = np.unique(np.concatenate(matching)) if matching \
+                else np.array([], dtype=np.int64)
+
+        return self._term_rows[term]
+
+    def contains(self, keyword: str) -> np.ndarray:
+        """Return a boolean array with, for each text, whether it contains keyword, with the
+        same result as pandas' str.contains(keyword).
+
+        Preconditions:
+            - keyword != ''
+        """
+        mask = np.zeros(len(self._texts), dtype=bool)
+        terms = WORD.findall(keyword)
+
+        if not terms or REGEX_SPECIAL_CHARACTERS & set(keyword):
+            # str.contains treats these keywords as regular expressions; scan every text
+            pattern = re.compile(keyword)
+            mask[:] = [pattern.search(text) is not None for text in self._texts]
+            return mask
+
+        candidates = self._rows_with_term(terms[0])
+        for term in terms[1:]:
+            candidates = np.intersect1d(candidates, self._rows_with_term(term),
+                                        assume_unique=True)
+
+        for row in candidates:
+            mask[row] = keyword in self._texts[row]
+        return mask
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'allowed-io': [],
+        'extra-imports': ['python_ta.contracts', 're', 'typing', 'numpy'],
+        'max-line-length': 100,
+        'max-nested-blocks': 4,
+        'disable': ['R1705', 'C0200']
+    })
@@ -2,7 +2,8 @@
 This file performs the following tasks:
 
 1. Use the NewsPlease library's web crawler to collect news articles and opinion pieces 
-using their URLs in data/links.txt, 
+using their URLs in data/links.txt and the publisher sitemaps and RSS feeds listed in
+data/feeds.txt,
 
 2. Clean and process the data crawled, and represent each news article and opinion piece as an Article object, 
 which can be collectively accessed through an Articles object with an underlying mapping.
@@ -17,33 +18,236 @@ analyzed_articles.csv (again inside the data folder)
 on the themes discussed (e.x. Vaccine mandates, lockdowns and quarantines, border closures, etc.)
 and publications. Present our findings using Plotly in an interactive way.
 
+Each task can also be run on its own, as a subcommand; running main.py without one runs clean,
+score and plot in turn:
+
+    python main.py [--import-times] [--profile] [crawl | clean | score | plot [keyword ...]]
+
+    - crawl: add the articles in data/links.txt and data/feeds.txt to the crawl frontier
+      (see frontier.py), and fetch the new or changed ones into the checkpoint folder (task 1)
+    - clean: build data/dataset.csv from the crawled articles, crawling any missing (task 2)
+    - score: score data/dataset.csv into data/analyzed_articles.csv (task 3)
+    - plot: draw the graphs of data/analyzed_articles.csv (task 4)
+
+Each subcommand only imports the libraries it needs: plot does not load NewsPlease or NLTK, and
+score does not load NewsPlease, pandas or Plotly, so they start much faster. --import-times
+prints how long each subcommand's imports took.
+
 
 Copyright and Usage Information
 ===============================
 Code by Anna Myllyniemi, Raghav Arora, Aarya Vatsa and Diva Hidalgo Luna, December 2021
 """
-from create_dataset import create_dataset
-from csv_read_write import read_file, write_file
-from graphing import draw_graph
+import argparse
+import contextlib
+import os
+import sys
+import time
+from typing import Iterator
 
+from profiling import Profiler
+
+# Sentiment analysis is spread over this many worker processes (1 scores everything in this
+# process), each scoring SENTIMENT_CHUNK_SIZE articles at a time.
+SENTIMENT_WORKERS = 1
+SENTIMENT_CHUNK_SIZE = 64
+# Sentence scores are kept in SENTIMENT_CACHE between runs, so sentences that were already
+# scored (wire copy, disclaimers, unchanged articles) are not scored again.
+SENTIMENT_CACHE = './data/sentence_cache.sqlite'
+# 'vader' scores sentences with NLTK's VADER; 'numpy' uses the vectorized kernel of
+# vader_numpy.py, which gives the same scores several times faster.
+SENTIMENT_KERNEL = 'numpy'
+# Set this to a folder to also save the analyzed articles partitioned by source domain and
+# month (see partitioned.py); graphs of a few publications or dates then only read those.
+PARTITION_DIRECTORY = ''
+# Set this to a .sqlite file to also add the analyzed articles to an article store (see
+# article_store.py), which other processes can read while articles are added.
+ARTICLE_STORE = ''
+
+# The keyword filters of the graphs drawn; '' shows every article.
+GRAPH_KEYWORDS = ['', 'vaccine', 'lockdown', 'Toronto', 'National Post', 'border']
+# '' draws one point per article. For large datasets, 'daily', 'weekly' or 'monthly' draws the
+# mean polarity per time bucket with confidence bands and per-source trend lines instead.
+GRAPH_FREQUENCY = ''
+# On machines without a browser, set this to a folder to write the graphs there (as HTML and
+# the RENDER_FORMATS, using RENDER_WORKERS processes) instead of showing them.
+RENDER_DIRECTORY = ''
+RENDER_FORMATS = ('html',)
+RENDER_WORKERS = 1
+
+PROFILE = False
+PROFILE_CPROFILE = False
+# Tracing memory slows Python code down, so the times of a run with PROFILE_MEMORY are inflated.
+PROFILE_MEMORY = False
+PROFILE_REPORT = './data/profile.json'
+
+LINKS_PATH = './data/links.txt'
+DATASET_PATH = './data/dataset.csv'
+ANALYZED_PATH = './data/analyzed_articles.csv'
+CHECKPOINT_DIRECTORY = './data/checkpoints'
+CACHE_DIRECTORY = './data/cache'
+SYNDICATION_PATH = './data/syndication.csv'
+# Each line of FEEDS_PATH is the URL of a sitemap, RSS/Atom feed or robots.txt file, optionally
+# followed by a space and a text that the URLs of its articles must contain.
+FEEDS_PATH = './data/feeds.txt'
+FRONTIER_PATH = './data/frontier.sqlite'
+# Every URL the frontier has fetched, written by crawl and read by clean.
+FRONTIER_LINKS_PATH = './data/frontier_links.txt'
+
+
+@contextlib.contextmanager
+def measure_imports(command: str, report: bool) -> Iterator[None]:
+    """Measure the imports made inside the with block for command, and print how long they
+    took and how many modules they loaded if report is True."""
+    start = time.perf_counter()
+    loaded = len(sys.modules)
+    yield
+    if report:
+        print(f'{command}: imported {len(sys.modules) - loaded} modules in '
+              f'{time.perf_counter() - start:.2f}s')
+
+
+def run_crawl(profiler: Profiler, import_times: bool) -> None:
+    """Add the articles in LINKS_PATH and those listed by the feeds in FEEDS_PATH to the
+    frontier in FRONTIER_PATH, and crawl the ones that are due into CHECKPOINT_DIRECTORY,
+    through the page cache in CACHE_DIRECTORY. Every URL fetched so far is written to
+    FRONTIER_LINKS_PATH.
+
+    Articles already fetched are not crawled again unless a feed says they have changed, so an
+    interrupted crawl can be resumed, and running crawl again only fetches what is new."""
+    with measure_imports('crawl', import_times):
+        from crawl import CrawlCheckpoint, read_links
+        from frontier import Frontier, crawl_frontier
+        from page_cache import PageCache
+
+    frontier = Frontier(FRONTIER_PATH)
+    with profiler.stage('discover') as stage:
+        added = frontier.add(read_links(LINKS_PATH))
+        if os.path.exists(FEEDS_PATH):
+            for line in read_links(FEEDS_PATH):
+                url, _, pattern = line.partition(' ')
+                frontier.add_feed(url, pattern.strip())
+        added += frontier.discover()
+        stage.items = added
+
+    cache = PageCache(CACHE_DIRECTORY)
+    with profiler.stage('fetch') as stage:
+        scraped = crawl_frontier(frontier, checkpoint=CrawlCheckpoint(CHECKPOINT_DIRECTORY),
+                                 cache=cache)
+        stage.items = len(scraped)
+    cache.close()
+    frontier.write_links(FRONTIER_LINKS_PATH)
+    print(f'Added {added} new URLs, crawled {len(scraped)} articles; frontier: '
+          f'{frontier.counts()}')
+    frontier.close()
 
-if __name__ == '__main__':
-    # creates the dataset including web scraping, cleaning, sentiment analysis, etc. Will take a
-    # VERY long time to run. Approximately 5 minutes.
-    # Only uncomment if you need to recreate the dataset.
-    create_dataset(links_path='./data/links.txt', dataset_save_path='./data/dataset.csv')
+
+def run_clean(profiler: Profiler, import_times: bool) -> None:
+    """Create DATASET_PATH from the crawled articles, including cleaning and dropping
+    syndicated copies (listed in SYNDICATION_PATH). Will take a VERY long time to run if the
+    articles have not been crawled yet. Approximately 5 minutes."""
+    with measure_imports('clean', import_times):
+        from create_dataset import create_dataset
+
+    # Crawled pages are checkpointed in data/checkpoints, so an interrupted crawl can be
+    # resumed, and cached in data/cache, so pages that have not changed are not downloaded
+    # again. Once crawl has run, the dataset is built from every URL the frontier fetched.
+    links_path = FRONTIER_LINKS_PATH if os.path.exists(FRONTIER_LINKS_PATH) else LINKS_PATH
+    create_dataset(links_path=links_path, dataset_save_path=DATASET_PATH,
+                   checkpoint_dir=CHECKPOINT_DIRECTORY, cache_dir=CACHE_DIRECTORY,
+                   syndication_save_path=SYNDICATION_PATH, profiler=profiler)
+
+
+def run_score(profiler: Profiler, import_times: bool) -> None:
+    """Perform sentiment analysis on each article of DATASET_PATH, and save the analyzed
+    articles to ANALYZED_PATH (and PARTITION_DIRECTORY, if set)."""
+    with measure_imports('score', import_times):
+        from analyze_sentiment import get_engine
+        from csv_read_write import read_file, write_file
 
     # Load the Dataset CSV file
-    articles = read_file('./data/dataset.csv')  # Load cleaned and processed data into Articles object
-    articles.run_sentiment()  # Perform sentiment analysis on each article
-    write_file(articles, './data/analyzed_articles.csv')  # save the analyzed articles
-
-    # We created a while loop below to get user prompt and create specialized graphs.
-    # But, these six graphs below are comprehensive of our work.
-
-    draw_graph('./data/analyzed_articles.csv', '')
-    draw_graph('./data/analyzed_articles.csv', 'vaccine')
-    draw_graph('./data/analyzed_articles.csv', 'lockdown')
-    draw_graph('./data/analyzed_articles.csv', 'Toronto')
-    draw_graph('./data/analyzed_articles.csv', 'National Post')
-    draw_graph('./data/analyzed_articles.csv', 'border')
+    with profiler.stage('read_file') as stage:
+        articles = read_file(DATASET_PATH)  # Load cleaned and processed data into Articles
+        stage.items = len(articles.get_keys())
+
+    # Articles whose text has not changed since the last run reuse their earlier scores.
+    previous = read_file(ANALYZED_PATH) if os.path.exists(ANALYZED_PATH) else None
+    with profiler.stage('run_sentiment') as stage:
+        scored, reused = articles.run_sentiment(workers=SENTIMENT_WORKERS,
+                                                chunk_size=SENTIMENT_CHUNK_SIZE, previous=previous,
+                                                cache_path=SENTIMENT_CACHE,
+                                                kernel=SENTIMENT_KERNEL)
+        stage.items = scored
+    print(f'Sentiment analysis: scored {scored} articles, reused {reused} earlier scores')
+    print(f'Sentence cache: {get_engine().cache.stats}')
+    write_file(articles, ANALYZED_PATH)  # save the analyzed articles
+
+    if PARTITION_DIRECTORY != '':
+        from partitioned import write_partitioned
+        write_partitioned((articles.get_article(key) for key in articles.get_keys()),
+                          PARTITION_DIRECTORY)
+    if ARTICLE_STORE != '':
+        from article_store import write_store
+        write_store((articles.get_article(key) for key in articles.get_keys()), ARTICLE_STORE)
+
+
+def run_plot(profiler: Profiler, import_times: bool, keywords: list[str]) -> None:
+    """Draw the graph of the articles in ANALYZED_PATH for each of keywords, or write them to
+    RENDER_DIRECTORY if it is set."""
+    # The analyzed articles are loaded and indexed once, and shared by every graph.
+    if RENDER_DIRECTORY != '':
+        with measure_imports('plot', import_times):
+            from batch_render import render_graphs
+
+        with profiler.stage('render_graphs', items=len(keywords)):
+            render_graphs(ANALYZED_PATH, keywords, RENDER_DIRECTORY, RENDER_FORMATS,
+                          GRAPH_FREQUENCY, RENDER_WORKERS)
+    else:
+        with measure_imports('plot', import_times):
+            from graphing import AnalysisSession
+
+        with profiler.stage('load_session'):
+            session = AnalysisSession(ANALYZED_PATH)
+        for keyword in keywords:
+            with profiler.stage(f'draw_graph:{keyword}'):
+                session.draw(keyword, GRAPH_FREQUENCY)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Crawl, clean, score and plot the articles.')
+    parser.add_argument('--import-times', action='store_true',
+                        help='print how long the imports of each subcommand took')
+    parser.add_argument('--profile', action='store_true', default=PROFILE,
+                        help=f'measure each stage and save the report to {PROFILE_REPORT}')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('crawl',
+                          help='fetch the new articles of data/links.txt and data/feeds.txt')
+    subparsers.add_parser('clean', help='build data/dataset.csv from the crawled articles')
+    subparsers.add_parser('score', help='score data/dataset.csv')
+    plot_parser = subparsers.add_parser('plot', help='draw data/analyzed_articles.csv')
+    plot_parser.add_argument('keywords', nargs='*', default=GRAPH_KEYWORDS)
+    arguments = parser.parse_args()
+
+    # With --profile (or PROFILE), each stage is measured; the report is saved to
+    # PROFILE_REPORT (and, if PROFILE_CPROFILE is True, a cProfile dump to PROFILE_REPORT with
+    # .prof in place of .json). The peak memory of each stage is only measured if
+    # PROFILE_MEMORY is True.
+    profiler = Profiler(enabled=arguments.profile, trace_memory=PROFILE_MEMORY,
+                        use_cprofile=PROFILE_CPROFILE)
+
+    if arguments.command == 'crawl':
+        run_crawl(profiler, arguments.import_times)
+    elif arguments.command == 'clean':
+        run_clean(profiler, arguments.import_times)
+    elif arguments.command == 'score':
+        run_score(profiler, arguments.import_times)
+    elif arguments.command == 'plot':
+        run_plot(profiler, arguments.import_times, arguments.keywords)
+    else:
+        run_clean(profiler, arguments.import_times)
+        run_score(profiler, arguments.import_times)
+        run_plot(profiler, arguments.import_times, GRAPH_KEYWORDS)
+
+    if arguments.profile:
+        profiler.write_report(PROFILE_REPORT)
+        profiler.dump_cprofile(PROFILE_REPORT.replace('.json', '.prof'))
@@ -0,0 +1,257 @@
+"""
+A persistent on-disk cache of crawled pages, keyed by normalized URL. For every URL the cache
+keeps the raw response body, its ETag and Last-Modified validators and the article fields
+extracted from it, so a page that has not changed upstream is never downloaded or parsed again.
+
+Bodies are content-addressed: each one is stored once under the SHA-256 hash of its contents,
+however many URLs return it. The index lives in a SQLite database next to the bodies, and once
+the bodies exceed a size cap the least recently used entries are evicted.
+
+
+Copyright and Usage Information
+===============================
+Code by Anna Myllyniemi, December 2021
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url: str) -> str:
+    """Return url in a canonical form, so that trivially different spellings of the same URL
+    share a cache entry: the scheme and host are lower cased, a default port is dropped and
+    so is any fragment.
+
+    >>> normalize_url('HTTPS://NationalPost.com:443/opinion/a-column#comments')
+    'https://nationalpost.com/opinion/a-column'
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port is not None and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f'{host}:{parts.port}'
+
+    return urlunsplit((scheme, host, parts.path or '/', parts.query, ''))
+
+
+@dataclass
+class CachedPage:
+    """A single entry of the cache.
+
+    Instance Attributes:
+       - url: the normalized URL of the page
+       - body_hash: the SHA-256 hash of the body, which is also the name of its file
+       - etag: the ETag the page was served with, if any
+       - last_modified: the Last-Modified date the page was served with, if any
+       - fetched_at: when the page was last fetched or revalidated, in seconds since the epoch
+       - fields: the article fields extracted from the body
+    """
+    url: str
+    body_hash: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+    fields: dict
+
+    def validators(self) -> dict[str, str]:
+        """Return the request headers that ask the server whether this page has changed."""
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class PageCache:
+    """A size-capped, least recently used cache of crawled pages. It is safe to share between
+    the threads of a crawl.
+
+    Instance Attributes:
+       - max_age: entries fetched less than this many seconds ago are used without asking the
+       server whether they have changed
+       - max_bytes: the total size of the cached bodies is kept at or below this many bytes
+
+    Private Instance Attributes:
+       - _directory: the folder holding the index and the bodies
+       - _connection: the connection to the SQLite index
+       - _lock: serializes access to _connection
+    """
+    max_age: float
+    max_bytes: int
+    _directory: str
+    _connection: sqlite3.Connection
+    _lock: threading.Lock
+
+    def __init__(self, directory: str, max_bytes: int = 1024 ** 3,
+                 max_age: float = 24 * 60 * 60) -> None:
+        """Open the cache in directory, creating it if needed."""
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, 'bodies'), exist_ok=True)
+
+        self._connection = sqlite3.connect(os.path.join(directory, 'index.sqlite'),
+                                           check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS pages ('
+                'url TEXT PRIMARY KEY, body_hash TEXT NOT NULL, size INTEGER NOT NULL, '
+                'etag TEXT, last_modified TEXT, fetched_at REAL NOT NULL, '
+                'last_access REAL NOT NULL, fields TEXT NOT NULL)'
+            )
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS pages_last_access ON pages (last_access)'
+            )
+
+    def close(self) -> None:
+        """Close the index."""
+        with self._lock:
+            self._connection.close()
+
+    def _body_path(self, body_hash: str) -> str:
+        """Return the path of the file holding the body with hash body_hash."""
+        return os.path.join(self._directory, 'bodies', f'{body_hash}.html')
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """Return the entry for url, or None if it is not cached. This counts as a use of
+        the entry for the purpose of eviction."""
+        key = normalize_url(url)
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                'SELECT body_hash, etag, last_modified, fetched_at, fields FROM pages '
+                'WHERE url = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute('UPDATE pages SET last_access = ? WHERE url = ?',
+                                     (time.time(), key))
+
+        return CachedPage(url=key, body_hash=row[0], etag=row[1], last_modified=row[2],
+                          fetched_at=row[3], fields=json.loads(row[4]))
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        """Return whether page was fetched recently enough to be used as is."""
+        return time.time() - page.fetched_at < self.max_age
+
+    def body(self, page: CachedPage) -> str:
+        """Return the raw body of page."""
+        with open(self._body_path(page.body_hash), mode='r', encoding='UTF8') as file:
+            return file.read()
+
+    def find_body(self, body: str) -> Optional[CachedPage]:
+        """Return an entry whose body is exactly body, or None if there is no such entry.
+        This lets a page that was downloaded again unchanged skip extraction."""
+        body_hash = _hash_body(body)
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT url, etag, last_modified, fetched_at, fields FROM pages '
+                'WHERE body_hash = ? LIMIT 1', (body_hash,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        return CachedPage(url=row[0], body_hash=body_hash, etag=row[1], last_modified=row[2],
+                          fetched_at=row[3], fields=json.loads(row[4]))
+
+    def revalidated(self, page: CachedPage) -> None:
+        """Record that the server confirmed page has not changed."""
+        with self._lock, self._connection:
+            self._connection.execute('UPDATE pages SET fetched_at = ? WHERE url = ?',
+                                     (time.time(), page.url))
+
+    def put(self, url: str, body: str, headers: dict[str, str], fields: dict) -> None:
+        """Cache body and the article fields extracted from it as the entry for url, then
+        evict least recently used entries until the cache is within max_bytes.
+
+        Preconditions:
+            - all(name == name.lower() for name in headers)
+        """
+        key = normalize_url(url)
+        body_hash = _hash_body(body)
+        path = self._body_path(body_hash)
+        now = time.time()
+        with self._lock, self._connection:
+            if not os.path.exists(path):
+                with open(path + '.tmp', mode='w', encoding='UTF8') as file:
+                    file.write(body)
+                os.replace(path + '.tmp', path)
+
+            previous = self._connection.execute(
+                'SELECT body_hash FROM pages WHERE url = ?', (key,)
+            ).fetchone()
+            self._connection.execute(
+                'INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, body_hash, os.path.getsize(path), headers.get('etag'),
+                 headers.get('last-modified'), now, now, json.dumps(fields))
+            )
+            if previous is not None and previous[0] != body_hash:
+                self._remove_unused_body(previous[0])
+            self._evict()
+
+    def _evict(self) -> None:
+        """Remove least recently used entries, and any bodies no longer used by an entry,
+        until the bodies take up at most max_bytes. Must be called holding _lock."""
+        total = self._connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM '
+            '(SELECT DISTINCT body_hash, size FROM pages)'
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self._connection.execute(
+            'SELECT url, body_hash, size FROM pages ORDER BY last_access'
+        ).fetchall()
+        for url, body_hash, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._connection.execute('DELETE FROM pages WHERE url = ?', (url,))
+            if self._remove_unused_body(body_hash):
+                total -= size
+
+    def _remove_unused_body(self, body_hash: str) -> bool:
+        """Delete the body with hash body_hash if no entry uses it any more, and return
+        whether it was deleted. Must be called holding _lock."""
+        still_used = self._connection.execute(
+            'SELECT 1 FROM pages WHERE body_hash = ? LIMIT 1', (body_hash,)
+        ).fetchone()
+        if still_used is not None:
+            return False
+
+        os.remove(self._body_path(body_hash))
+        return True
+
+
+def _hash_body(body: str) -> str:
+    """Return the SHA-256 hash of body, as used to name its file."""
+    return hashlib.sha256(body.encode('UTF8')).hexdigest()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'allowed-io': ['PageCache.body', 'PageCache.put'],
+        'extra-imports': [
+            'python_ta.contracts', 'hashlib', 'json', 'os', 'sqlite3', 'threading', 'time',
+            'dataclasses', 'typing', 'urllib.parse', 'doctest'
+        ],
+        'max-line-length': 100,
+        'max-nested-blocks': 4,
+        'disable': ['R1705', 'C0200', 'E9998']
+    })
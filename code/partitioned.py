@@ -0,0 +1,233 @@
+"""
+A partitioned layout for datasets of articles, as an alternative to a single CSV file. The
+articles are split by source domain and month of publication, each partition being a CSV file
+as written by write_file:
+
+    <root>/dataset.json
+    <root>/source_domain=nationalpost.com/month=2021-11/part.csv
+    <root>/source_domain=torontosun.com/month=2020-03/part.csv
+    ...
+
+Each partition is written on its own, so writing some articles only replaces the partitions
+they belong to. Reads are pruned by domain and date from the folder names alone, so a query
+for one publication in one year only opens the files of that publication and year, and the
+partitions that are needed are read in parallel.
+
+
+Copyright and Usage Information
+===============================
+Code by Anna Myllyniemi and Raghav Arora, December 2021
+"""
+import datetime
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, Optional
+from urllib.parse import quote, unquote
+
+import pandas as pd
+
+from article_classes import Article, Articles
+from csv_read_write import HEADER, read_file, write_articles
+
+FORMAT_VERSION = 1
+MARKER_FILE = 'dataset.json'
+PART_FILE = 'part.csv'
+
+
+@dataclass
+class Partition:
+    """A single partition of a partitioned dataset.
+
+    Instance Attributes:
+       - source_domain: the source domain of every article in the partition
+       - month: the first day of the month every article in the partition was published in
+       - path: the path of the partition's CSV file
+    """
+    source_domain: str
+    month: datetime.date
+    path: str
+
+    def overlaps(self, start: Optional[datetime.datetime],
+                 end: Optional[datetime.datetime]) -> bool:
+        """Return whether any article published in [start, end) may be in this partition. A
+        missing start or end leaves that side of the range open."""
+        month_start = datetime.datetime(self.month.year, self.month.month, 1)
+        month_end = datetime.datetime(self.month.year + self.month.month // 12,
+                                      self.month.month % 12 + 1, 1)
+        return (start is None or month_end > start) and (end is None or month_start < end)
+
+
+def is_partitioned(path: str) -> bool:
+    """Return whether path is the root folder of a partitioned dataset."""
+    return os.path.isfile(os.path.join(path, MARKER_FILE))
+
+
+def partition_path(root: str, source_domain: str, month: datetime.date) -> str:
+    """Return the path of the CSV file of the partition for source_domain and month in root."""
+    return os.path.join(root, f'source_domain={quote(source_domain, safe="")}',
+                        f'month={month:%Y-%m}', PART_FILE)
+
+
+def write_partitioned(articles: Iterable[Article], root: str) -> int:
+    """Save articles as a partitioned dataset in root, and return the number of partitions
+    written. The partitions of root that none of articles belong to are kept as they are.
+
+    Each partition is written to a temporary file that then replaces the old one, so readers
+    see either the old or the new partition, never half of one.
+
+    Preconditions:
+        - root != ''
+    """
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, MARKER_FILE), mode='w', encoding='UTF8') as file:
+        json.dump({'version': FORMAT_VERSION, 'partition_by': ['source_domain', 'month']}, file)
+
+    groups = {}
+    for art in articles:
+        month = art.date_published.date().replace(day=1)
+        groups.setdefault((art.source_domain, month), []).append(art)
+
+    for (source_domain, month), arts in groups.items():
+        path = partition_path(root, source_domain, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_articles(arts, path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    return len(groups)
+
+
+def list_partitions(root: str, domains: Optional[list[str]] = None,
+                    start: Optional[datetime.datetime] = None,
+                    end: Optional[datetime.datetime] = None) -> list[Partition]:
+    """Return the partitions of the dataset in root that may hold articles from one of domains
+    published in [start, end), sorted by domain and month. A filter that is None keeps every
+    partition.
+
+    Preconditions:
+        - is_partitioned(root)
+    """
+    with open(os.path.join(root, MARKER_FILE), mode='r', encoding='UTF8') as file:
+        version = json.load(file)['version']
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported partitioned dataset version {version} in {root}')
+
+    partitions = []
+    for domain_dir in sorted(os.listdir(root)):
+        if not domain_dir.startswith('source_domain='):
+            continue
+        source_domain = unquote(domain_dir[len('source_domain='):])
+        if domains is not None and source_domain not in domains:
+            continue
+        for month_dir in sorted(os.listdir(os.path.join(root, domain_dir))):
+            path = os.path.join(root, domain_dir, month_dir, PART_FILE)
+            if not month_dir.startswith('month=') or not os.path.isfile(path):
+                continue
+            month = datetime.datetime.strptime(month_dir[len('month='):], '%Y-%m').date()
+            partition = Partition(source_domain, month, path)
+            if partition.overlaps(start, end):
+                partitions.append(partition)
+
+    return partitions
+
+
+def read_partitioned(root: str, domains: Optional[list[str]] = None,
+                     start: Optional[datetime.datetime] = None,
+                     end: Optional[datetime.datetime] = None, workers: int = 1) -> Articles:
+    """Read the articles of the dataset in root from one of domains and published in
+    [start, end) into an Articles object, as read_file reads a CSV file. Only the partitions
+    that may hold such articles are read, by a pool of workers processes if workers > 1.
+
+    Preconditions:
+        - is_partitioned(root)
+        - workers >= 1
+    """
+    paths = [partition.path for partition in list_partitions(root, domains, start, end)]
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parts = list(executor.map(_read_partition, paths, chunksize=8))
+    else:
+        parts = [_read_partition(path) for path in paths]
+
+    articles = Articles()
+    for part in parts:
+        for art in part:
+            # the months at either end of the range may hold articles outside of it
+            if (start is None or art.date_published >= start) and \
+                    (end is None or art.date_published < end):
+                articles.add_article(art)
+
+    return articles
+
+
+def _read_partition(path: str) -> list[Article]:
+    """Return the articles of the partition file at path."""
+    part = read_file(path)
+    return [part.get_article(key) for key in part.get_keys()]
+
+
+def read_partitioned_frame(root: str, columns: Optional[list[str]] = None,
+                           domains: Optional[list[str]] = None,
+                           start: Optional[datetime.datetime] = None,
+                           end: Optional[datetime.datetime] = None,
+                           workers: int = 4) -> pd.DataFrame:
+    """Return the given columns of the articles of the dataset in root from one of domains and
+    published in [start, end), as a DataFrame with a parsed date_publish column. Only the
+    partitions that may hold such articles are read, by a pool of workers threads (the pandas
+    CSV parser does most of its work without holding the GIL). Columns that some partitions
+    do not have (see columnar.OPTIONAL_COLUMNS) are missing values in their rows.
+
+    Preconditions:
+        - is_partitioned(root)
+        - workers >= 1
+        - columns is None or 'date_publish' in columns
+    """
+    paths = [partition.path for partition in list_partitions(root, domains, start, end)]
+    if not paths:
+        return pd.DataFrame(columns=columns or HEADER).astype({'date_publish': 'datetime64[ns]'})
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # a callable, as usecols lists must only name columns the file has
+        wanted = None if columns is None else columns.__contains__
+        frames = list(executor.map(lambda path: pd.read_csv(path, usecols=wanted), paths))
+
+    df = pd.concat(frames, ignore_index=True)
+    if columns is not None:
+        df = df.reindex(columns=columns)
+    df['date_publish'] = pd.to_datetime(df['date_publish'])
+    if start is not None:
+        df = df[df['date_publish'] >= start]
+    if end is not None:
+        df = df[df['date_publish'] < end]
+    return df.reset_index(drop=True)
+
+
+def csv_to_partitioned(csv_path: str, root: str) -> int:
+    """Convert the CSV file at csv_path (as written by write_file) to a partitioned dataset in
+    root, and return the number of partitions written.
+
+    Preconditions:
+        - csv_path != '' and root != ''
+    """
+    articles = read_file(csv_path)
+    return write_partitioned((articles.get_article(key) for key in articles.get_keys()), root)
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'allowed-io': ['write_partitioned', 'list_partitions'],
+        'extra-imports': [
+            'python_ta.contracts', 'datetime', 'json', 'os', 'concurrent.futures',
+            'dataclasses', 'typing', 'urllib.parse', 'pandas', 'article_classes',
+            'csv_read_write'
+        ],
+        'max-line-length': 100,
+        'max-nested-blocks': 4,
+        'disable': ['R1705', 'C0200', 'E9998']
+    })
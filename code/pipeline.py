@@ -0,0 +1,135 @@
+"""
+A streaming version of the whole pipeline, from data/links.txt to the analyzed articles:
+
+    links -> crawl -> setup_articles -> clean -> tag -> score -> write
+
+Every stage is a generator that passes articles on one at a time (or, for sentiment scoring,
+in small batches), and rows are written to the output file as soon as they are scored. Peak
+memory therefore depends on the crawl concurrency and the batch size, not on the number of
+links, so this can process archives far larger than would fit in an Articles object.
+
+Unlike create_dataset, articles are not collected in an Articles mapping, so two articles with
+the same title are both written. The output can also be an SQLite article store (see
+article_store.py), to which each batch is committed as soon as it is scored, so graphs can be
+drawn from the articles already analyzed while the pipeline runs.
+
+
+Copyright and Usage Information
+===============================
+Code by Anna Myllyniemi, Raghav Arora, Aarya Vatsa and Diva Hidalgo Luna, December 2021
+"""
+from typing import Iterable, Iterator, Optional
+
+from analyze_sentiment import get_engine
+from article_classes import Article, hash_text
+from crawl import CrawlCheckpoint, ScrapedArticle, iter_crawl, iter_links
+from create_dataset import build_article, clean_article
+from article_store import is_store, write_store
+from csv_read_write import write_articles
+from page_cache import PageCache
+from text_cleaner import TextCleaner, load_publication_cleaners
+from themes import ThemeTagger
+
+
+def setup_stream(scraped_articles: Iterable[ScrapedArticle]) -> Iterator[Article]:
+    """Yield the Article for each scraped article."""
+    for scraped in scraped_articles:
+        yield build_article(scraped)
+
+
+def clean_stream(articles: Iterable[Article],
+                 cleaners: Optional[dict[str, TextCleaner]] = None) -> Iterator[Article]:
+    """Clean each article as clean_dataset would, and yield it."""
+    for article in articles:
+        clean_article(article, cleaners)
+        yield article
+
+
+def tag_stream(articles: Iterable[Article],
+               tagger: Optional[ThemeTagger] = None) -> Iterator[Article]:
+    """Tag each article with its themes as tag_dataset would, and yield it."""
+    tagger = tagger if tagger is not None else ThemeTagger()
+    for article in articles:
+        tagger.tag(article)
+        yield article
+
+
+def score_stream(articles: Iterable[Article], batch_size: int = 64) -> Iterator[Article]:
+    """Compute the polarity of the average sentence of each article, as run_sentiment would,
+    scoring batch_size articles at a time, and yield the articles in order.
+
+    Preconditions:
+        - batch_size >= 1
+    """
+    batch = []
+    for article in articles:
+        batch.append(article)
+        if len(batch) == batch_size:
+            yield from _score_batch(batch)
+            batch = []
+
+    yield from _score_batch(batch)
+
+
+def _score_batch(batch: list[Article]) -> list[Article]:
+    """Score every article in batch with the shared SentimentEngine and return the batch."""
+    engine = get_engine()
+    aggregates = engine.score_batch(
+        {str(i): article.main_text for i, article in enumerate(batch)}
+    )
+    for i, article in enumerate(batch):
+        article.average_sentence_polarity = aggregates[str(i)].mean
+        article.text_hash = hash_text(article.main_text, engine.kernel)
+
+    return batch
+
+
+def run_pipeline(links_path: str, output_path: str, batch_size: int = 64,
+                 checkpoint_dir: Optional[str] = None, cache_dir: Optional[str] = None,
+                 boilerplate_dir: Optional[str] = None, max_workers: int = 8) -> int:
+    """Crawl, clean and score the articles linked from links_path one batch at a time,
+    writing each analyzed article to the csv file (or article store) at output_path as soon
+    as it is scored. Return the number of articles written.
+
+    checkpoint_dir, cache_dir, boilerplate_dir and max_workers are as for create_dataset.
+
+    Preconditions:
+        - links_path != '' and output_path != ''
+        - batch_size >= 1
+        - max_workers >= 1
+    """
+    checkpoint = CrawlCheckpoint(checkpoint_dir) if checkpoint_dir is not None else None
+    cache = PageCache(cache_dir) if cache_dir is not None else None
+    cleaners = load_publication_cleaners(boilerplate_dir) if boilerplate_dir is not None else None
+
+    scraped = iter_crawl(iter_links(links_path), checkpoint, max_workers=max_workers,
+                         cache=cache)
+    articles = score_stream(tag_stream(clean_stream(setup_stream(scraped), cleaners)),
+                            batch_size)
+    if is_store(output_path):
+        count = write_store(articles, output_path, batch_size)
+    else:
+        count = write_articles(articles, output_path)
+
+    if cache is not None:
+        cache.close()
+    return count
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'allowed-io': [],
+        'extra-imports': [
+            'python_ta.contracts', 'typing', 'analyze_sentiment', 'article_classes',
+            'article_store', 'crawl', 'create_dataset', 'csv_read_write', 'page_cache',
+            'text_cleaner', 'themes'
+        ],
+        'max-line-length': 100,
+        'max-nested-blocks': 4,
+        'disable': ['R1705', 'C0200']
+    })
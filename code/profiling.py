@@ -0,0 +1,241 @@
+"""
+Per-stage instrumentation of the pipeline. A Profiler times each named stage it is asked to
+measure and records its wall time, CPU time, peak traced memory (if asked to, as tracing memory
+slows Python code down and so inflates the times) and, when the stage says how many items it
+handled, its throughput. The records can be saved as a JSON report, and the run
+can optionally also be profiled with cProfile.
+
+Every record is logged to the 'profiling' logger and passed to any hooks added to the
+profiler, which is how the measurements reach an external monitoring system (e.g. a hook that
+sends each record to StatsD or Prometheus).
+
+A disabled profiler (such as NULL_PROFILER, the default everywhere a profiler is accepted)
+returns the same do-nothing context manager for every stage, so leaving the instrumentation in
+place costs next to nothing.
+
+
+Copyright and Usage Information
+===============================
+Code by Anna Myllyniemi, Raghav Arora, Aarya Vatsa and Diva Hidalgo Luna, December 2021
+"""
+import cProfile
+import json
+import logging
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Callable, Optional
+
+logger = logging.getLogger('profiling')
+
+
+@dataclass
+class StageRecord:
+    """The measurements of a single run of a stage.
+
+    Instance Attributes:
+       - name: the name of the stage
+       - wall_seconds: the elapsed (wall clock) time of the stage
+       - cpu_seconds: the CPU time this process spent in the stage
+       - peak_memory_bytes: the largest amount of memory traced by tracemalloc during the stage,
+       or None if memory was not traced
+       - items: the number of items the stage handled, if it said
+       - items_per_second: items divided by wall_seconds, if items is known
+    """
+    name: str
+    wall_seconds: float
+    cpu_seconds: float
+    peak_memory_bytes: Optional[int] = None
+    items: Optional[int] = None
+    items_per_second: Optional[float] = None
+
+
+class Stage:
+    """Measures a stage while it is used as a context manager. The stage may set items to
+    the number of items it handled.
+
+    Instance Attributes:
+       - name: the name of the stage
+       - items: the number of items handled by the stage, if known
+    """
+    name: str
+    items: Optional[int]
+    _profiler: 'Profiler'
+    _wall_start: float
+    _cpu_start: float
+    _child_peak: int
+
+    def __init__(self, profiler: 'Profiler', name: str, items: Optional[int]) -> None:
+        """Initialise a stage of profiler."""
+        self.name = name
+        self.items = items
+        self._profiler = profiler
+        self._wall_start = 0.0
+        self._cpu_start = 0.0
+        self._child_peak = 0
+
+    def __enter__(self) -> 'Stage':
+        """Start measuring the stage."""
+        self._profiler.enter(self)
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Stop measuring the stage and record it."""
+        wall = time.perf_counter() - self._wall_start
+        cpu = time.process_time() - self._cpu_start
+        record = StageRecord(name=self.name, wall_seconds=wall, cpu_seconds=cpu, items=self.items)
+        if self.items is not None and wall > 0:
+            record.items_per_second = self.items / wall
+        self._profiler.exit(self, record)
+
+    def record_peak(self, peak: int) -> None:
+        """Record a peak of memory reached during this stage that tracemalloc no longer
+        reports: the peak before a nested stage reset it, or the peak of a nested stage."""
+        self._child_peak = max(self._child_peak, peak)
+
+    def peak_memory(self) -> int:
+        """Return the peak traced memory of this stage, including any nested stages."""
+        return max(tracemalloc.get_traced_memory()[1], self._child_peak)
+
+
+class _NullStage:
+    """The stage returned by a disabled profiler, which measures nothing."""
+    items: Optional[int] = None
+
+    def __enter__(self) -> '_NullStage':
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        return None
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Profiler:
+    """Collects a StageRecord for each stage run while it is enabled.
+
+    Instance Attributes:
+       - enabled: whether stages are measured at all
+       - trace_memory: whether peak memory is measured (with tracemalloc, which slows Python
+       code down noticeably)
+       - records: the records of the stages measured so far, in the order they finished
+
+    Private Instance Attributes:
+       - _hooks: called with every record as soon as its stage finishes
+       - _stack: the stages currently running, innermost last
+       - _cprofile: the cProfile profiler of the run, if it is profiled
+       - _started_tracing: whether this profiler started tracemalloc, and so must stop it
+    """
+    enabled: bool
+    trace_memory: bool
+    records: list[StageRecord]
+    _hooks: list[Callable[[StageRecord], None]]
+    _stack: list[Stage]
+    _cprofile: Optional[cProfile.Profile]
+    _started_tracing: bool
+
+    def __init__(self, enabled: bool = True, trace_memory: bool = False,
+                 use_cprofile: bool = False) -> None:
+        """Initialise a profiler. If use_cprofile is True, everything run inside a stage is
+        also profiled with cProfile."""
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.records = []
+        self._hooks = []
+        self._stack = []
+        self._cprofile = cProfile.Profile() if enabled and use_cprofile else None
+        self._started_tracing = False
+
+    def add_hook(self, hook: Callable[[StageRecord], None]) -> None:
+        """Call hook with every record from now on."""
+        self._hooks.append(hook)
+
+    def stage(self, name: str, items: Optional[int] = None) -> object:
+        """Return a context manager that measures the stage called name. items, if known up
+        front, is the number of items the stage handles; it can also be set on the returned
+        stage before it finishes."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return Stage(self, name, items)
+
+    def enter(self, stage: Stage) -> None:
+        """Start the measurements of stage, which is being entered."""
+        if not self._stack:
+            if self.trace_memory and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            if self._cprofile is not None:
+                self._cprofile.enable()
+        if self.trace_memory:
+            if self._stack:
+                # the peak is reset for stage, so keep the enclosing stage's peak so far
+                self._stack[-1].record_peak(tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self._stack.append(stage)
+
+    def exit(self, stage: Stage, record: StageRecord) -> None:
+        """Finish the measurements of stage, which is being exited, and save its record."""
+        self._stack.pop()
+        if self.trace_memory:
+            record.peak_memory_bytes = stage.peak_memory()
+            if self._stack:
+                self._stack[-1].record_peak(record.peak_memory_bytes)
+        if not self._stack:
+            if self._cprofile is not None:
+                self._cprofile.disable()
+            if self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+        self.records.append(record)
+        logger.info('stage %s: %.3fs wall, %.3fs cpu', record.name, record.wall_seconds,
+                    record.cpu_seconds)
+        for hook in self._hooks:
+            hook(record)
+
+    def report(self) -> dict:
+        """Return the records as a JSON serializable report."""
+        return {'stages': [asdict(record) for record in self.records]}
+
+    def write_report(self, file_path: str) -> None:
+        """Save the report as JSON to the file at file_path.
+
+        Preconditions:
+            - file_path != ''
+        """
+        with open(file_path, mode='w', encoding='UTF8') as file:
+            json.dump(self.report(), file, indent=2)
+
+    def dump_cprofile(self, file_path: str) -> None:
+        """Save the cProfile statistics (readable with pstats or snakeviz) to file_path, if
+        the run was profiled.
+
+        Preconditions:
+            - file_path != ''
+        """
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(file_path)
+
+
+NULL_PROFILER = Profiler(enabled=False)
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'allowed-io': ['Profiler.write_report'],
+        'extra-imports': [
+            'python_ta.contracts', 'cProfile', 'json', 'logging', 'time', 'tracemalloc',
+            'dataclasses', 'typing'
+        ],
+        'max-line-length': 100,
+        'max-nested-blocks': 4,
+        'disable': ['R1705', 'C0200', 'E9998']
+    })
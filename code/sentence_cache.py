@@ -0,0 +1,234 @@
+"""
+A cache of sentence -> compound polarity, shared by every article a SentimentEngine scores.
+
+Syndicated and templated news repeats many sentences word for word (wire copy, disclaimers,
+quoted press releases), and VADER gives a sentence the same score wherever it appears, so each
+distinct sentence only needs to be scored once. The most recently used sentences are kept in
+memory, up to a bounded number. Scores can also be kept in a SQLite file between runs, so
+re-scoring a corpus only scores the sentences that are new.
+
+Scores are kept apart for each scoring kernel (see analyze_sentiment.KERNELS): the cache holds
+the scores of one kernel at a time, and the persistent store has a table per kernel, so a
+score computed by one kernel is never returned for another. The persistent store holds scores
+from the current VADER lexicon; it must be deleted if the lexicon or the scoring changes.
+
+
+Copyright and Usage Information
+===============================
+Code by Raghav Arora, December 2021
+"""
+import hashlib
+import sqlite3
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+DEFAULT_MAX_ENTRIES = 200_000
+DEFAULT_KERNEL = 'vader'
+
+
+@dataclass
+class CacheStats:
+    """The lookups made in a SentenceCache.
+
+    Instance Attributes:
+       - hits: the lookups answered from memory
+       - store_hits: the lookups answered from the persistent store
+       - misses: the lookups for sentences that had to be scored
+
+    Representation Invariants:
+        - self.hits >= 0 and self.store_hits >= 0 and self.misses >= 0
+    """
+    hits: int = 0
+    store_hits: int = 0
+    misses: int = 0
+
+    @property
+    def lookups(self) -> int:
+        """The total number of lookups."""
+        return self.hits + self.store_hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of lookups that did not need a sentence to be scored."""
+        return (self.hits + self.store_hits) / self.lookups if self.lookups else 0.0
+
+    def merge(self, other: 'CacheStats') -> None:
+        """Add the lookups of other to these."""
+        self.hits += other.hits
+        self.store_hits += other.store_hits
+        self.misses += other.misses
+
+    def __str__(self) -> str:
+        return (f'{self.lookups} sentences, {self.hit_rate:.1%} cached '
+                f'({self.hits} in memory, {self.store_hits} stored, {self.misses} scored)')
+
+
+class SentenceCache:
+    """A least recently used cache of the compound polarity of sentences, as scored by one
+    kernel, optionally backed by a SQLite store.
+
+    Instance Attributes:
+       - max_entries: the largest number of sentences kept in memory
+       - stats: the lookups made so far
+       - kernel: the name of the kernel whose scores are cached
+
+    Private Instance Attributes:
+       - _scores: the cached scores, least recently used first
+       - _store: the connection to the persistent store, if any
+       - _store_path: the path of the persistent store, or '' if there is none
+       - _pending: the scores not written to the store yet
+
+    Representation Invariants:
+        - self.max_entries >= 1
+        - len(self._scores) <= self.max_entries
+        - self.kernel.isidentifier()
+    """
+    max_entries: int
+    stats: CacheStats
+    kernel: str
+    _scores: OrderedDict[str, float]
+    _store: Optional[sqlite3.Connection]
+    _store_path: str
+    _pending: list[tuple[bytes, float]]
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 store_path: Optional[str] = None, kernel: str = DEFAULT_KERNEL) -> None:
+        """Initialise an empty cache of the scores of kernel, using the persistent store at
+        store_path if it is given.
+
+        Preconditions:
+            - max_entries >= 1
+            - kernel.isidentifier()
+        """
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self.kernel = kernel
+        self._scores = OrderedDict()
+        self._store = None
+        self._store_path = ''
+        self._pending = []
+        if store_path is not None:
+            self.open_store(store_path)
+
+    def open_store(self, store_path: str) -> None:
+        """Back this cache with the SQLite store at store_path, creating it if necessary. Does
+        nothing if that store is already open.
+
+        Preconditions:
+            - store_path != ''
+        """
+        if store_path == self._store_path:
+            return
+        self.close()
+        # several worker processes may write to the same store
+        self._store = sqlite3.connect(store_path, timeout=60)
+        self._store.execute('PRAGMA journal_mode=WAL')
+        self._create_table()
+        self._store_path = store_path
+
+    def use_kernel(self, kernel: str) -> None:
+        """Cache the scores of kernel from now on. If it is not the kernel whose scores are
+        cached, the scores in memory are forgotten (and the new ones written to the store
+        first); the stats are kept.
+
+        Preconditions:
+            - kernel.isidentifier()
+        """
+        if kernel == self.kernel:
+            return
+        self.flush()
+        self._scores.clear()
+        self.kernel = kernel
+        if self._store is not None:
+            self._create_table()
+
+    def _create_table(self) -> None:
+        """Create the table of the scores of the kernel in the store, if it does not exist."""
+        self._store.execute(f'CREATE TABLE IF NOT EXISTS {self._table()} '
+                            '(sentence_hash BLOB PRIMARY KEY, compound REAL NOT NULL) '
+                            'WITHOUT ROWID')
+        self._store.commit()
+
+    def _table(self) -> str:
+        """Return the name of the table of the scores of the kernel in the store."""
+        return f'sentences_{self.kernel}'
+
+    def get(self, sentence: str) -> Optional[float]:
+        """Return the cached score of sentence, or None if it has not been scored."""
+        score = self._scores.get(sentence)
+        if score is not None:
+            self._scores.move_to_end(sentence)
+            self.stats.hits += 1
+            return score
+
+        if self._store is not None:
+            row = self._store.execute(
+                f'SELECT compound FROM {self._table()} WHERE sentence_hash = ?',
+                (_sentence_hash(sentence),)).fetchone()
+            if row is not None:
+                self._remember(sentence, row[0])
+                self.stats.store_hits += 1
+                return row[0]
+
+        self.stats.misses += 1
+        return None
+
+    def put(self, sentence: str, score: float) -> None:
+        """Cache the score of sentence. Call flush to write new scores to the store."""
+        self._remember(sentence, score)
+        if self._store is not None:
+            self._pending.append((_sentence_hash(sentence), score))
+
+    def _remember(self, sentence: str, score: float) -> None:
+        """Keep the score of sentence in memory, evicting the least recently used sentence if
+        the cache is full."""
+        self._scores[sentence] = score
+        self._scores.move_to_end(sentence)
+        if len(self._scores) > self.max_entries:
+            self._scores.popitem(last=False)
+
+    def flush(self) -> None:
+        """Write the scores cached since the last flush to the persistent store, if any."""
+        if self._store is not None and self._pending:
+            with self._store:
+                self._store.executemany(f'INSERT OR REPLACE INTO {self._table()} VALUES (?, ?)',
+                                        self._pending)
+            self._pending = []
+
+    def clear(self) -> None:
+        """Forget the scores kept in memory and reset the stats. The store is not changed."""
+        self._scores.clear()
+        self.stats = CacheStats()
+
+    def close(self) -> None:
+        """Flush and close the persistent store, if any."""
+        if self._store is not None:
+            self.flush()
+            self._store.close()
+            self._store = None
+            self._store_path = ''
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+
+def _sentence_hash(sentence: str) -> bytes:
+    """Return the key of sentence in the persistent store."""
+    return hashlib.sha1(sentence.encode('UTF8')).digest()
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'allowed-io': [],
+        'extra-imports': ['python_ta.contracts', 'hashlib', 'sqlite3', 'collections',
+                          'dataclasses', 'typing'],
+        'max-line-length': 100,
+        'max-nested-blocks': 4,
+        'disable': ['R1705', 'C0200']
+    })
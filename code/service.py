@@ -0,0 +1,352 @@
+"""
+A long-running analysis service with a local HTTP API. The analyzed articles are loaded and
+indexed once (see graphing.AnalysisSession), and the VADER lexicon and sentence cache stay
+loaded, so each query only pays for its own work instead of Python startup, imports and CSV
+parsing:
+
+    POST /score    {"text": "..."}                 the polarity of a piece of text
+    POST /urls     {"urls": ["https://...", ...]}  crawl, clean, score and add articles
+    GET  /series   ?keyword=&frequency=weekly      the polarity summarised per time bucket
+    GET  /figure   ?keyword=&frequency=&format=json|html
+    GET  /health
+
+The keyword is a regular expression, as in graphing.filter_frame. /series and /figure also
+accept domain (repeatable), start and end (YYYY-MM-DD, end excluded) to restrict the articles,
+as in graphing.load_frame, and all and any (repeatable) to keep the articles with all of, and
+any of, some theme labels, as in graphing.AnalysisSession.filter.
+
+Requests are handled by an asyncio server. The analysis itself runs on a single worker thread,
+so the event loop keeps accepting requests while it works, and the session is never used by
+two requests at once. Crawling runs on its own threads, and does not hold up other queries.
+Figures are cached until articles are added.
+
+    python service.py <analyzed articles> [--host 127.0.0.1] [--port 8110]
+
+Run from the code folder.
+
+
+Copyright and Usage Information
+===============================
+Code by Anna Myllyniemi, Raghav Arora, Aarya Vatsa and Diva Hidalgo Luna, December 2021
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from aggregation import FREQUENCIES, bucket_polarity
+from analyze_sentiment import get_engine
+from article_classes import Article
+from crawl import iter_crawl
+from csv_read_write import HEADER, article_to_row
+from graphing import AnalysisSession, build_figure, build_summary_figure, facet_title, \
+    restrict_frame
+from page_cache import PageCache
+from pipeline import clean_stream, score_stream, setup_stream, tag_stream
+
+logger = logging.getLogger('service')
+
+MAX_BODY_BYTES = 10 * 1024 ** 2
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class RequestError(Exception):
+    """Raised when a request cannot be answered, with the HTTP status to answer with.
+
+    Instance Attributes:
+       - status: the HTTP status of the response
+    """
+    status: int
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class AnalysisService:
+    """The state shared by every request: the loaded articles and the warm caches.
+
+    Instance Attributes:
+       - session: the analyzed articles, with their keyword indexes
+
+    Private Instance Attributes:
+       - _executor: the single thread the analysis runs on
+       - _crawl_executor: the threads new URLs are crawled on
+       - _cache: the page cache new URLs are fetched through, if any
+       - _figures: the JSON and HTML of the figures drawn since articles were last added
+       - _routes: the handler of each method and path
+    """
+    session: AnalysisSession
+    _executor: ThreadPoolExecutor
+    _crawl_executor: ThreadPoolExecutor
+    _cache: Optional[PageCache]
+    _figures: dict[tuple, str]
+    _routes: dict[tuple[str, str], Callable]
+
+    def __init__(self, filepath: str, cache_dir: Optional[str] = None) -> None:
+        """Load and index the analyzed articles at filepath (see AnalysisSession) and the VADER
+        lexicon. New URLs are fetched through the page cache in cache_dir, if it is given.
+
+        Preconditions:
+            - filepath != ''
+        """
+        self.session = AnalysisSession(filepath)
+        get_engine()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._crawl_executor = ThreadPoolExecutor(max_workers=1)
+        self._cache = PageCache(cache_dir) if cache_dir is not None else None
+        self._figures = {}
+        self._routes = {
+            ('GET', '/health'): self.health,
+            ('POST', '/score'): self.score,
+            ('POST', '/urls'): self.add_urls,
+            ('GET', '/series'): self.series,
+            ('GET', '/figure'): self.figure,
+        }
+
+    async def handle(self, method: str, target: str, body: bytes) -> tuple[str, bytes]:
+        """Answer a request, returning the content type and body of the response.
+
+        Raise RequestError if the request cannot be answered.
+        """
+        url = urlsplit(target)
+        route = self._routes.get((method, url.path))
+        if route is None:
+            if any(path == url.path for _, path in self._routes):
+                raise RequestError(405, f'{method} is not supported on {url.path}')
+            raise RequestError(404, f'No such endpoint: {url.path}')
+
+        query = parse_qs(url.query)
+        payload = {}
+        if method == 'POST':
+            try:
+                payload = json.loads(body or b'{}')
+            except ValueError as error:
+                raise RequestError(400, f'Invalid JSON: {error}') from error
+            if not isinstance(payload, dict):
+                raise RequestError(400, 'The JSON body must be an object')
+
+        result = await route(query, payload)
+        if isinstance(result, str):
+            return 'text/html; charset=utf-8', result.encode('UTF8')
+        return 'application/json', json.dumps(result).encode('UTF8')
+
+    async def _run(self, function: Callable, *args: object) -> object:
+        """Run function with args on the analysis thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    async def health(self, _query: dict, _payload: dict) -> dict:
+        """Return the number of articles loaded and the sentence cache statistics."""
+        stats = get_engine().cache.stats
+        return {'articles': len(self.session.df), 'sentence_cache_hit_rate': stats.hit_rate,
+                'sentence_cache_lookups': stats.lookups}
+
+    async def score(self, _query: dict, payload: dict) -> dict:
+        """Return the sentence polarity summary of payload['text']."""
+        text = payload.get('text')
+        if not isinstance(text, str):
+            raise RequestError(400, 'Expected {"text": "..."}')
+
+        aggregate = (await self._run(get_engine().score_batch, {'text': text}))['text']
+        return {'polarity': aggregate.mean, 'minimum': aggregate.minimum,
+                'maximum': aggregate.maximum, 'sentences': aggregate.sentence_count}
+
+    async def add_urls(self, _query: dict, payload: dict) -> dict:
+        """Crawl, clean and score the articles at payload['urls'], add them to the session and
+        return their polarities. URLs that fail to fetch or extract are left out."""
+        urls = payload.get('urls')
+        if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+            raise RequestError(400, 'Expected {"urls": ["...", ...]}')
+
+        loop = asyncio.get_running_loop()
+        scraped = await loop.run_in_executor(
+            self._crawl_executor, lambda: list(iter_crawl(urls, cache=self._cache)))
+        articles = await self._run(self._add_articles, scraped)
+        return {'added': len(articles),
+                'articles': [{'url': art.url, 'title': art.title,
+                              'polarity': art.average_sentence_polarity} for art in articles]}
+
+    def _add_articles(self, scraped: list) -> list[Article]:
+        """Clean, tag and score the scraped articles and add them to the session."""
+        articles = list(score_stream(tag_stream(clean_stream(setup_stream(scraped)))))
+        if articles:
+            df = pd.DataFrame([article_to_row(art) for art in articles], columns=HEADER)
+            df['date_publish'] = pd.to_datetime(df['date_publish'])
+            self.session.add_articles(df)
+            self._figures.clear()
+        return articles
+
+    async def series(self, query: dict, _payload: dict) -> list[dict]:
+        """Return the polarity of the matching articles summarised per time bucket (see
+        aggregation.bucket_polarity), one record per bucket."""
+        keyword, frequency = _keyword(query), _param(query, 'frequency', 'weekly')
+        if frequency not in FREQUENCIES:
+            raise RequestError(400, f'frequency must be one of {", ".join(FREQUENCIES)}')
+        domains, start, end = _restriction(query)
+        all_of, any_of = query.get('all', []), query.get('any', [])
+
+        def summarise() -> list[dict]:
+            df = restrict_frame(self.session.filter(keyword, all_of, any_of), domains, start, end)
+            buckets = bucket_polarity(df, frequency)
+            buckets['date_publish'] = buckets['date_publish'].dt.strftime('%Y-%m-%d')
+            # NaN (the spread of single-article buckets) is not valid JSON
+            return json.loads(buckets.to_json(orient='records'))
+
+        return await self._run(summarise)
+
+    async def figure(self, query: dict, _payload: dict) -> object:
+        """Return the graph of the matching articles as Plotly JSON, or as an HTML page if the
+        format parameter is html. The graph is the one AnalysisSession.draw would show."""
+        keyword, frequency = _keyword(query), _param(query, 'frequency')
+        output_format = _param(query, 'format', 'json')
+        if frequency not in FREQUENCIES and frequency != '':
+            raise RequestError(400, f'frequency must be \'\' or one of {", ".join(FREQUENCIES)}')
+        if output_format not in {'json', 'html'}:
+            raise RequestError(400, 'format must be json or html')
+        domains, start, end = _restriction(query)
+        all_of, any_of = query.get('all', []), query.get('any', [])
+        key = (keyword, frequency, output_format, tuple(domains or ()), start, end,
+               tuple(all_of), tuple(any_of))
+
+        def draw() -> str:
+            if key not in self._figures:
+                df = restrict_frame(self.session.filter(keyword, all_of, any_of), domains,
+                                    start, end)
+                title = facet_title(keyword, all_of, any_of)
+                if frequency == '':
+                    figure = build_figure(df, title)
+                else:
+                    figure = build_summary_figure(df, title, frequency)
+                if output_format == 'html':
+                    self._figures[key] = figure.to_html(include_plotlyjs='cdn')
+                else:
+                    self._figures[key] = figure.to_json()
+            return self._figures[key]
+
+        drawn = await self._run(draw)
+        return drawn if output_format == 'html' else json.loads(drawn)
+
+    def close(self) -> None:
+        """Stop the worker threads and close the page cache."""
+        self._crawl_executor.shutdown()
+        self._executor.shutdown()
+        if self._cache is not None:
+            self._cache.close()
+
+
+def _param(query: dict, name: str, default: str = '') -> str:
+    """Return the first value of the query parameter name, or default if it is missing."""
+    return query.get(name, [default])[0]
+
+
+def _keyword(query: dict) -> str:
+    """Return the keyword parameter of query, which is a regular expression (see
+    AnalysisSession.filter, which also matches it against urls in lower case without spaces)."""
+    keyword = _param(query, 'keyword')
+    try:
+        re.compile(keyword)
+        re.compile(keyword.lower().replace(' ', ''))
+    except re.error as error:
+        raise RequestError(400, f'keyword is not a valid regular expression: {error}') from error
+    return keyword
+
+
+def _restriction(query: dict) -> tuple[Optional[list[str]], Optional[datetime.datetime],
+                                       Optional[datetime.datetime]]:
+    """Return the domains, start and end parameters of query (see graphing.restrict_frame)."""
+    dates = []
+    for name in ('start', 'end'):
+        value = _param(query, name)
+        try:
+            dates.append(datetime.datetime.strptime(value, '%Y-%m-%d') if value else None)
+        except ValueError as error:
+            raise RequestError(400, f'{name} must be a YYYY-MM-DD date') from error
+
+    return query.get('domain'), dates[0], dates[1]
+
+
+async def serve(service: AnalysisService, host: str = '127.0.0.1',
+                port: int = 8110) -> asyncio.Server:
+    """Start answering HTTP requests to service on host and port, and return the server. Port
+    0 picks a free port, which can be read from the server's sockets."""
+    async def on_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            await _answer(service, reader, writer)
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(on_connection, host, port)
+
+
+async def _answer(service: AnalysisService, reader: asyncio.StreamReader,
+                  writer: asyncio.StreamWriter) -> None:
+    """Read a single HTTP/1.1 request from reader, and write the response to writer."""
+    try:
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) != 3:
+            raise RequestError(400, 'Malformed request line')
+        method, target, _ = request_line
+
+        headers = {}
+        while (line := (await reader.readline()).decode('latin-1').strip()) != '':
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length', '0'))
+        if length > MAX_BODY_BYTES:
+            raise RequestError(413, f'Request bodies are limited to {MAX_BODY_BYTES} bytes')
+        body = await reader.readexactly(length) if length > 0 else b''
+
+        status = 200
+        content_type, content = await service.handle(method, target, body)
+    except (RequestError, ValueError, asyncio.IncompleteReadError) as error:
+        status = error.status if isinstance(error, RequestError) else 400
+        content_type, content = 'application/json', json.dumps({'error': str(error)}).encode()
+    except Exception as error:  # answer the client rather than dropping the connection
+        logger.exception('Request failed')
+        status = 500
+        content_type, content = 'application/json', json.dumps({'error': str(error)}).encode()
+
+    writer.write(f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+                 f'Content-Type: {content_type}\r\n'
+                 f'Content-Length: {len(content)}\r\n'
+                 'Connection: close\r\n\r\n'.encode('latin-1') + content)
+    await writer.drain()
+
+
+async def run_service(filepath: str, host: str, port: int,
+                      cache_dir: Optional[str] = None) -> None:
+    """Load the analyzed articles at filepath and serve them on host and port until
+    interrupted."""
+    service = AnalysisService(filepath, cache_dir)
+    server = await serve(service, host, port)
+    logger.info('Serving %d articles on http://%s:%d', len(service.session.df), host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the analyzed articles over HTTP.')
+    parser.add_argument('filepath', nargs='?', default='./data/analyzed_articles.csv')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8110)
+    parser.add_argument('--cache-dir', default=None)
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(run_service(arguments.filepath, arguments.host, arguments.port,
+                                arguments.cache_dir))
+    except KeyboardInterrupt:
+        pass
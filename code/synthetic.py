@@ -0,0 +1,114 @@
+"""
+A deterministic generator of synthetic news articles, for benchmarking the pipeline on corpora
+of any size without crawling anything.
+
+The generated articles have the same fields as Article and look like freshly scraped pages:
+the main text repeats the title and description, contains curly quotes and dashes, and has
+boilerplate strings from text_cleaner.DEFAULT_BOILERPLATE (and the Postmedia 'Article content'
+markers) mixed in, at a configurable density. The same seed and size always produce the same
+articles.
+
+
+Copyright and Usage Information
+===============================
+Code by Anna Myllyniemi, Raghav Arora, Aarya Vatsa and Diva Hidalgo Luna, December 2021
+"""
+import datetime
+import random
+from typing import Iterator
+
+from article_classes import Article, Articles
+from text_cleaner import DEFAULT_BOILERPLATE
+
+DOMAINS = ['nationalpost.com', 'torontosun.com', 'www.theglobeandmail.com', 'leaderpost.com',
+           'calgaryherald.com', 'montrealgazette.com', 'vancouversun.com', 'www.thestar.com']
+TOPICS = ['vaccine mandates', 'the lockdown', 'border closures', 'the mask bylaw',
+          'school reopening', 'vaccine passports', 'the travel ban', 'quarantine hotels']
+PLACES = ['Toronto', 'Ottawa', 'Regina', 'Calgary', 'Montreal', 'Vancouver', 'Alberta',
+          'Ontario']
+OPINIONS = ['a welcome relief', 'a terrible mistake', 'long overdue', 'deeply unfair',
+            'a reasonable compromise', 'an outright disaster', 'good news for families',
+            'a worrying sign']
+SENTENCES = [
+    'Officials in {place} said {topic} would remain in place for at least another month.',
+    'Critics called {topic} {opinion}, while supporters said it was necessary.',
+    'Many residents of {place} told us that {topic} was {opinion}.',
+    '“We have to follow the science,” the minister said — and {topic} is part of that.',
+    'Business owners in {place} worry that {topic} won’t end soon.',
+    'The premier defended {topic} on Tuesday, calling it {opinion}.',
+    'Health experts say {topic} has saved lives across {place}.',
+    'Nobody in {place} is happy about {topic}, but most people accept it.',
+]
+START_DATE = datetime.datetime(2020, 1, 1)
+DAYS = 729  # up to 2021-12-30, the end of the graphs' date range
+
+
+def generate_articles(n: int, seed: int = 0, boilerplate_density: float = 0.25,
+                      sentences: int = 8) -> Iterator[Article]:
+    """Yield n synthetic, not yet cleaned articles of about the given number of sentences.
+    After each sentence, a boilerplate string is inserted with probability
+    boilerplate_density.
+
+    Preconditions:
+        - n >= 0
+        - 0.0 <= boilerplate_density <= 1.0
+        - sentences >= 1
+    """
+    rng = random.Random(seed)
+    for i in range(n):
+        domain = rng.choice(DOMAINS)
+        topic = rng.choice(TOPICS)
+        place = rng.choice(PLACES)
+        title = f'Opinion: {place} and {topic}, article {i}'
+        description = f'What {topic} means for {place}, {rng.choice(OPINIONS)}'
+
+        body = []
+        for _ in range(sentences):
+            template = rng.choice(SENTENCES)
+            body.append(template.format(topic=rng.choice(TOPICS), place=place,
+                                        opinion=rng.choice(OPINIONS)))
+            if rng.random() < boilerplate_density:
+                body.append(rng.choice(DEFAULT_BOILERPLATE))
+
+        main_text = '\n\n'.join(body)
+        if domain != 'www.theglobeandmail.com':  # Postmedia pages wrap the body
+            main_text = (f'Photo by Postmedia Article content{title}\n\n{description}\n\n'
+                         f'Article content{main_text}')
+
+        yield Article(
+            title=title,
+            date_published=START_DATE + datetime.timedelta(days=rng.randrange(DAYS),
+                                                           seconds=rng.randrange(86400)),
+            authors=[f'Columnist {rng.randrange(500)}'],
+            main_text=main_text,
+            source_domain=domain,
+            url=f'https://{domain}/opinion/{place.lower()}-article-{i}',
+            description=description
+        )
+
+
+def generate_corpus(n: int, seed: int = 0, boilerplate_density: float = 0.25) -> Articles:
+    """Return an Articles object holding generate_articles(n, seed, boilerplate_density)."""
+    articles = Articles()
+    for article in generate_articles(n, seed, boilerplate_density):
+        articles.add_article(article)
+
+    return articles
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'allowed-io': [],
+        'extra-imports': [
+            'python_ta.contracts', 'datetime', 'random', 'typing', 'article_classes',
+            'text_cleaner'
+        ],
+        'max-line-length': 100,
+        'max-nested-blocks': 4,
+        'disable': ['R1705', 'C0200']
+    })
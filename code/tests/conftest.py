@@ -0,0 +1,119 @@
+"""
+Shared fixtures of the tests: the code folder on the import path (the modules are run from
+there, with flat imports), and a local HTTP server standing in for the publishers' sites.
+
+
+Copyright and Usage Information
+===============================
+Code by Anna Myllyniemi, December 2021
+"""
+import hashlib
+import http.server
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+CODE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CODE_DIRECTORY)
+
+ARTICLE_PAGE = """<html><head><title>{title}</title>
+<meta name="description" content="About {title}">
+<meta property="article:published_time" content="2021-01-0{number}T10:00:00Z">
+<meta name="author" content="Jane Doe"></head>
+<body><article><h1>{title}</h1>
+<p>The vaccine mandate was announced today in Toronto and people had many opinions about it.
+Some were happy, some were not happy at all about the lockdown that came with it.</p>
+<p>Another paragraph of reasonably long text, so that the extractor keeps this content as the
+main body of the article called {title}.</p></article></body></html>"""
+
+
+class LocalSite:
+    """A folder of pages served over HTTP on localhost, answering conditional requests with
+    304 Not Modified when the ETag of a page has not changed.
+
+    Instance Attributes:
+       - root: the folder the pages are served from
+       - base_url: the URL of the root of the site, ending with '/'
+       - requests: the path and If-None-Match header of every request received, in order
+       - request_times: the time.monotonic() of every request received, in order
+    """
+    root: str
+    base_url: str
+    requests: list[tuple[str, str]]
+    request_times: list[float]
+
+    def __init__(self, root: str, base_url: str) -> None:
+        self.root = root
+        self.base_url = base_url
+        self.requests = []
+        self.request_times = []
+
+    def url(self, path: str) -> str:
+        """Return the URL of the page at path on the site."""
+        return self.base_url + path
+
+    def write(self, path: str, text: str) -> str:
+        """Serve text at path, with every '{base}' in it replaced by base_url, and return the
+        URL of the page."""
+        with open(os.path.join(self.root, path), mode='w', encoding='UTF8') as file:
+            file.write(text.replace('{base}', self.base_url))
+        return self.url(path)
+
+    def write_article(self, path: str, number: int) -> str:
+        """Serve an article page called 'Test article <number>' at path, and return its URL."""
+        return self.write(path, ARTICLE_PAGE.format(title=f'Test article {number}',
+                                                    number=number))
+
+    def paths(self) -> list[str]:
+        """Return the paths of the requests received, in order."""
+        return [path for path, _ in self.requests]
+
+
+@pytest.fixture
+def site(tmp_path: Path) -> Iterator[LocalSite]:
+    """Yield an empty LocalSite, served until the test finishes."""
+    root = str(tmp_path / 'site')
+    os.makedirs(root)
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        """Serves the files of root."""
+
+        def log_message(self, *args: object) -> None:
+            return None
+
+        def do_GET(self) -> None:
+            local.requests.append((self.path, self.headers.get('If-None-Match')))
+            local.request_times.append(time.monotonic())
+            path = os.path.join(root, self.path.split('?')[0].split('#')[0].lstrip('/'))
+            if not os.path.isfile(path):
+                self.send_response(404)
+                self.end_headers()
+                return
+
+            with open(path, mode='rb') as file:
+                body = file.read()
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    local = LocalSite(root, f'http://127.0.0.1:{server.server_port}/')
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield local
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,37 @@
+"""
+Tests of Articles.run_sentiment reusing the polarities of an earlier run.
+
+
+Copyright and Usage Information
+===============================
+Code by Raghav Arora, December 2021
+"""
+import datetime
+
+from article_classes import Article, Articles
+
+
+def make_articles() -> Articles:
+    """Return two small articles."""
+    articles = Articles()
+    for number, text in ((1, 'The vaccine rollout was a disaster. Great news!'),
+                         (2, 'People were not happy about the lockdown at all.')):
+        articles.add_article(Article(f'Article {number}', datetime.datetime(2021, 1, number),
+                                     ['Jane Doe'], text, 'example.com',
+                                     f'http://example.com/{number}.html', 'An article'))
+    return articles
+
+
+def test_scores_are_only_reused_from_the_same_kernel() -> None:
+    """An unchanged article reuses the polarity of an earlier run with the same kernel, and is
+    scored again after a run with the other kernel."""
+    vader = make_articles()
+    assert vader.run_sentiment(kernel='vader') == (2, 0)
+
+    numpy = make_articles()
+    assert numpy.run_sentiment(previous=vader, kernel='numpy') == (2, 0)
+    assert make_articles().run_sentiment(previous=numpy, kernel='numpy') == (0, 2)
+
+    changed = make_articles()
+    changed.get_article('Article 2').main_text = 'People were happy about the lockdown.'
+    assert changed.run_sentiment(previous=numpy, kernel='numpy') == (1, 1)
@@ -0,0 +1,81 @@
+"""
+Tests of crawl.py against a local HTTP server (see conftest.py).
+
+
+Copyright and Usage Information
+===============================
+Code by Anna Myllyniemi, December 2021
+"""
+import time
+
+from crawl import CrawlCheckpoint, HostRateLimiter, crawl, iter_crawl
+from page_cache import PageCache
+
+
+def test_iter_crawl_extracts_every_article(site) -> None:
+    """Every page is fetched and extracted, and a missing page is skipped."""
+    urls = [site.write_article(f'a{i}.html', i) for i in range(1, 4)]
+    articles = crawl(urls + [site.url('missing.html')], min_host_interval=0.0)
+
+    assert set(articles) == set(urls)
+    assert articles[urls[0]].title == 'Test article 1'
+    assert 'vaccine mandate' in articles[urls[0]].maintext
+    assert articles[urls[0]].source_domain == '127.0.0.1'
+
+
+def test_host_rate_limiter_spaces_requests_to_a_host(site) -> None:
+    """Requests to the same host are at least min_host_interval apart, whatever the number of
+    threads."""
+    urls = [site.write_article(f'a{i}.html', i) for i in range(1, 5)]
+    list(iter_crawl(urls, max_workers=4, min_host_interval=0.2))
+
+    times = sorted(site.request_times)
+    assert len(times) == 4
+    assert all(later - earlier >= 0.19 for earlier, later in zip(times, times[1:]))
+
+
+def test_host_rate_limiter_only_delays_the_same_host() -> None:
+    """A request waits for the slot of its own host, not for those of other hosts."""
+    limiter = HostRateLimiter(0.3)
+    start = time.monotonic()
+    limiter.wait('http://a.example/1')
+    limiter.wait('http://b.example/1')
+    assert time.monotonic() - start < 0.1
+    limiter.wait('http://a.example/2')
+    assert time.monotonic() - start >= 0.29
+
+
+def test_checkpoint_resumes_an_interrupted_crawl(site, tmp_path) -> None:
+    """A crawl stopped after one article is resumed without fetching that article again."""
+    urls = [site.write_article(f'a{i}.html', i) for i in range(1, 4)]
+    checkpoint = CrawlCheckpoint(str(tmp_path / 'checkpoints'))
+
+    crawler = iter_crawl(urls, checkpoint, max_workers=1, min_host_interval=0.0)
+    first = next(crawler)
+    crawler.close()
+    assert checkpoint.contains(first.url)
+
+    articles = crawl(urls, checkpoint, max_workers=1, min_host_interval=0.0)
+    assert set(articles) == set(urls)
+    first_path = '/' + first.url.rsplit('/', 1)[-1]
+    assert site.paths().count(first_path) == 1
+    assert all(checkpoint.contains(url) for url in urls)
+
+    # a finished crawl is answered from the checkpoint alone
+    requests = len(site.requests)
+    assert set(crawl(urls, checkpoint, min_host_interval=0.0)) == set(urls)
+    assert len(site.requests) == requests
+
+
+def test_page_cache_revalidates_unchanged_pages(site, tmp_path) -> None:
+    """A cached page that is no longer fresh is revalidated with its ETag, and answered from
+    the cache while it has not changed."""
+    url = site.write_article('a1.html', 1)
+    cache = PageCache(str(tmp_path / 'cache'), max_age=0.0)  # every page is stale at once
+    first = crawl([url], min_host_interval=0.0, cache=cache)
+    second = crawl([url], min_host_interval=0.0, cache=cache)
+    cache.close()
+
+    assert second[url] == first[url]
+    assert site.requests[0][1] is None
+    assert site.requests[1][1] is not None  # the second request was conditional
@@ -0,0 +1,145 @@
+"""
+Tests of frontier.py, discovering articles from a robots.txt file, a sitemap index, a news
+sitemap and RSS and Atom feeds served by a local HTTP server (see conftest.py).
+
+
+Copyright and Usage Information
+===============================
+Code by Anna Myllyniemi, December 2021
+"""
+import time
+
+import pytest
+
+from frontier import Frontier, crawl_frontier, parse_date
+
+ROBOTS = """User-agent: *
+Disallow: /private/
+Sitemap: {base}sitemap_index.xml
+"""
+
+SITEMAP_INDEX = """<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+<sitemap><loc>{base}news.xml</loc></sitemap>
+</sitemapindex>"""
+
+NEWS_SITEMAP = """<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+<url><loc>{base}a1.html?utm_source=twitter</loc><lastmod>{lastmod}</lastmod></url>
+<url><loc>{base}a2.html</loc><lastmod>2021-01-02</lastmod></url>
+</urlset>"""
+
+RSS = """<rss version="2.0"><channel><title>News</title><link>{base}</link>
+<item><title>Third</title><link>/a3.html#comments</link>
+<pubDate>Wed, 06 Jan 2021 10:00:00 GMT</pubDate></item>
+<item><title>Gone</title><link>{base}missing.html</link></item>
+</channel></rss>"""
+
+ATOM = """<feed xmlns="http://www.w3.org/2005/Atom">
+<entry><link rel="alternate" href="{base}a2.html?fbclid=abc"/>
+<updated>2021-01-02T00:00:00Z</updated></entry>
+</feed>"""
+
+# A time after the lastmod dates of the fixtures, at which the tests run discover
+NOW = parse_date('2021-06-01')
+
+
+@pytest.fixture
+def feeds(site):
+    """Serve the fixture feeds and articles on site, and return it."""
+    site.write('robots.txt', ROBOTS)
+    site.write('sitemap_index.xml', SITEMAP_INDEX)
+    site.write('news.xml', NEWS_SITEMAP.replace('{lastmod}', '2021-01-01'))
+    site.write('rss.xml', RSS)
+    site.write('atom.xml', ATOM)
+    for number in range(1, 4):
+        site.write_article(f'a{number}.html', number)
+    return site
+
+
+@pytest.fixture
+def frontier(feeds, tmp_path):
+    """Yield a Frontier following the robots.txt file and the feeds of feeds."""
+    frontier = Frontier(str(tmp_path / 'frontier.db'))
+    for path in ('robots.txt', 'rss.xml', 'atom.xml'):
+        frontier.add_feed(feeds.url(path), interval=3600)
+    yield frontier
+    frontier.close()
+
+
+def test_discover_follows_robots_sitemaps_and_feeds(feeds, frontier) -> None:
+    """Articles are found through robots.txt, the sitemap index it lists, and the RSS and Atom
+    feeds, with tracking parameters and fragments dropped so that no article is added twice."""
+    assert frontier.discover(now=NOW) == 4
+    assert {entry.url for entry in frontier.due(now=NOW)} == {
+        feeds.url('a1.html'), feeds.url('a2.html'), feeds.url('a3.html'),
+        feeds.url('missing.html')}
+    assert not any(entry.refetch for entry in frontier.due(now=NOW))
+
+
+def test_discover_sends_conditional_requests(feeds, frontier) -> None:
+    """Feeds are not checked again before their interval, and are then asked for with their
+    ETag, which the server answers with 304 Not Modified."""
+    frontier.discover(now=NOW)
+    requests = len(feeds.requests)
+    assert frontier.discover(now=NOW + 60) == 0
+    assert len(feeds.requests) == requests
+
+    assert frontier.discover(now=NOW + 3600) == 0
+    later = feeds.requests[requests:]
+    assert len(later) == 5  # robots.txt, the sitemap index and its sitemap, RSS and Atom
+    assert all(etag is not None for _, etag in later)
+
+
+def test_changed_lastmod_requeues_a_fetched_article(feeds, frontier) -> None:
+    """An article that was fetched is due again, as a refetch, once a sitemap lists it with a
+    later lastmod, and not before."""
+    frontier.discover(now=NOW)
+    frontier.mark_fetched([entry.url for entry in frontier.due(now=NOW)], now=NOW)
+    assert frontier.due(now=NOW + 3600) == []
+
+    frontier.discover(now=NOW + 3600)  # unchanged: 304, nothing is due
+    assert frontier.due(now=NOW + 3600) == []
+
+    feeds.write('news.xml', NEWS_SITEMAP.replace('{lastmod}', '2021-07-01'))
+    frontier.discover(now=NOW + 7200)
+    due = frontier.due(now=NOW + 7200)
+    assert [(entry.url, entry.refetch) for entry in due] == [(feeds.url('a1.html'), True)]
+
+
+def test_mark_failed_backs_off_exponentially(tmp_path) -> None:
+    """A URL that failed is due again after retry_delay, then twice as long, and so on, and is
+    given up on after max_attempts failures in a row."""
+    frontier = Frontier(str(tmp_path / 'frontier.db'), max_attempts=3, retry_delay=100)
+    url = 'http://example.com/a.html'
+    frontier.add([url], now=0.0)
+
+    now = 0.0
+    for delay in (100, 200):
+        frontier.mark_failed([url], now=now)
+        assert frontier.due(now=now + delay - 1) == []
+        assert [entry.url for entry in frontier.due(now=now + delay)] == [url]
+        now += delay
+
+    frontier.mark_failed([url], now=now)
+    assert frontier.due(now=now + 10 ** 6) == []
+    assert frontier.counts() == {'failed': 1}
+    frontier.close()
+
+
+def test_crawl_frontier_records_fetched_and_failed_urls(feeds, frontier, tmp_path) -> None:
+    """crawl_frontier crawls every due article, marks it fetched, and backs off the URL that
+    could not be fetched."""
+    frontier.discover()
+    articles = crawl_frontier(frontier, min_host_interval=0.0)
+
+    assert set(articles) == {feeds.url(f'a{number}.html') for number in range(1, 4)}
+    assert frontier.counts() == {'fetched': 3, 'pending': 1}
+    assert frontier.due() == []  # missing.html is waiting for its retry
+    assert frontier.due(now=time.time() + frontier.retry_delay + 1)[0].url \
+        == feeds.url('missing.html')
+
+    links = str(tmp_path / 'links.txt')
+    assert frontier.write_links(links) == 3
+    with open(links, encoding='UTF8') as file:
+        assert set(file.read().split()) == set(articles)
@@ -0,0 +1,76 @@
+"""
+Tests of service.py over HTTP: requests that cannot be answered get a 400 response with an
+error message instead of a 500.
+
+
+Copyright and Usage Information
+===============================
+Code by Anna Myllyniemi, December 2021
+"""
+import asyncio
+import json
+import os
+from typing import Iterator
+
+import pytest
+
+from service import AnalysisService, serve
+
+from conftest import CODE_DIRECTORY
+
+ANALYZED = os.path.join(CODE_DIRECTORY, 'data', 'analyzed_articles.csv')
+
+
+@pytest.fixture(scope='module')
+def service() -> Iterator[AnalysisService]:
+    """Yield a service over data/analyzed_articles.csv."""
+    if not os.path.isfile(ANALYZED):
+        pytest.skip('data/analyzed_articles.csv has not been built')
+    service = AnalysisService(ANALYZED)
+    yield service
+    service.close()
+
+
+def request(service: AnalysisService, method: str, target: str,
+            body: bytes = b'') -> tuple[int, object]:
+    """Send a request to service over HTTP, and return the status and decoded JSON body of the
+    response."""
+    async def send() -> bytes:
+        server = await serve(service, port=0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(f'{method} {target} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n'
+                     .encode('latin-1') + body)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return response
+
+    head, _, content = asyncio.run(send()).partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(content)
+
+
+def test_series(service) -> None:
+    """A valid query is answered with the weekly polarity of the matching articles."""
+    status, buckets = request(service, 'GET', '/series?keyword=vaccine')
+    assert status == 200
+    assert buckets and {'date_publish', 'mean'} <= set(buckets[0])
+
+
+@pytest.mark.parametrize('method, target, body', [
+    ('GET', '/series?keyword=(', b''),
+    ('GET', '/figure?keyword=%5Ba', b''),
+    ('GET', '/series?keyword=vaccine%5C%20', b''),  # only invalid without its spaces
+    ('GET', '/series?start=2021-13-01', b''),
+    ('GET', '/series?frequency=hourly', b''),
+    ('POST', '/score', b'[1, 2]'),
+    ('POST', '/score', b'{"text": '),
+    ('POST', '/urls', b'"https://example.com"'),
+])
+def test_bad_requests_get_400(service, method, target, body) -> None:
+    """Invalid keywords, dates, parameters and JSON bodies are answered with 400."""
+    status, content = request(service, method, target, body)
+    assert status == 400
+    assert content['error'] != ''
@@ -0,0 +1,166 @@
+"""
+Differential tests of text_cleaner.py against clean_maintext and fix_unicode as they were
+originally written in create_dataset.py, with one str.replace per boilerplate string and per
+character, on data/dataset.csv with boilerplate injected and on texts where a removal joins
+the text around it into another boilerplate string.
+
+
+Copyright and Usage Information
+===============================
+Code by Anna Myllyniemi, December 2021
+"""
+import copy
+import os
+import random
+
+import pytest
+
+from article_classes import Article
+from create_dataset import clean_maintext
+from csv_read_write import read_file
+from text_cleaner import CHAINED_MAX_STRINGS, DEFAULT_BOILERPLATE, TextCleaner, fix_unicode
+
+from conftest import CODE_DIRECTORY
+
+DATASET = os.path.join(CODE_DIRECTORY, 'data', 'dataset.csv')
+
+# the list of strings the original clean_maintext removed, in its order
+ORIGINAL_BOILERPLATE = [
+    'This advertisement has not loaded yet, but your article continues below.',
+    'Share this Story:',
+    'Advertisement Story continues below',
+    'This advertisement has not loaded yet, '
+    'but your article continues below.',
+    'We apologize, but this video has failed to load.',
+    'Try refreshing your browser.',
+    'Share this article in your social network',
+    'Latest National Stories',
+    'News Near Portage',
+    'The news seems to be flying at us faster all the time. From COVID-19 updates to '
+    'politics and crime and everything in between, it can be hard to keep up. With that '
+    'in mind, the Regina Leader-Post has created an Afternoon Headlines newsletter that '
+    'can be delivered daily to your inbox to help make sure you are up to date with the '
+    'most vital news of the day. Click here to subscribe.',
+    'tap here to see other videos from our team.',
+    'Back to video',
+    'Try refreshing your browser, or',
+]
+
+# more strings than CHAINED_MAX_STRINGS, so the cleaner scans with its compiled pattern
+PUBLICATION_BOILERPLATE = ORIGINAL_BOILERPLATE + [
+    f'Subscribe to the {name} newsletter for section {section}'
+    for name in ('Leader-Post', 'StarPhoenix') for section in range(10)
+]
+
+# the ad string, with another string inserted in it: once that one is removed, only the
+# repeated ad string in ORIGINAL_BOILERPLATE removes the joined text
+JOINED_AD = 'x This advertisement has not loaded yet, Share this Story:but your article ' \
+            'continues below. y'
+
+
+def original_fix_unicode(text: str) -> str:
+    """fix_unicode as it was originally written."""
+    clean = text.replace('’', '\'')
+    clean = clean.replace('\n\n', '\n')
+    clean = clean.replace('“', '\"')
+    clean = clean.replace('”', '\"')
+    clean = clean.replace('—', '-')
+    clean = clean.replace('–', '-')
+    clean = clean.replace('é', 'e')
+    clean = clean.replace('‘', '\'')
+    return clean
+
+
+def original_clean_maintext(article: Article, remove: list[str]) -> str:
+    """clean_maintext as it was originally written, removing the strings in remove."""
+    if 'Article content' in article.main_text:
+        split_text = article.main_text.split('Article content')
+        if 'Photo by' in split_text[0] or 'Postmedia' in split_text[0]:
+            split_text.pop(0)
+        if 'Share this article in your social network' in split_text[-1]:
+            split_text[-1] = split_text[-1][0: split_text[-1].find
+                                            ('Share this article in your social network')]
+        clean = ''.join(split_text)
+    else:
+        clean = article.main_text
+
+    clean = clean.replace(article.title, '')
+    if article.description is not None:
+        clean = clean.replace(article.description, '')
+    for r in remove:
+        clean = clean.replace(r, '')
+
+    clean = original_fix_unicode(clean)
+    return ' '.join(clean.split())
+
+
+def chained_replace(text: str, remove: list[str]) -> str:
+    """Return text with each string in remove replaced by '', in order."""
+    for string in remove:
+        text = text.replace(string, '')
+    return text
+
+
+def scraped_articles() -> list[Article]:
+    """Return the articles of data/dataset.csv made to look freshly scraped again: with curly
+    quotes and dashes, their title and description, and boilerplate between their sentences,
+    including the ad string with another string inserted in it."""
+    if not os.path.isfile(DATASET):
+        pytest.skip('data/dataset.csv has not been built')
+    dataset = read_file(DATASET)
+    articles = []
+    for seed, key in enumerate(sorted(dataset.get_keys())):
+        article = copy.copy(dataset.get_article(key))
+        sentences = article.main_text.replace('\'', '’').replace(' - ', ' — ').split('. ')
+        for i in range(seed % 3, len(sentences), 4):
+            sentences[i] += ' ' + PUBLICATION_BOILERPLATE[(seed + i) % len(PUBLICATION_BOILERPLATE)]
+        sentences[-1] += ' ' + JOINED_AD
+        article.main_text = ('Photo by Postmedia Article content' + article.title + '\n\n'
+                             + article.description + '\n\n' + '. '.join(sentences))
+        articles.append(article)
+    return articles
+
+
+def test_default_boilerplate_is_the_original_list() -> None:
+    """The default strings are the original ones, in order, with the repeated one."""
+    assert DEFAULT_BOILERPLATE == ORIGINAL_BOILERPLATE
+    assert len(PUBLICATION_BOILERPLATE) > CHAINED_MAX_STRINGS
+
+
+@pytest.mark.parametrize('boilerplate', [ORIGINAL_BOILERPLATE, PUBLICATION_BOILERPLATE])
+def test_removal_joining_a_string_matches_the_original(boilerplate) -> None:
+    """A string joined by a later removal is removed by the repeated string, as before."""
+    cleaned = TextCleaner(boilerplate).clean(JOINED_AD)
+    assert cleaned == ' '.join(chained_replace(JOINED_AD, boilerplate).split()) == 'x y'
+
+
+@pytest.mark.parametrize('boilerplate', [ORIGINAL_BOILERPLATE, PUBLICATION_BOILERPLATE])
+def test_dataset_is_cleaned_as_originally(boilerplate) -> None:
+    """Every article of the dataset, with boilerplate injected, is cleaned exactly as the
+    original clean_maintext cleaned it."""
+    cleaner = TextCleaner(boilerplate)
+    for article in scraped_articles():
+        assert clean_maintext(article, cleaner) == original_clean_maintext(article, boilerplate)
+        assert fix_unicode(article.title) == original_fix_unicode(article.title)
+
+
+@pytest.mark.parametrize('boilerplate, pieces', [
+    (PUBLICATION_BOILERPLATE, PUBLICATION_BOILERPLATE),
+    (['XA', 'AB', 'A', 'XAB', 'B', 'BA'] + [f'filler {i}' for i in range(CHAINED_MAX_STRINGS)],
+     ['XA', 'AB', 'A', 'XAB', 'B', 'BA']),
+])
+def test_overlapping_and_joined_strings_match_chained_replace(boilerplate, pieces) -> None:
+    """Random texts of the strings in pieces and parts of them, where strings overlap and
+    removals join the text around them into other strings, are cleaned of boilerplate as by
+    the chained str.replace calls."""
+    rng = random.Random(0)
+    cleaner = TextCleaner(boilerplate)
+    for _ in range(5000):
+        parts = []
+        for _ in range(rng.randint(1, 8)):
+            string = rng.choice(pieces)
+            cut = rng.randint(0, len(string))
+            parts.append(rng.choice([string, string, string[:cut], string[cut:],
+                                     rng.choice(['your browser', 'Try ', ' ', '.', 'x'])]))
+        text = ''.join(parts)
+        assert cleaner.remove_boilerplate(text) == chained_replace(text, boilerplate), text
@@ -0,0 +1,54 @@
+"""
+Tests of vader_numpy.py against NLTK's VADER, on batches too short for the kernel's look-back
+over the three tokens before each word.
+
+
+Copyright and Usage Information
+===============================
+Code by Raghav Arora, December 2021
+"""
+import pytest
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+from analyze_sentiment import SentimentEngine
+from sentence_cache import SentenceCache
+from vader_numpy import TOLERANCE, VaderKernel
+
+SHORT_BATCHES = [
+    ['Good!'],
+    ['Thanks everyone'],
+    ['Great news!'],
+    ['Not very good'],
+    ['Good!', 'Bad.'],
+    ['Wow', 'Terrible', 'Kind of nice'],
+]
+
+
+@pytest.fixture(scope='module')
+def analyzer() -> SentimentIntensityAnalyzer:
+    """Return NLTK's VADER analyzer."""
+    return SentimentIntensityAnalyzer()
+
+
+@pytest.mark.parametrize('sentences', SHORT_BATCHES)
+def test_short_batches_match_vader(analyzer, sentences) -> None:
+    """Batches of 1, 2 and 3 tokens are scored like NLTK's polarity_scores."""
+    expected = [analyzer.polarity_scores(sentence)['compound'] for sentence in sentences]
+    assert VaderKernel(analyzer).score(sentences) == pytest.approx(expected, abs=TOLERANCE)
+
+
+def test_only_uncached_sentence_is_short(analyzer, tmp_path) -> None:
+    """An engine whose cache holds every sentence but a short one scores the short one alone,
+    as on a re-run with a persistent store."""
+    text = 'The vaccine rollout was a disaster. Great news!'
+    store = str(tmp_path / 'sentences.sqlite')
+    engine = SentimentEngine(SentenceCache(store_path=store), kernel='numpy')
+    engine.score_sentence('The vaccine rollout was a disaster.')
+    engine.cache.close()
+
+    engine = SentimentEngine(SentenceCache(store_path=store), kernel='numpy')
+    aggregate = engine.score_batch({'text': text})['text']
+    expected = [analyzer.polarity_scores(sentence)['compound']
+                for sentence in ('The vaccine rollout was a disaster.', 'Great news!')]
+    assert aggregate.mean == pytest.approx(sum(expected) / 2, abs=TOLERANCE)
+    assert engine.cache.stats.store_hits == 1 and engine.cache.stats.misses == 1
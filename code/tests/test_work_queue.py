@@ -0,0 +1,145 @@
+"""
+Tests of work_queue.py: leases, retries and idempotent submission on a queue file, and local
+worker processes scoring part of data/dataset.csv.
+
+
+Copyright and Usage Information
+===============================
+Code by Anna Myllyniemi, December 2021
+"""
+import datetime
+import os
+import time
+
+import pytest
+
+from article_classes import Article, Articles
+from csv_read_write import read_file, write_file
+from work_queue import JobQueue, merge_stage, run_worker, run_workers, submit_stage
+
+from conftest import CODE_DIRECTORY
+
+DATASET = os.path.join(CODE_DIRECTORY, 'data', 'dataset.csv')
+
+
+def make_article(number: int) -> Article:
+    """Return a small article numbered number."""
+    return Article(f'Article {number}', datetime.datetime(2021, 1, number), ['Jane Doe'],
+                   'People were happy about the vaccine. The lockdown was terrible.',
+                   'example.com', f'http://example.com/{number}.html', 'An article')
+
+
+@pytest.fixture
+def queue_path(tmp_path) -> str:
+    """Return the path of a new queue file."""
+    return str(tmp_path / 'queue.db')
+
+
+@pytest.fixture
+def dataset_path(tmp_path) -> str:
+    """Write the first 12 articles of data/dataset.csv to a CSV file, and return its path."""
+    if not os.path.isfile(DATASET):
+        pytest.skip('data/dataset.csv has not been built')
+    articles = read_file(DATASET)
+    subset = Articles()
+    for key in sorted(articles.get_keys())[:12]:
+        subset.add_article(articles.get_article(key))
+    path = str(tmp_path / 'dataset.csv')
+    write_file(subset, path)
+    return path
+
+
+def test_expired_lease_is_taken_over(queue_path) -> None:
+    """A job whose lease has expired is leased to another worker, and the late result of the
+    first worker is not recorded."""
+    queue = JobQueue(queue_path)
+    queue.submit('score', [make_article(1)])
+    first = queue.lease('worker 1', lease_seconds=0.2)
+    assert queue.lease('worker 2') is None  # the lease has not expired yet
+    time.sleep(0.25)
+
+    second = queue.lease('worker 2')
+    assert second.id == first.id and second.attempts == 2
+    assert not queue.complete(first, first.articles)
+    assert queue.complete(second, second.articles)
+    assert queue.counts() == {'done': 1}
+    queue.close()
+
+
+def test_lease_expiring_on_last_attempt_gives_up(queue_path) -> None:
+    """A job whose lease expires after its last attempt is failed rather than leased again."""
+    queue = JobQueue(queue_path, max_attempts=1)
+    queue.submit('score', [make_article(1)])
+    queue.lease('worker 1', lease_seconds=0.0)
+    time.sleep(0.01)
+
+    assert queue.lease('worker 2') is None
+    assert queue.errors() == [(1, 'lease expired')]
+    queue.close()
+
+
+def test_fail_requeues_until_max_attempts_then_retry_failed(queue_path) -> None:
+    """A failed job is queued again until it has been tried max_attempts times, and
+    retry_failed queues it again with its attempts reset."""
+    queue = JobQueue(queue_path, max_attempts=2)
+    queue.submit('score', [make_article(1)])
+
+    queue.fail(queue.lease('worker'), 'first error')
+    assert queue.counts() == {'queued': 1}
+    queue.fail(queue.lease('worker'), 'second error')
+    assert queue.counts() == {'failed': 1}
+    assert queue.lease('worker') is None
+    assert queue.errors('score') == [(1, 'second error')]
+
+    assert queue.retry_failed('clean') == 0
+    assert queue.retry_failed('score') == 1
+    job = queue.lease('worker')
+    assert job.attempts == 1
+    assert queue.complete(job, job.articles)
+    queue.close()
+
+
+def test_submit_is_idempotent(queue_path) -> None:
+    """Submitting the same articles again adds no jobs; new articles only add their chunks."""
+    queue = JobQueue(queue_path)
+    articles = [make_article(number) for number in range(1, 6)]
+    assert queue.submit('score', articles, chunk_size=2) == 3
+    assert queue.submit('score', articles, chunk_size=2) == 0
+    assert queue.submit('clean', articles, chunk_size=2) == 3
+    assert queue.submit('score', articles + [make_article(6)], chunk_size=2) == 1
+    queue.close()
+
+
+def test_merge_requires_every_job_done(queue_path, dataset_path, tmp_path) -> None:
+    """merge_stage refuses to write a stage that has jobs left."""
+    submit_stage(queue_path, 'score', dataset_path, chunk_size=4)
+    with pytest.raises(ValueError):
+        merge_stage(queue_path, 'score', str(tmp_path / 'scored.csv'))
+
+
+def test_worker_processes_match_a_single_worker(dataset_path, tmp_path) -> None:
+    """Two worker processes score the jobs of a queue exactly like one worker in this process,
+    and merging or submitting again changes nothing."""
+    parallel_queue = str(tmp_path / 'parallel.db')
+    serial_queue = str(tmp_path / 'serial.db')
+    for path in (parallel_queue, serial_queue):
+        assert submit_stage(path, 'score', dataset_path, chunk_size=4) == 3
+
+    assert run_workers(parallel_queue, 2, poll_interval=0.05) == 3
+    assert run_worker(serial_queue, poll_interval=0.05) == 3
+
+    outputs = [str(tmp_path / name) for name in ('parallel.csv', 'serial.csv', 'again.csv')]
+    assert merge_stage(parallel_queue, 'score', outputs[0]) == 12
+    merge_stage(serial_queue, 'score', outputs[1])
+    assert submit_stage(parallel_queue, 'score', dataset_path, chunk_size=4) == 0
+    merge_stage(parallel_queue, 'score', outputs[2])
+
+    contents = []
+    for path in outputs:
+        with open(path, encoding='UTF8') as file:
+            contents.append(file.read())
+    assert contents[0] == contents[1] == contents[2]
+
+    scored = read_file(outputs[0])
+    assert any(scored.get_article(key).average_sentence_polarity != 0.0
+               for key in scored.get_keys())
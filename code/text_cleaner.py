@@ -0,0 +1,253 @@
+"""
+A compiled text cleaning pipeline for the scraped articles. When a TextCleaner is created with
+more than CHAINED_MAX_STRINGS boilerplate strings, they are compiled into a single regular
+expression shaped like a trie (strings that share a prefix share a branch), which finds the
+boilerplate strings in a text in one scan no matter how many strings there are. Only the
+strings found are then removed with str.replace, instead of one str.replace scan per string.
+A str.replace that finds nothing is a fast search that makes no copy, so up to
+CHAINED_MAX_STRINGS strings (such as DEFAULT_BOILERPLATE) are faster to remove with one
+str.replace each, in order, than with a scan of the regular expression.
+
+The output is the same as applying each str.replace in list order. That scan cannot tell how
+strings that overlap or touch in a text (e.g. 'XA' and 'AB' in 'XAB') are removed, or whether
+removing a string joins the text around it into another one (removing 'Q' from 'aQb' leaves
+'ab'). A join needs the characters on either side of a removed string to be next to each other
+in some boilerplate string, so texts where that happens, or where strings overlap or touch,
+are cleaned with every str.replace in order instead. These are rare in scraped articles.
+
+Publications can have their own boilerplate: a text file with one string per line, named after
+the publication's source domain (e.g. data/boilerplate/leaderpost.com.txt), adds its strings to
+the common ones for articles from that domain.
+
+
+Copyright and Usage Information
+===============================
+Code by Anna Myllyniemi, December 2021
+"""
+import os
+import re
+from typing import Optional
+
+# common strings to remove from maintext that are not part of the article body. The order
+# matters, and so does the repeated string: removing a string can join the text around it into
+# one removed earlier.
+DEFAULT_BOILERPLATE = [
+    'This advertisement has not loaded yet, but your article continues below.',
+    'Share this Story:',
+    'Advertisement Story continues below',
+    'This advertisement has not loaded yet, '
+    'but your article continues below.',
+    'We apologize, but this video has failed to load.',
+    'Try refreshing your browser.',
+    'Share this article in your social network',
+    'Latest National Stories',
+    'News Near Portage',
+    'The news seems to be flying at us faster all the time. From COVID-19 updates to '
+    'politics and crime and everything in between, it can be hard to keep up. With that '
+    'in mind, the Regina Leader-Post has created an Afternoon Headlines newsletter that '
+    'can be delivered daily to your inbox to help make sure you are up to date with the '
+    'most vital news of the day. Click here to subscribe.',
+    'tap here to see other videos from our team.',
+    'Back to video',
+    'Try refreshing your browser, or',
+]
+
+# cleaners of at most this many strings remove them with one str.replace each, which is faster
+# than a scan of the compiled regular expression up to about this many strings
+CHAINED_MAX_STRINGS = 20
+
+# characters replaced by fix_unicode, and what they are replaced with
+CHARACTER_FIXES = {
+    '’': '\'',  # replace apostrophes with single quotation
+    '“': '\"',  # replace double quotes with escaped double quotes
+    '”': '\"',
+    '—': '-',
+    '–': '-',
+    'é': 'e',
+    '‘': '\'',
+}
+
+
+def fix_unicode(text: str) -> str:
+    """Replace typographic characters with plain ones and pairs of newlines with a single
+    newline.
+
+    Only the characters that occur in text are replaced. str.replace makes no copy when there
+    is nothing to replace, so this is as fast as a single pass (and several times faster than
+    a regular expression calling back into Python for each match).
+
+    >>> fix_unicode('“Don’t” — it’s\\n\\nfine')
+    '"Don\\'t" - it\\'s\\nfine'
+    """
+    clean = text.replace('\n\n', '\n')  # replace two newlines with one newline
+    return _fix_characters(clean)
+
+
+def _fix_characters(text: str) -> str:
+    """Apply CHARACTER_FIXES to text."""
+    for char, replacement in CHARACTER_FIXES.items():
+        if char in text:
+            text = text.replace(char, replacement)
+    return text
+
+
+class TextCleaner:
+    """Removes a fixed list of boilerplate strings from a text and fixes its characters.
+
+    Private Instance Attributes:
+       - _strings: the boilerplate strings, in the order they are removed
+       - _pattern: matches the longest boilerplate string starting at a position, or None if
+         there are at most CHAINED_MAX_STRINGS strings, which are removed one by one instead
+       - _prefix_indices: for each boilerplate string, the indices in _strings of the strings
+         it starts with (including itself)
+       - _bigrams: every pair of adjacent characters in a boilerplate string
+    """
+    _strings: list[str]
+    _pattern: Optional[re.Pattern]
+    _prefix_indices: dict[str, list[int]]
+    _bigrams: set[str]
+
+    def __init__(self, boilerplate: list[str]) -> None:
+        """Compile a cleaner that removes every string in boilerplate."""
+        self._strings = [string for string in boilerplate if string != '']
+        self._prefix_indices = {string: [i for i, prefix in enumerate(self._strings)
+                                         if string.startswith(prefix)]
+                                for string in self._strings}
+        self._bigrams = {string[i:i + 2] for string in self._strings
+                         for i in range(len(string) - 1)}
+        self._pattern = re.compile(_trie_pattern(list(self._prefix_indices))) \
+            if len(self._strings) > CHAINED_MAX_STRINGS else None
+
+    def remove_boilerplate(self, text: str) -> str:
+        """Return text without any of the boilerplate strings, as text.replace(string, '')
+        for each string in order would."""
+        if self._pattern is None:
+            for string in self._strings:
+                text = text.replace(string, '')
+            return text
+
+        found = set()
+        match = self._pattern.search(text)
+        while match is not None:
+            start, end = match.span()
+            following = self._pattern.search(text, start + 1)
+            indices = self._prefix_indices[match.group()]
+            if (following is not None and following.start() <= end) \
+                    or self._may_join(text, start, indices):
+                found = range(len(self._strings))
+                break
+            found.update(indices)
+            match = following
+
+        for i in sorted(found):
+            text = text.replace(self._strings[i], '')
+        return text
+
+    def _may_join(self, text: str, start: int, indices: list[int]) -> bool:
+        """Return whether removing one of the strings at indices, which are in text at start,
+        could join the characters around it into part of a boilerplate string."""
+        if start == 0:
+            return False
+        for i in indices:
+            end = start + len(self._strings[i])
+            if end < len(text) and text[start - 1] + text[end] in self._bigrams:
+                return True
+        return False
+
+    def clean(self, text: str) -> str:
+        """Return text without its boilerplate, with its characters fixed and every run of
+        whitespace replaced by a single space."""
+        clean = _fix_characters(self.remove_boilerplate(text))
+        return ' '.join(clean.split())  # replace multiple whitespaces with a single whitespace
+
+
+def _trie_pattern(strings: list[str]) -> str:
+    """Return a regular expression matching any of strings, with their common prefixes
+    factored out so the regular expression engine only follows one branch per character.
+    Where one string is a prefix of another, the longer one is matched.
+
+    >>> _trie_pattern(['Share this Story:', 'Share this article'])
+    'Share\\\\ this\\\\ (?:Story:|article)'
+
+    Preconditions:
+        - strings != []
+        - '' not in strings
+    """
+    trie = {}
+    for string in strings:
+        node = trie
+        for char in string:
+            node = node.setdefault(char, {})
+        node[''] = {}  # marks the end of a string
+
+    return _node_pattern(trie)
+
+
+def _node_pattern(node: dict) -> str:
+    """Return the regular expression matching the strings below node of a trie."""
+    branches = [re.escape(char) + _node_pattern(child)
+                for char, child in sorted(node.items()) if char != '']
+    if not branches:
+        return ''
+    elif len(branches) == 1 and '' not in node:
+        return branches[0]
+
+    pattern = '(?:' + '|'.join(branches) + ')'
+    return pattern + '?' if '' in node else pattern
+
+
+DEFAULT_CLEANER = TextCleaner(DEFAULT_BOILERPLATE)
+
+
+def load_boilerplate(file_path: str) -> list[str]:
+    """Return the boilerplate strings in the file at file_path, one per non-empty line.
+
+    Preconditions:
+        - file_path != ''
+    """
+    with open(file_path, mode='r', encoding='UTF8') as file:
+        return [line.rstrip('\n') for line in file if line.strip() != '']
+
+
+def load_publication_cleaners(directory: str) -> dict[str, TextCleaner]:
+    """Return a mapping of source domain to the TextCleaner for that publication, built from
+    the boilerplate files in directory. Each cleaner removes the publication's strings on
+    top of DEFAULT_BOILERPLATE.
+
+    Preconditions:
+        - os.path.isdir(directory)
+    """
+    cleaners = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.txt'):
+            domain = name[:-len('.txt')]
+            strings = load_boilerplate(os.path.join(directory, name))
+            cleaners[domain] = TextCleaner(DEFAULT_BOILERPLATE + strings)
+
+    return cleaners
+
+
+def cleaner_for(source_domain: Optional[str],
+                cleaners: Optional[dict[str, TextCleaner]] = None) -> TextCleaner:
+    """Return the cleaner for articles from source_domain, falling back to DEFAULT_CLEANER."""
+    if cleaners is None or source_domain is None:
+        return DEFAULT_CLEANER
+    return cleaners.get(source_domain, DEFAULT_CLEANER)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'allowed-io': ['load_boilerplate'],
+        'extra-imports': ['python_ta.contracts', 'os', 're', 'typing', 'doctest'],
+        'max-line-length': 100,
+        'max-nested-blocks': 4,
+        'disable': ['R1705', 'C0200']
+    })
@@ -0,0 +1,268 @@
+"""
+Tagging articles with the themes they discuss, the places they mention and the publication
+they come from, once, when the dataset is built, instead of searching every article's text for
+a keyword each time a graph is drawn.
+
+Each Label names a theme (vaccine mandates, lockdowns, border closures, ...), a location or a
+publication. Themes and locations are found by their keywords in the title, description and
+maintext of an article; publications by the article's source domain. A ThemeTagger finds every
+label of an article in a single scan of its text, and the labels are saved with the article as
+its themes attribute, joined by SEPARATOR (a column of the CSV files), so a dataset says which
+labels it was tagged with.
+
+When the articles are loaded for graphing, theme_masks turns the themes column into one 64-bit
+mask per article, computed once per distinct combination of labels rather than per article.
+Combining themes is then a bitwise operation over an array (see match_masks): articles with
+all of some labels, any of others, or both.
+
+
+Copyright and Usage Information
+===============================
+Code by Aarya Vatsa and Diva Hidalgo Luna, December 2021
+"""
+import re
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import numpy as np
+
+from article_classes import Article, Articles
+
+SEPARATOR = '|'
+MAX_LABELS = 64
+LABEL_KINDS = ('theme', 'location', 'publication')
+
+
+@dataclass(frozen=True)
+class Label:
+    """A label articles can be tagged with.
+
+    Instance Attributes:
+       - name: the name of the label, as saved in the themes of a tagged article
+       - kind: what the label is, one of LABEL_KINDS
+       - keywords: an article whose text contains one of these has the label
+       - case_sensitive: whether keywords must match with the same case (as for place names)
+       - domains: an article from one of these source domains (or their subdomains) has the
+         label
+
+    Representation Invariants:
+        - self.name != '' and SEPARATOR not in self.name
+        - self.kind in LABEL_KINDS
+        - all(keyword != '' for keyword in self.keywords)
+    """
+    name: str
+    kind: str
+    keywords: tuple[str, ...] = ()
+    case_sensitive: bool = False
+    domains: tuple[str, ...] = ()
+
+
+def _place(name: str, *spellings: str) -> Label:
+    """Return the location label of the place called name, also matched by spellings."""
+    return Label(name, 'location', (name,) + spellings, case_sensitive=True)
+
+
+def _publication(name: str, *domains: str) -> Label:
+    """Return the publication label of the publication called name, published on domains."""
+    return Label(name, 'publication', domains=domains)
+
+
+DEFAULT_LABELS = [
+    Label('vaccine mandates', 'theme', ('vaccine mandate', 'vaccination mandate',
+                                        'mandatory vaccination', 'vaccine passport',
+                                        'proof of vaccination')),
+    Label('vaccines', 'theme', ('vaccine', 'vaccinat')),
+    Label('lockdowns', 'theme', ('lockdown', 'stay-at-home', 'stay at home order')),
+    Label('quarantine', 'theme', ('quarantine', 'self-isolat')),
+    Label('border closures', 'theme', ('border', 'travel ban', 'travel restriction')),
+    Label('masks', 'theme', ('mask mandate', 'mask bylaw', 'face mask', 'masks')),
+    Label('schools', 'theme', ('school closure', 'school reopening', 'remote learning')),
+    _place('Toronto'), _place('Ottawa'), _place('Montreal', 'Montréal'), _place('Vancouver'),
+    _place('Calgary'), _place('Edmonton'), _place('Regina'), _place('Saskatoon'),
+    _place('Winnipeg'), _place('Halifax'), _place('Ontario'), _place('Quebec', 'Québec'),
+    _place('Alberta'), _place('British Columbia'), _place('Saskatchewan'), _place('Manitoba'),
+    _publication('National Post', 'nationalpost.com'),
+    _publication('Financial Post', 'financialpost.com'),
+    _publication('Toronto Sun', 'torontosun.com'),
+    _publication('Toronto Star', 'thestar.com'),
+    _publication('The Globe and Mail', 'theglobeandmail.com'),
+    _publication('Leader-Post', 'leaderpost.com'),
+    _publication('StarPhoenix', 'thestarphoenix.com'),
+    _publication('Calgary Herald', 'calgaryherald.com'),
+    _publication('Edmonton Journal', 'edmontonjournal.com'),
+    _publication('Montreal Gazette', 'montrealgazette.com'),
+    _publication('Vancouver Sun', 'vancouversun.com'),
+]
+
+
+class ThemeTagger:
+    """Finds the labels of articles, scanning the text of each article once for the keywords
+    that are case sensitive, and once (case folded) for those that are not.
+
+    Instance Attributes:
+       - labels: the labels articles are tagged with, in the order they are saved in
+
+    Private Instance Attributes:
+       - _patterns: for case sensitive (True) and case folded (False) keywords, a pattern
+         matching, at each position of a text, the longest keyword starting there, or None if
+         there are no such keywords
+       - _keyword_labels: the indices of the labels found by each match so far, by whether it
+         was case sensitive and the text matched
+       - _domain_labels: the indices of the labels of each source domain seen so far
+
+    Representation Invariants:
+        - len({label.name for label in self.labels}) == len(self.labels)
+    """
+    labels: list[Label]
+    _patterns: dict[bool, Optional[re.Pattern]]
+    _keyword_labels: dict[tuple[bool, str], tuple[int, ...]]
+    _domain_labels: dict[str, tuple[int, ...]]
+
+    def __init__(self, labels: Optional[list[Label]] = None) -> None:
+        """Initialise a tagger for labels, or for DEFAULT_LABELS if labels is None."""
+        self.labels = list(DEFAULT_LABELS if labels is None else labels)
+        self._keyword_labels = {}
+        self._domain_labels = {}
+        self._patterns = {}
+        for case_sensitive in (True, False):
+            keywords = {_fold(keyword, case_sensitive) for label in self.labels
+                        if label.case_sensitive == case_sensitive for keyword in label.keywords}
+            # longest first, so the keyword matched at a position contains any shorter one
+            # starting there; a lookahead matches at every position, so overlapping keywords
+            # are all found
+            alternatives = '|'.join(re.escape(keyword) for keyword in sorted(
+                keywords, key=lambda keyword: (-len(keyword), keyword)))
+            self._patterns[case_sensitive] = re.compile(f'(?=({alternatives}))') \
+                if keywords else None
+
+    def _labels_of_match(self, case_sensitive: bool, matched: str) -> tuple[int, ...]:
+        """Return the indices of the labels with a keyword (that is case_sensitive) occurring
+        in matched, which is the text matched by the longest of those keywords at some
+        position. Any shorter keyword starting at the same position is found this way."""
+        key = (case_sensitive, matched)
+        if key not in self._keyword_labels:
+            self._keyword_labels[key] = tuple(
+                i for i, label in enumerate(self.labels)
+                if label.case_sensitive == case_sensitive
+                and any(_fold(keyword, case_sensitive) in matched for keyword in label.keywords))
+        return self._keyword_labels[key]
+
+    def _labels_of_domain(self, source_domain: str) -> tuple[int, ...]:
+        """Return the indices of the labels of articles from source_domain."""
+        if source_domain not in self._domain_labels:
+            self._domain_labels[source_domain] = tuple(
+                i for i, label in enumerate(self.labels)
+                if any(source_domain == domain or source_domain.endswith('.' + domain)
+                       for domain in label.domains))
+        return self._domain_labels[source_domain]
+
+    def tag_text(self, texts: Iterable[Optional[str]], source_domain: Optional[str]) -> str:
+        """Return the labels of an article with the given texts (title, description and
+        maintext) from source_domain, in the order of labels, joined by SEPARATOR. A text or
+        source domain that is not a string (None, or NaN in a DataFrame) is skipped."""
+        found = set(self._labels_of_domain(source_domain if isinstance(source_domain, str)
+                                           else ''))
+        for text in texts:
+            if not isinstance(text, str):
+                continue
+            for case_sensitive, pattern in self._patterns.items():
+                if pattern is not None:
+                    for match in pattern.finditer(_fold(text, case_sensitive)):
+                        found.update(self._labels_of_match(case_sensitive, match.group(1)))
+
+        return SEPARATOR.join(self.labels[i].name for i in sorted(found))
+
+    def tag(self, article: Article) -> str:
+        """Set the themes of article to its labels, and return them."""
+        article.themes = self.tag_text((article.title, article.description, article.main_text),
+                                       article.source_domain)
+        return article.themes
+
+
+def _fold(text: str, case_sensitive: bool) -> str:
+    """Return text as it is matched against keywords that are case_sensitive or not."""
+    return text if case_sensitive else text.casefold()
+
+
+def tag_dataset(arts: Articles, tagger: Optional[ThemeTagger] = None) -> None:
+    """Tag every article in arts with tagger, or with a ThemeTagger of DEFAULT_LABELS if it is
+    None."""
+    tagger = tagger if tagger is not None else ThemeTagger()
+    for key in arts.get_keys():
+        tagger.tag(arts.get_article(key))
+
+
+def theme_masks(themes: Iterable[object],
+                labels: Optional[list[str]] = None) -> tuple[np.ndarray, list[str]]:
+    """Return the label mask of each article whose themes are in themes, and the labels the
+    bits of the masks stand for: bit i of an article's mask is set if it has the i-th label.
+    A value that is not a string (None or NaN, for an article that was not tagged) has no
+    labels. Each distinct value is only split into labels once.
+
+    If labels is given, the masks use its bits for its labels (so they can be combined with
+    masks computed earlier), and the labels returned are labels followed by any new ones.
+
+    Raises ValueError if the articles have more than MAX_LABELS distinct labels.
+    """
+    codes = {}
+    article_codes = np.fromiter((codes.setdefault(joined if isinstance(joined, str) else '',
+                                                  len(codes)) for joined in themes),
+                                dtype=np.int64)
+    labels = list(labels) if labels is not None else []
+    bits = {name: np.uint64(1) << np.uint64(i) for i, name in enumerate(labels)}
+    code_masks = np.zeros(len(codes), dtype=np.uint64)
+    for joined, code in codes.items():
+        for name in (joined.split(SEPARATOR) if joined != '' else []):
+            if name not in bits:
+                if len(labels) == MAX_LABELS:
+                    raise ValueError(f'Articles have more than {MAX_LABELS} distinct labels')
+                bits[name] = np.uint64(1) << np.uint64(len(labels))
+                labels.append(name)
+            code_masks[code] |= bits[name]
+
+    return code_masks[article_codes], labels
+
+
+def labels_mask(names: Iterable[str], labels: list[str]) -> Optional[np.uint64]:
+    """Return the mask with the bit of each label in names set, where labels are the labels
+    of the bits, or None if one of names is not among them."""
+    mask = np.uint64(0)
+    for name in names:
+        if name not in labels:
+            return None
+        mask |= np.uint64(1) << np.uint64(labels.index(name))
+    return mask
+
+
+def match_masks(masks: np.ndarray, labels: list[str], all_of: Iterable[str] = (),
+                any_of: Iterable[str] = ()) -> np.ndarray:
+    """Return a boolean array with, for each mask in masks (see theme_masks), whether it has
+    every label in all_of and, unless any_of is empty, at least one label in any_of. Labels
+    no article has are never matched."""
+    matched = np.ones(len(masks), dtype=bool)
+    all_of, any_of = list(all_of), list(any_of)
+    if all_of:
+        required = labels_mask(all_of, labels)
+        if required is None:
+            return np.zeros(len(masks), dtype=bool)
+        matched &= (masks & required) == required
+    if any_of:
+        wanted = labels_mask([name for name in any_of if name in labels], labels)
+        matched &= (masks & wanted) != 0
+    return matched
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'allowed-io': [],
+        'extra-imports': ['python_ta.contracts', 're', 'dataclasses', 'typing', 'numpy',
+                          'article_classes'],
+        'max-line-length': 100,
+        'max-nested-blocks': 4,
+        'disable': ['R1705', 'C0200']
+    })
@@ -0,0 +1,384 @@
+"""
+A vectorized implementation of the VADER compound score, as an alternative scoring kernel for
+SentimentEngine (see analyze_sentiment.py).
+
+NLTK's SentimentIntensityAnalyzer.polarity_scores scores one sentence at a time, with Python
+loops over its tokens for the lexicon lookups, boosters, negations, idioms and 'but'. Here each
+distinct token is mapped to an integer id once, and the features VADER looks at (its valence,
+whether it is a booster or a negation, ...) are kept in arrays indexed by id. A whole batch of
+sentences is then scored with NumPy array operations over all of its tokens at once: the three
+look-back steps over the preceding words are each a single pass over every sentiment-laden
+token of the batch.
+
+The rules are those of NLTK's VADER, including its quirks (a repeated token is scored in the
+context of its first occurrence, some checks are case sensitive), and the compound scores are
+rounded to 4 decimals in the same way. The kernel agrees with polarity_scores to within
+TOLERANCE; on the articles in data/ and on randomly generated sentences full of negations,
+boosters and idioms, the scores are identical. check_agreement compares the two
+on any sentences, and benchmarks.py measures the throughput of both.
+
+
+Copyright and Usage Information
+===============================
+Code by Raghav Arora, December 2021
+"""
+import math
+
+import numpy as np
+from nltk.sentiment.vader import SentimentIntensityAnalyzer, VaderConstants
+
+# the largest difference allowed between the compound score of this kernel and of NLTK's VADER;
+# the scores are rounded to 4 decimals, so this allows the last digit to round differently
+TOLERANCE = 1e-4
+
+_SO_THIS = {'so', 'this'}
+_PUNCTUATION_CHARACTERS = set(''.join(VaderConstants.PUNC_LIST))
+
+
+class VaderKernel:
+    """Computes VADER compound scores of batches of sentences with NumPy.
+
+    Private Instance Attributes:
+       - _lexicon: the VADER lexicon, from lower case word to valence
+       - _constants: the VADER constants
+       - _ids: the id of each distinct token seen since the vocabulary was last cleared
+       - _features: for each feature, its value for each token id, in id order
+       - _arrays: the features as NumPy arrays, extended when new tokens are seen
+       - _phrase_words: the number of each token that is part of an idiom or a two word
+         booster; every other token is numbered len(self._phrase_words) + 1
+       - _idioms: the integer code of each idiom (see _phrase_code) and its valence
+       - _booster_bigrams: the codes of the two word boosters, such as 'sort of'
+
+    Representation Invariants:
+        - all(len(values) == len(self._ids) for values in self._features.values())
+        - len(self._ids) <= MAX_VOCABULARY or the tokens were seen in a single batch
+    """
+    _lexicon: dict[str, float]
+    _constants: VaderConstants
+    _ids: dict[str, int]
+    _features: dict[str, list]
+    _arrays: dict[str, np.ndarray]
+    _phrase_words: dict[str, int]
+    _idioms: dict[int, float]
+    _booster_bigrams: np.ndarray
+
+    def __init__(self, analyzer: SentimentIntensityAnalyzer) -> None:
+        """Initialise the kernel with the lexicon and constants of analyzer."""
+        self._lexicon = analyzer.lexicon
+        self._constants = analyzer.constants
+        self._clear_vocabulary()
+
+        # the phrases are matched on the exact tokens, as NLTK does
+        phrases = list(self._constants.SPECIAL_CASE_IDIOMS) + [
+            phrase for phrase in self._constants.BOOSTER_DICT if len(phrase.split()) == 2]
+        self._phrase_words = {}
+        for phrase in phrases:
+            for word in phrase.split():
+                self._phrase_words.setdefault(word, len(self._phrase_words) + 1)
+        self._idioms = {}
+        for phrase, valence in self._constants.SPECIAL_CASE_IDIOMS.items():
+            self._idioms[self._phrase_code(phrase.split())] = float(valence)
+        self._booster_bigrams = np.array([self._phrase_code(phrase.split())
+                                          for phrase in self._constants.BOOSTER_DICT
+                                          if len(phrase.split()) == 2], dtype=np.int64)
+
+    def _clear_vocabulary(self) -> None:
+        """Forget every token seen so far."""
+        self._ids = {}
+        self._features = {name: [] for name in (
+            'in_lexicon', 'valence', 'booster', 'is_booster', 'is_upper', 'negated', 'never',
+            'so_this', 'least', 'at_very', 'kind', 'of', 'but', 'phrase_word')}
+        self._arrays = {name: np.empty(0) for name in self._features}
+
+    def _phrase_word(self, token: str) -> int:
+        """Return the number of token in _phrase_words, or the number shared by the tokens
+        that are not in any phrase."""
+        return self._phrase_words.get(token, len(self._phrase_words) + 1)
+
+    def _token_id(self, token: str) -> int:
+        """Return the id of token, recording its features if it has not been seen before."""
+        token_id = self._ids.get(token)
+        if token_id is None:
+            token_id = len(self._ids)
+            self._ids[token] = token_id
+            lower = token.lower()
+            features = self._features
+            features['in_lexicon'].append(lower in self._lexicon)
+            features['valence'].append(self._lexicon.get(lower, 0.0))
+            features['booster'].append(self._constants.BOOSTER_DICT.get(lower, 0.0))
+            features['is_booster'].append(lower in self._constants.BOOSTER_DICT)
+            features['is_upper'].append(token.isupper())
+            features['negated'].append(lower in self._constants.NEGATE or "n't" in lower)
+            features['never'].append(token == 'never')
+            features['so_this'].append(token in _SO_THIS)
+            features['least'].append(lower == 'least')
+            features['at_very'].append(lower in {'at', 'very'})
+            features['kind'].append(lower == 'kind')
+            features['of'].append(lower == 'of')
+            features['but'].append(lower == 'but')
+            features['phrase_word'].append(self._phrase_word(token))
+        return token_id
+
+    def _phrase_code(self, words: list[str]) -> int:
+        """Return an integer identifying the sequence of (two or three) tokens in words. Two
+        sequences have the same code only if they are the same, or both have a token in the
+        same place that is in no phrase (so neither is a phrase)."""
+        return int(_phrase_codes(len(self._phrase_words) + 2,
+                                 *(np.array([self._phrase_word(word)]) for word in words))[0])
+
+    def _update_arrays(self) -> None:
+        """Extend the feature arrays with the features of the tokens seen since the last call."""
+        known = len(self._arrays['valence'])
+        if known < len(self._ids):
+            for name, values in self._features.items():
+                dtype = {'valence': np.float64, 'booster': np.float64,
+                         'phrase_word': np.int64}.get(name, bool)
+                self._arrays[name] = np.concatenate(
+                    [self._arrays[name].astype(dtype), np.array(values[known:], dtype=dtype)])
+
+    def tokenize(self, sentence: str) -> list[str]:
+        """Return the tokens of sentence as VADER sees them: the words of more than one
+        character, without a leading or trailing punctuation mark."""
+        words = sentence.split()
+        words_only = {word for word in
+                      self._constants.REGEX_REMOVE_PUNCTUATION.sub('', sentence).split()
+                      if len(word) > 1}
+        tokens = []
+        for word in words:
+            if len(word) > 1:
+                tokens.append(_strip_punctuation(word, words_only, self._constants.PUNC_LIST))
+        return tokens
+
+    def score(self, sentences: list[str]) -> list[float]:
+        """Return the compound score of each sentence in sentences, as
+        SentimentIntensityAnalyzer.polarity_scores(sentence)['compound'] would."""
+        if not sentences:
+            return []
+        if len(self._ids) > MAX_VOCABULARY:
+            self._clear_vocabulary()
+
+        ids, sources, starts, lengths = [], [], [], []
+        for sentence in sentences:
+            tokens = self.tokenize(sentence)
+            start = len(ids)
+            first = {}
+            for position, token in enumerate(tokens):
+                ids.append(self._token_id(token))
+                # NLTK scores each token in the context of its first occurrence
+                sources.append(start + first.setdefault(token, position))
+            starts.append(start)
+            lengths.append(len(tokens))
+        self._update_arrays()
+
+        ids = np.array(ids, dtype=np.int64)
+        lengths = np.array(lengths, dtype=np.int64)
+        sentence_of = np.repeat(np.arange(len(sentences)), lengths)
+        position = np.arange(len(ids)) - np.repeat(np.array(starts, dtype=np.int64), lengths)
+        sentence_end = np.repeat(np.array(starts, dtype=np.int64) + lengths, lengths)
+
+        valences = self._valences(ids, position, sentence_end, sentence_of, lengths)
+        sentiments = valences[np.array(sources, dtype=np.int64)]
+        sentiments = self._but_weights(ids, position, sentence_of, len(sentences)) * sentiments
+
+        # bincount adds the sentiments of each sentence in order, like sum() does
+        sums = np.bincount(sentence_of, weights=sentiments, minlength=len(sentences))
+        amplifiers = np.array([_punctuation_emphasis(sentence) for sentence in sentences])
+        sums = np.where(sums > 0, sums + amplifiers, np.where(sums < 0, sums - amplifiers, sums))
+        compound = sums / np.sqrt(sums * sums + 15)
+
+        return [round(value, 4) for value in compound.tolist()]
+
+    def _valences(self, ids: np.ndarray, position: np.ndarray, sentence_end: np.ndarray,
+                  sentence_of: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        """Return the valence of each token, as VADER's sentiment_valence computes it, with 0
+        for the tokens VADER skips."""
+        features = self._arrays
+        constants = self._constants
+        cap_words = np.bincount(sentence_of, weights=features['is_upper'][ids],
+                                minlength=len(lengths))
+        cap_diff = ((lengths - cap_words > 0) & (cap_words > 0))[sentence_of]
+
+        # tokens that follow kind in 'kind of' and boosters are skipped
+        next_is_of = np.zeros(len(ids), dtype=bool)
+        next_is_of[:-1] = features['of'][ids[1:]] & (np.arange(1, len(ids)) < sentence_end[:-1])
+        skipped = features['is_booster'][ids] | (features['kind'][ids] & next_is_of)
+        scored = np.flatnonzero(features['in_lexicon'][ids] & ~skipped)
+
+        i = scored
+        pos = position[i]
+        cap_diff = cap_diff[i]
+        valence = features['valence'][ids[i]]
+        valence = np.where(features['is_upper'][ids[i]] & cap_diff,
+                           np.where(valence > 0, valence + constants.C_INCR,
+                                    valence - constants.C_INCR), valence)
+
+        def word(back: int, name: str) -> np.ndarray:
+            """The feature called name of the token back places before each scored token
+            (False or 0 where there is none)."""
+            values = features[name][ids[np.maximum(i - back, 0)]]
+            return np.where(pos >= back, values, np.zeros_like(values))
+
+        for start_i in range(3):
+            back = start_i + 1
+            applies = (pos > start_i) & ~word(back, 'in_lexicon')
+
+            scalar = word(back, 'booster')
+            scalar = np.where(valence < 0, -scalar, scalar)
+            capped = word(back, 'is_booster') & word(back, 'is_upper') & cap_diff
+            scalar = np.where(capped, np.where(valence > 0, scalar + constants.C_INCR,
+                                               scalar - constants.C_INCR), scalar)
+            if start_i == 1:
+                scalar = scalar * 0.95
+            elif start_i == 2:
+                scalar = scalar * 0.9
+            updated = valence + scalar
+
+            # VADER's _never_check
+            if start_i == 0:
+                updated = np.where(word(1, 'negated'), updated * constants.N_SCALAR, updated)
+            elif start_i == 1:
+                emphasised = word(2, 'never') & word(1, 'so_this')
+                updated = np.where(emphasised, updated * 1.5,
+                                   np.where(word(2, 'negated'), updated * constants.N_SCALAR,
+                                            updated))
+            else:
+                emphasised = (word(3, 'never') & word(2, 'so_this')) | word(1, 'so_this')
+                updated = np.where(emphasised, updated * 1.25,
+                                   np.where(word(3, 'negated'), updated * constants.N_SCALAR,
+                                            updated))
+                updated = self._idioms_check(updated, ids, i, sentence_end[i])
+
+            valence = np.where(applies, updated, valence)
+
+        # VADER's _least_check
+        least = word(1, 'least') & ~word(1, 'in_lexicon')
+        negated = least & ((pos == 1) | ((pos > 1) & ~word(2, 'at_very')))
+        valence = np.where(negated, valence * constants.N_SCALAR, valence)
+
+        valences = np.zeros(len(ids))
+        valences[i] = valence
+        return valences
+
+    def _idioms_check(self, valence: np.ndarray, ids: np.ndarray, i: np.ndarray,
+                      sentence_end: np.ndarray) -> np.ndarray:
+        """Apply VADER's _idioms_check to the valence of the tokens at i. Only the valences of
+        the tokens with at least three tokens before them in their sentence are meaningful; the
+        caller discards the others."""
+        phrase_word = self._arrays['phrase_word']
+        # the current token and the 3 before (clamped to the first token of the batch, like
+        # word in _valences, as a short batch has fewer than 3 tokens before some of i)
+        token = [phrase_word[ids[np.maximum(i - back, 0)]] for back in range(4)]
+
+        def code(*parts: np.ndarray) -> np.ndarray:
+            return _phrase_codes(len(self._phrase_words) + 2, *parts)
+
+        twoone = code(token[2], token[1])
+        threetwo = code(token[3], token[2])
+        # the later sequences in NLTK's list only apply if the earlier ones do not match
+        sequences = [code(token[1], token[0]), code(token[2], token[1], token[0]), twoone,
+                     code(token[3], token[2], token[1]), threetwo]
+        after = [code(token[0], phrase_word[ids[np.minimum(i + 1, len(ids) - 1)]]),
+                 code(token[0], phrase_word[ids[np.minimum(i + 1, len(ids) - 1)]],
+                      phrase_word[ids[np.minimum(i + 2, len(ids) - 1)]])]
+        after_valid = [i + 1 < sentence_end, i + 2 < sentence_end]
+
+        idioms = np.array(list(self._idioms), dtype=np.int64)
+        idiom_valences = np.array(list(self._idioms.values()))
+        for sequence in reversed(sequences):
+            matched = np.isin(sequence, idioms)
+            if matched.any():
+                valence = np.where(matched, _lookup(sequence, idioms, idiom_valences), valence)
+        for sequence, valid in zip(after, after_valid):
+            matched = valid & np.isin(sequence, idioms)
+            if matched.any():
+                valence = np.where(matched, _lookup(sequence, idioms, idiom_valences), valence)
+
+        boosted = np.isin(threetwo, self._booster_bigrams) | np.isin(twoone, self._booster_bigrams)
+        return np.where(boosted, valence + self._constants.B_DECR, valence)
+
+    def _but_weights(self, ids: np.ndarray, position: np.ndarray, sentence_of: np.ndarray,
+                     n: int) -> np.ndarray:
+        """Return the weight of each token from VADER's _but_check: in a sentence with 'but',
+        the tokens before the first 'but' count half and the tokens after it count 1.5 times."""
+        buts = np.flatnonzero(self._arrays['but'][ids])
+        first_but = np.full(n, -1, dtype=np.int64)
+        # assigning in reverse order leaves the first 'but' of each sentence
+        first_but[sentence_of[buts[::-1]]] = position[buts[::-1]]
+        but_at = first_but[sentence_of]
+        return np.where(but_at < 0, 1.0, np.where(position < but_at, 0.5,
+                                                  np.where(position > but_at, 1.5, 1.0)))
+
+
+# once more distinct tokens than this have been seen, the next batch starts a new vocabulary,
+# so a kernel shared by a long-running process does not keep every token it has ever seen
+MAX_VOCABULARY = 2 ** 18
+
+
+def _phrase_codes(base: int, *parts: np.ndarray) -> np.ndarray:
+    """Return the integer codes of the sequences of tokens with the phrase word numbers in
+    parts (see VaderKernel._phrase_words), as the digits of a number in base. Every number is
+    between 1 and base - 1, so sequences of different lengths never share a code, and the codes
+    of three tokens fit in 64 bits as long as base is below 2 ** 21."""
+    result = np.zeros(len(parts[0]), dtype=np.int64)
+    for part in parts:
+        result = result * base + part
+    return result
+
+
+def _lookup(codes: np.ndarray, keys: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Return the value of the key equal to each of codes (or an arbitrary value if none is)."""
+    order = np.argsort(keys)
+    found = np.searchsorted(keys[order], codes).clip(0, len(keys) - 1)
+    return values[order][found]
+
+
+def _strip_punctuation(word: str, words_only: set[str], punctuation: list[str]) -> str:
+    """Return word without the punctuation mark before or after it, if what is left is one of
+    words_only, as VADER's SentiText does."""
+    if word[-1] not in _PUNCTUATION_CHARACTERS and word[0] not in _PUNCTUATION_CHARACTERS:
+        return word
+    for mark in punctuation:
+        if word.endswith(mark) and word[:-len(mark)] in words_only:
+            return word[:-len(mark)]
+    for mark in punctuation:
+        if word.startswith(mark) and word[len(mark):] in words_only:
+            return word[len(mark):]
+    return word
+
+
+def _punctuation_emphasis(sentence: str) -> float:
+    """Return the emphasis VADER adds for the exclamation and question marks in sentence."""
+    question_marks = sentence.count('?')
+    emphasis = min(sentence.count('!'), 4) * 0.292
+    if question_marks > 3:
+        emphasis += 0.96
+    elif question_marks > 1:
+        emphasis += question_marks * 0.18
+    return emphasis
+
+
+def check_agreement(kernel: VaderKernel, analyzer: SentimentIntensityAnalyzer,
+                    sentences: list[str]) -> float:
+    """Return the largest difference between the compound scores of kernel and of analyzer
+    over sentences, and raise AssertionError if it is more than TOLERANCE."""
+    expected = [analyzer.polarity_scores(sentence)['compound'] for sentence in sentences]
+    actual = kernel.score(sentences)
+    difference = max((abs(a - e) for a, e in zip(actual, expected)), default=0.0)
+    assert difference <= TOLERANCE or math.isclose(difference, TOLERANCE), \
+        f'The kernel differs from VADER by {difference}'
+    return difference
+
+
+if __name__ == '__main__':
+    import python_ta
+    import python_ta.contracts
+
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
+    python_ta.check_all(config={
+        'allowed-io': [],
+        'extra-imports': ['python_ta.contracts', 'math', 'numpy', 'nltk.sentiment.vader'],
+        'max-line-length': 100,
+        'max-nested-blocks': 4,
+        'disable': ['R1705', 'C0200']
+    })
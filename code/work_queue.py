@@ -0,0 +1,439 @@
+"""
+A shared job queue that splits the clean and score stages into work units, so that any number
+of worker processes, on any number of machines, can run them. The queue is an SQLite file:
+
+    - jobs: one row per work unit, holding the stage to run and its articles as JSON, and once
+      the unit is done, the resulting articles
+
+A worker leases a job for LEASE_SECONDS at a time. A job whose worker fails is queued again,
+and so is a job whose lease expires because its worker crashed or was killed, until it has
+been tried MAX_ATTEMPTS times. Only the worker holding the current lease can record a job's
+result, so a worker that comes back after its lease expired cannot overwrite the result of the
+worker that took over; since both run the same deterministic code, either result is the same.
+
+Merging is idempotent too: submitting the same articles again adds no jobs (jobs are keyed by
+the hash of their articles), and merging reads the results of the done jobs in the order the
+jobs were submitted, so it gives the same dataset however often it is run and whichever worker
+ran each job.
+
+The queue uses SQLite's rollback journal rather than WAL, so that it also works on a shared
+network file system (with working file locks) for workers on several batch nodes:
+
+    python work_queue.py submit <queue> clean --input data/links.txt --checkpoints data/checkpoints
+    python work_queue.py work <queue> --workers 4       (on each node)
+    python work_queue.py merge <queue> clean data/dataset.csv --syndication data/syndication.csv
+    python work_queue.py submit <queue> score --input data/dataset.csv
+    python work_queue.py work <queue> --workers 4 --sentence-cache data/sentence_cache.sqlite
+    python work_queue.py merge <queue> score data/analyzed_articles.csv
+
+Run from the code folder. The sentence cache is in WAL mode, so on several nodes each should
+use its own local --sentence-cache file.
+
+
+Copyright and Usage Information
+===============================
+Code by Anna Myllyniemi and Raghav Arora, December 2021
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from article_classes import Article, Articles
+
+STAGES = ('clean', 'score')
+CHUNK_SIZE = 64
+LEASE_SECONDS = 10 * 60
+MAX_ATTEMPTS = 3
+POLL_INTERVAL = 1.0
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    stage TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    lease_token TEXT,
+    lease_owner TEXT,
+    lease_expires REAL,
+    error TEXT,
+    result TEXT,
+    UNIQUE (stage, digest)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+"""
+
+
+@dataclass
+class Job:
+    """A job leased by a worker.
+
+    Instance Attributes:
+       - id: the id of the job in the queue
+       - stage: the stage to run on the articles, one of STAGES
+       - articles: the articles to run it on
+       - token: identifies this lease of the job; only its holder can finish the job
+       - attempts: the number of times the job has been leased, including this time
+    """
+    id: int
+    stage: str
+    articles: list[Article]
+    token: str
+    attempts: int
+
+
+class JobQueue:
+    """The jobs of the clean and score stages, saved in an SQLite file shared by every worker.
+
+    Instance Attributes:
+       - max_attempts: the number of times a job is leased before it is given up on
+
+    Private Instance Attributes:
+       - _connection: the connection to the SQLite file
+
+    Representation Invariants:
+        - self.max_attempts >= 1
+    """
+    max_attempts: int
+    _connection: sqlite3.Connection
+
+    def __init__(self, path: str, max_attempts: int = MAX_ATTEMPTS) -> None:
+        """Open the queue saved at path, creating it if it does not exist yet."""
+        self.max_attempts = max_attempts
+        # isolation_level=None: each statement below is its own (atomic) transaction
+        self._connection = sqlite3.connect(path, timeout=120, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=DELETE')
+        self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """Close the SQLite file."""
+        self._connection.close()
+
+    def submit(self, stage: str, articles: list[Article], chunk_size: int = CHUNK_SIZE) -> int:
+        """Split articles into jobs of chunk_size articles that run stage, and return how many
+        of those jobs were not in the queue already.
+
+        Preconditions:
+            - stage in STAGES
+            - chunk_size >= 1
+        """
+        rows = []
+        for i in range(0, len(articles), chunk_size):
+            payload = json.dumps([article_to_json(art) for art in articles[i:i + chunk_size]])
+            digest = hashlib.sha1(payload.encode('UTF8')).hexdigest()
+            rows.append((stage, digest, payload))
+
+        before = self._connection.total_changes
+        self._connection.execute('BEGIN IMMEDIATE')
+        self._connection.executemany(
+            'INSERT OR IGNORE INTO jobs (stage, digest, payload, status, attempts) '
+            "VALUES (?, ?, ?, 'queued', 0)", rows)
+        self._connection.execute('COMMIT')
+        return self._connection.total_changes - before
+
+    def lease(self, owner: str, lease_seconds: float = LEASE_SECONDS) -> Optional[Job]:
+        """Lease the oldest job that is queued, or whose lease has expired, to owner for
+        lease_seconds, and return it. Return None if no job is available right now.
+
+        A job whose lease expired after its last attempt is given up on instead.
+        """
+        now = time.time()
+        self._connection.execute(
+            "UPDATE jobs SET status = 'failed', error = 'lease expired', lease_token = NULL "
+            "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+            (now, self.max_attempts))
+
+        token = uuid.uuid4().hex
+        rows = self._connection.execute(
+            "UPDATE jobs SET status = 'leased', attempts = attempts + 1, lease_token = ?, "
+            'lease_owner = ?, lease_expires = ? WHERE id = ('
+            "    SELECT id FROM jobs WHERE status = 'queued' "
+            "    OR (status = 'leased' AND lease_expires < ?) ORDER BY id LIMIT 1"
+            ') RETURNING id, stage, payload, attempts',
+            (token, owner, now + lease_seconds, now)).fetchall()
+        if not rows:
+            return None
+
+        job_id, stage, payload, attempts = rows[0]
+        return Job(job_id, stage, [json_to_article(fields) for fields in json.loads(payload)],
+                   token, attempts)
+
+    def complete(self, job: Job, articles: list[Article]) -> bool:
+        """Record articles as the result of job, and return whether they were recorded; they
+        are not if the lease on job has expired and the job was leased by another worker."""
+        result = json.dumps([article_to_json(art) for art in articles])
+        cursor = self._connection.execute(
+            "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_token = NULL "
+            "WHERE id = ? AND lease_token = ? AND status = 'leased'",
+            (result, job.id, job.token))
+        return cursor.rowcount == 1
+
+    def fail(self, job: Job, error: str) -> None:
+        """Record that job failed with error. It is queued again, unless it has been tried
+        max_attempts times, or the lease on it has already passed to another worker."""
+        self._connection.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+            "error = ?, lease_token = NULL WHERE id = ? AND lease_token = ? AND status = 'leased'",
+            (self.max_attempts, error, job.id, job.token))
+
+    def retry_failed(self, stage: Optional[str] = None) -> int:
+        """Queue every job (of stage, if it is given) that was given up on again, with its
+        attempts reset, and return how many there were."""
+        cursor = self._connection.execute(
+            "UPDATE jobs SET status = 'queued', attempts = 0 WHERE status = 'failed' "
+            'AND (? IS NULL OR stage = ?)', (stage, stage))
+        return cursor.rowcount
+
+    def counts(self, stage: Optional[str] = None) -> dict[str, int]:
+        """Return the number of jobs (of stage, if it is given) with each status: 'queued',
+        'leased', 'done' or 'failed'."""
+        rows = self._connection.execute(
+            'SELECT status, COUNT(*) FROM jobs WHERE ? IS NULL OR stage = ? GROUP BY status',
+            (stage, stage))
+        return dict(rows.fetchall())
+
+    def errors(self, stage: Optional[str] = None) -> list[tuple[int, str]]:
+        """Return the id and last error of every job (of stage, if it is given) that failed."""
+        rows = self._connection.execute(
+            "SELECT id, error FROM jobs WHERE status = 'failed' AND (? IS NULL OR stage = ?) "
+            'ORDER BY id', (stage, stage))
+        return rows.fetchall()
+
+    def results(self, stage: str) -> Articles:
+        """Return the articles produced by the done jobs of stage, merged in the order the
+        jobs were submitted and keyed by URL.
+
+        Preconditions:
+            - stage in STAGES
+        """
+        articles = Articles(key='url')
+        for (result,) in self._connection.execute(
+                "SELECT result FROM jobs WHERE stage = ? AND status = 'done' ORDER BY id",
+                (stage,)):
+            for fields in json.loads(result):
+                articles.add_article(json_to_article(fields))
+        return articles
+
+
+def article_to_json(art: Article) -> dict:
+    """Return art as a JSON serializable dictionary."""
+    fields = {name: getattr(art, name) for name in Article.__slots__}
+    if art.date_published is not None:
+        fields['date_published'] = art.date_published.strftime(DATE_FORMAT)
+    return fields
+
+
+def json_to_article(fields: dict) -> Article:
+    """Return the article saved by article_to_json."""
+    article = Article(**fields)
+    if article.date_published is not None:
+        article.date_published = datetime.datetime.strptime(article.date_published, DATE_FORMAT)
+    return article
+
+
+def run_job(job: Job, boilerplate_dir: Optional[str] = None,
+            sentence_cache: Optional[str] = None, kernel: str = 'numpy') -> list[Article]:
+    """Run the stage of job on its articles, as create_dataset and run_sentiment would, and
+    return them. The clean stage also tags the articles with their themes.
+
+    The clean stage uses the publication cleaners in boilerplate_dir, if it is given. The
+    score stage uses kernel and the persistent sentence cache at sentence_cache, if it is
+    given.
+    """
+    # imported here, so the queue can be used without loading NLTK
+    from analyze_sentiment import get_engine
+    from pipeline import clean_stream, score_stream, tag_stream
+    from text_cleaner import load_publication_cleaners
+
+    if job.stage == 'clean':
+        cleaners = load_publication_cleaners(boilerplate_dir) if boilerplate_dir else None
+        return list(tag_stream(clean_stream(job.articles, cleaners)))
+
+    engine = get_engine()
+    engine.kernel = kernel
+    if sentence_cache is not None:
+        engine.cache.open_store(sentence_cache)
+    return list(score_stream(job.articles, max(len(job.articles), 1)))
+
+
+def run_worker(queue_path: str, owner: Optional[str] = None,
+               lease_seconds: float = LEASE_SECONDS, poll_interval: float = POLL_INTERVAL,
+               boilerplate_dir: Optional[str] = None, sentence_cache: Optional[str] = None,
+               kernel: str = 'numpy') -> int:
+    """Lease and run jobs from the queue at queue_path until no job is queued or leased any
+    more, and return the number of jobs this worker completed. While other workers hold the
+    only remaining leases, the worker polls every poll_interval seconds, in case one of those
+    leases expires.
+
+    owner names the worker in the queue; it defaults to the host name and process id.
+    boilerplate_dir, sentence_cache and kernel are as for run_job.
+    """
+    owner = owner if owner is not None else f'{socket.gethostname()}:{os.getpid()}'
+    queue = JobQueue(queue_path)
+    completed = 0
+    while True:
+        job = queue.lease(owner, lease_seconds)
+        if job is None:
+            counts = queue.counts()
+            if counts.get('queued', 0) + counts.get('leased', 0) == 0:
+                queue.close()
+                return completed
+            time.sleep(poll_interval)
+            continue
+
+        try:
+            articles = run_job(job, boilerplate_dir, sentence_cache, kernel)
+        except Exception as error:  # a single bad job must not stop the worker
+            logger.warning('Job %d failed on attempt %d: %r', job.id, job.attempts, error)
+            queue.fail(job, repr(error))
+            continue
+
+        if queue.complete(job, articles):
+            completed += 1
+        else:
+            logger.warning('Job %d was leased by another worker before it completed', job.id)
+
+
+def run_workers(queue_path: str, workers: int, **options: object) -> int:
+    """Run workers worker processes (see run_worker, which takes the keyword arguments in
+    options) on this machine until the queue is drained, and return the number of jobs they
+    completed.
+
+    Preconditions:
+        - workers >= 1
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_worker, queue_path, **options) for _ in range(workers)]
+        return sum(future.result() for future in futures)
+
+
+def submit_stage(queue_path: str, stage: str, input_path: str,
+                 checkpoint_dir: Optional[str] = None, chunk_size: int = CHUNK_SIZE) -> int:
+    """Submit the jobs of stage to the queue at queue_path, and return how many were new.
+
+    The clean stage runs on the articles linked from the links file at input_path, which are
+    crawled (into checkpoint_dir, if it is given) unless they were crawled already. The score
+    stage runs on the articles in the dataset CSV file at input_path.
+
+    Preconditions:
+        - stage in STAGES
+    """
+    if stage == 'clean':
+        from create_dataset import setup_articles
+        from crawl import CrawlCheckpoint, crawl, read_links
+
+        checkpoint = CrawlCheckpoint(checkpoint_dir) if checkpoint_dir is not None else None
+        # keyed by URL, so syndicated copies with the same title all reach dedup at merge
+        articles = setup_articles(crawl(read_links(input_path), checkpoint), key='url')
+    else:
+        from csv_read_write import read_file
+        articles = read_file(input_path)
+
+    # in a fixed order, so submitting the same articles again gives the same jobs
+    ordered = [articles.get_article(key) for key in sorted(articles.get_keys())]
+    queue = JobQueue(queue_path)
+    added = queue.submit(stage, ordered, chunk_size)
+    queue.close()
+    return added
+
+
+def merge_stage(queue_path: str, stage: str, output_path: str,
+                syndication_path: Optional[str] = None) -> int:
+    """Write the merged results of stage to the CSV file at output_path, and return the number
+    of articles written. For the clean stage, duplicate articles are removed first, as by
+    create_dataset, if syndication_path is given.
+
+    Raises ValueError if some jobs of stage are not done.
+
+    Preconditions:
+        - stage in STAGES
+    """
+    from csv_read_write import write_file
+
+    queue = JobQueue(queue_path)
+    counts = queue.counts(stage)
+    if set(counts) - {'done'}:
+        queue.close()
+        raise ValueError(f'Not every {stage} job is done: {counts}')
+
+    articles = queue.results(stage)
+    queue.close()
+    if stage == 'clean' and syndication_path is not None:
+        from dedup import find_duplicates, remove_duplicates, write_syndication
+
+        clusters = find_duplicates(articles)
+        write_syndication(articles, clusters, syndication_path)
+        remove_duplicates(articles, clusters)
+
+    articles = articles.rekeyed('title')
+    write_file(articles, output_path)
+    return len(articles.get_keys())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the clean and score stages as jobs.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    submit_parser = subparsers.add_parser('submit', help='split a stage into jobs')
+    submit_parser.add_argument('queue')
+    submit_parser.add_argument('stage', choices=STAGES)
+    submit_parser.add_argument('--input', required=True,
+                               help='the links file (clean) or dataset CSV file (score)')
+    submit_parser.add_argument('--checkpoints', default=None)
+    submit_parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    work_parser = subparsers.add_parser('work', help='run jobs until the queue is drained')
+    work_parser.add_argument('queue')
+    work_parser.add_argument('--workers', type=int, default=1)
+    work_parser.add_argument('--lease', type=float, default=LEASE_SECONDS)
+    work_parser.add_argument('--boilerplate', default=None)
+    work_parser.add_argument('--sentence-cache', default=None)
+    work_parser.add_argument('--kernel', choices=('vader', 'numpy'), default='numpy')
+    merge_parser = subparsers.add_parser('merge', help='write the results of a stage')
+    merge_parser.add_argument('queue')
+    merge_parser.add_argument('stage', choices=STAGES)
+    merge_parser.add_argument('output')
+    merge_parser.add_argument('--syndication', default=None)
+    status_parser = subparsers.add_parser('status', help='count the jobs of each status')
+    status_parser.add_argument('queue')
+    status_parser.add_argument('--retry-failed', action='store_true')
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if arguments.command == 'submit':
+        new_jobs = submit_stage(arguments.queue, arguments.stage, arguments.input,
+                                arguments.checkpoints, arguments.chunk_size)
+        print(f'Submitted {new_jobs} new {arguments.stage} jobs')
+    elif arguments.command == 'work':
+        done = run_workers(arguments.queue, arguments.workers, lease_seconds=arguments.lease,
+                           boilerplate_dir=arguments.boilerplate,
+                           sentence_cache=arguments.sentence_cache, kernel=arguments.kernel)
+        print(f'Completed {done} jobs')
+    elif arguments.command == 'merge':
+        try:
+            written = merge_stage(arguments.queue, arguments.stage, arguments.output,
+                                  arguments.syndication)
+        except ValueError as merge_error:
+            sys.exit(str(merge_error))
+        print(f'Wrote {written} articles to {arguments.output}')
+    else:
+        job_queue = JobQueue(arguments.queue)
+        if arguments.retry_failed:
+            print(f'Queued {job_queue.retry_failed()} failed jobs again')
+        print(job_queue.counts())
+        for failed_id, failed_error in job_queue.errors():
+            print(f'job {failed_id}: {failed_error}')
+        job_queue.close()